@@ -79,6 +79,7 @@ pl = importlib.import_module(input_module)
 sys.modules["nexus.pipeline_input.pipeline"] = pl
 # Load Data Input pipeline module
 from nexus.pipeline_input.pipeline.datapipeline import *
+from nexus.pipeline_input.pipeline.cli import run_pipeline_cli
 
 # =============================================================================
 # Final setup step
@@ -115,7 +116,8 @@ def pipeline_cus(pipeline_object):
 # ============================================================================
 warnings.simplefilter(action='ignore', category=FutureWarning)  # remove FutureWarning notifications
 log_file = os.path.join(Path(__file__).parent, '_{0}.log'.format(project_variables["project_dir_name"]))
-logging.basicConfig(level=logging.DEBUG, filename=log_file, filemode='w')
+if __name__ == '__main__':  # not when the script is imported again by the worker processes (spawn, eg p1.network_jobs > 1)
+    logging.basicConfig(level=logging.DEBUG, filename=log_file, filemode='w')
 try:
     """
     # ============================================================================
@@ -171,7 +173,11 @@ try:
     Run new custom steps in the pipeline, including customised versions of the pipeline
     # ============================================================================
     """
-    pipeline_cus()
+    if __name__ == '__main__':  # the worker processes (spawn) import this script without running the pipeline
+        if len(sys.argv) > 1:  # command line, eg: python input_project_regioninnovation.py --steps len ddb --plan
+            run_pipeline_cli(p1, sys.argv[1:])
+        else:
+            pipeline_cus(p1)
 except Exception as e:
     logging.exception("Exception occurred", exc_info=True)
 finally:
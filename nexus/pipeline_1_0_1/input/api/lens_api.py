@@ -16,13 +16,72 @@
 # modules to import
 # =============================================================================
 import pandas as pd
-import json
-from ..utils.utils_api import request_retry, APICallTracker
+import datetime
+import calendar
+from concurrent.futures import ThreadPoolExecutor
+from ..utils.utils_api import request_retry, get_call_tracker
+from ..utils.utils_json import json_dumps, response_json, records_to_frame
+from ..utils.utils_metrics import metrics_current, metrics_attach
+from ..utils.utils_lazy import load_lazy_modules
 
 # =============================================================================
 # Functions and classes
 # =============================================================================
 
+def iter_lens_buckets(agg_data):
+    # agg_data: one aggregation of the Lens aggregate API response
+    # yields each bucket as a dictionary with a 'key', whether the buckets are sent
+    # as a list ({"buckets": [{"key": ..., "doc_count": ...}]}) or keyed by value ({"buckets": {"2015": {...}}} or {"2015": {...}})
+    buckets = agg_data.get('buckets', agg_data) if isinstance(agg_data, dict) else agg_data
+    if isinstance(buckets, list):
+        for b in buckets:
+            yield b
+    elif isinstance(buckets, dict):
+        for k, b in buckets.items():
+            if isinstance(b, dict):
+                yield {'key': k, **b}
+
+def lens_aggregation_to_dataframe(agg_key, agg_data):
+    # agg_key: the name of the aggregation in the request (eg year_published_histogram)
+    # agg_data: the aggregation in the Lens response
+    # returns a DF with one row per bucket (column agg_key = bucket key), or one row for a metric aggregation (eg avg)
+    rows = list(iter_lens_buckets(agg_data))
+    if rows:
+        df = pd.json_normalize(rows, errors='ignore')
+        df.rename(columns={'key': agg_key}, inplace=True)
+    else:
+        df = pd.DataFrame([agg_data]) if isinstance(agg_data, dict) else pd.DataFrame({agg_key: [agg_data]})
+    return df
+
+def merge_lens_aggregations(aggregations):
+    # aggregations: dictionary {agg_id: aggregation body}, eg the 'aggegation' entries of the search strategy
+    #   {"agg_1": {"year_published_histogram": {"date_histogram": {...}}}, "agg_2": {...}}
+    # returns the merged body of a single aggregate request and the map {name in the request: (agg_id, name in the aggregation)}
+    # names used by more than one aggregation are prefixed by their agg_id to keep them apart in the response
+    names = {}
+    for agg_id, agg in aggregations.items():
+        for agg_key in agg.keys():
+            names[agg_key] = names.get(agg_key, 0) + 1
+    merged = {}
+    agg_map = {}
+    for agg_id, agg in aggregations.items():
+        for agg_key, agg_value in agg.items():
+            request_key = agg_key if names[agg_key] == 1 else '{}__{}'.format(agg_id, agg_key)
+            merged[request_key] = agg_value
+            agg_map[request_key] = (agg_id, agg_key)
+    return merged, agg_map
+
+def split_lens_aggregations(data, agg_map):
+    # data: the 'aggregations' of a response to a merged request (see merge_lens_aggregations)
+    # agg_map: the map {name in the request: (agg_id, name in the aggregation)}
+    # returns a dictionary {agg_id: DF}, ie the same tables as one request per aggregation
+    tables = {}
+    for request_key, (agg_id, agg_key) in agg_map.items():
+        if request_key in data:
+            df = lens_aggregation_to_dataframe(agg_key, data[request_key])
+            tables[agg_id] = pd.concat([tables[agg_id], df], ignore_index=True) if agg_id in tables else df
+    return tables
+
 class GetLensData:
     # =============================================================================
     # Constructor
@@ -68,6 +127,7 @@ class GetLensData:
         APILENSS
             endpoint: https://api.lens.org/scholarly/
             apikey: [API token KEY HERE]
+            requests_per_minute: [optional, the rate limit of the API key, by default 10 (5 for aggregations)]
         '''
         # =============================================================================
         # Methods attributes (variable with project)
@@ -166,6 +226,9 @@ class GetLensData:
 
     @api_include.setter
     def api_include(self, value):
+        if isinstance(value, str):  # name of an include profile (eg 'ddb_full'), see core/ddb_data.py
+            from ..core.ddb_data import lens_include_profile
+            value = lens_include_profile(value)
         self._api_include = value
 
     @property
@@ -229,7 +292,215 @@ class GetLensData:
             return new_query_strategy
 
 
-    def get_lens_data(self, start_year, end_year, call_tracker=None):
+    def get_lens_aggregate(self, start_year, end_year, call_tracker=None):
+        # Retrieve the raw aggregations of a Lens query (single 'aggregate' request, size=0).
+        # Returns: the 'aggregations' dictionary as sent by the API (nested buckets are kept as is),
+        #   the total number of records matching the query and the call tracker
+        # Nested aggregations (eg a 'histogram' under a 'date_histogram') are returned in one request
+        data = {}
+        nb_total = 0
+        try:
+            if call_tracker is None:
+                call_tracker = get_call_tracker(self._api_configuration.get('apikey'))
+            method = 'POST'
+            token = 'Bearer {}'.format(self._api_configuration['apikey'])
+            headers = {'Authorization': token, 'Content-Type': 'application/json'}
+            query_strategy = self.build_query_strategy(self._query_string, self._query_parameters)
+            query_strategy['bool']['must'] = query_strategy['bool']['must'] + [{"range": {"year_published": {"gte": start_year, "lte": end_year}}}] # restrict by year
+            url = '{}{}'.format(self._api_configuration['endpoint'], 'aggregate')
+            json_params = {
+                "query": query_strategy,
+                "aggregations": self._aggregation_string,
+                "size": 0,
+                "stemming": self._api_stemming,
+                "regex": self._api_regex
+                # "min_score": self._api_min_score
+            }
+            json_query = json_dumps(json_params)  ## format the python dictionary into json (notably for parameters with null values)
+            query_response = call_tracker.loop_call(json_query, headers, method, url, max_tries=10, n=self._api_configuration.get('requests_per_minute', 5))
+            if query_response is None or query_response.status_code != 200:  # failed after the retries of loop_call
+                raise ValueError("Lens aggregate failed: {}".format('no response' if query_response is None else query_response.status_code))
+            r = response_json(query_response)
+            nb_total = r['total']
+            if nb_total > 0:
+                data = r['aggregations']
+        except Exception as e:
+            print("\t\t error in get_lens_aggregate: {}".format(e))
+            raise
+        return data, nb_total, call_tracker
+
+    def count_lens_records(self, partition_filter, call_tracker=None):
+        # Count the records of the query restricted by a partition filter (search request with size=0, no data sent back)
+        # partition_filter: a Lens query clause, eg {"match": {"year_published": 2020}}
+        nb_total = 0
+        try:
+            if call_tracker is None:
+                call_tracker = get_call_tracker(self._api_configuration.get('apikey'))
+            method = 'POST'
+            token = 'Bearer {}'.format(self._api_configuration['apikey'])
+            headers = {'Authorization': token, 'Content-Type': 'application/json'}
+            query_strategy = self.build_query_strategy(self._query_string, self._query_parameters)
+            query_strategy['bool']['must'] = query_strategy['bool']['must'] + [partition_filter]
+            url = '{}{}'.format(self._api_configuration['endpoint'], 'search')
+            json_params = {
+                "query": query_strategy,
+                "size": 0,
+                "stemming": self._api_stemming,
+                "regex": self._api_regex
+            }
+            json_query = json_dumps(json_params)
+            query_response = call_tracker.loop_call(json_query, headers, method, url, max_tries=10, n=self._api_configuration.get('requests_per_minute', 10))
+            if query_response is None or query_response.status_code != 200:  # 0 only for a real total of 0, not for an error
+                raise ValueError("Lens count failed for {}: {}".format(
+                    json_dumps(partition_filter), 'no response' if query_response is None else query_response.status_code))
+            nb_total = response_json(query_response)['total']
+        except Exception as e:
+            print("\t\t error in count_lens_records: {}".format(e))
+            raise
+        return nb_total
+
+    def plan_lens_partitions(self, start_year, end_year, max_partition_size=50000, nb_workers=1, call_tracker=None):
+        # Preflight of a harvest: count-only queries by year, and years above max_partition_size are split
+        # recursively into months then days of date_published until each partition is under max_partition_size
+        # (a single day above the limit is kept as is). The sub-partitions of a year keep the year_published filter,
+        # and a remainder partition ([YEAR]-other) holds the records of the year without date_published in the year
+        # (no date or a date in another year), so that the partitions of a year add up to the year.
+        # Returns: a DF with one row per partition (partition, filter, nb_records) and the worker it is assigned to,
+        #   partitions are given to the least loaded worker from the largest to the smallest (balanced work list)
+        if call_tracker is None:
+            call_tracker = get_call_tracker(self._api_configuration.get('apikey'))
+        partitions = []
+
+        def date_range(gte, lte):
+            return {"range": {"date_published": {"gte": gte.isoformat(), "lte": lte.isoformat()}}}
+
+        def date_filter(year, gte, lte):
+            return {"bool": {"must": [{"match": {"year_published": year}}, date_range(gte, lte)]}}
+
+        def split_period(gte, lte, level):
+            if level == 'month':
+                periods = []
+                for m in range(1, 13):
+                    first = datetime.date(gte.year, m, 1)
+                    last = datetime.date(gte.year, m, calendar.monthrange(gte.year, m)[1])
+                    periods.append((first, last, 'day'))
+                return periods
+            return [(gte + datetime.timedelta(days=d), gte + datetime.timedelta(days=d), None) for d in range((lte - gte).days + 1)]
+
+        def add_partition(label, partition_filter, year, gte, lte, level):
+            nb = self.count_lens_records(partition_filter, call_tracker=call_tracker)
+            if nb == 0:
+                return
+            if nb > max_partition_size and level is not None:
+                for p_gte, p_lte, p_level in split_period(gte, lte, level):
+                    add_partition(p_gte.isoformat() if p_level is None else p_gte.isoformat()[:7], date_filter(year, p_gte, p_lte),
+                                  year, p_gte, p_lte, p_level)
+                if level == 'month':
+                    remainder = {"bool": {"must": [{"match": {"year_published": year}}], "must_not": [date_range(gte, lte)]}}
+                    add_partition('{}-other'.format(year), remainder, year, gte, lte, None)
+            else:
+                partitions.append({'partition': label, 'filter': partition_filter, 'nb_records': nb})
+
+        for py in range(end_year, start_year - 1, -1):
+            add_partition(str(py), {"match": {"year_published": py}}, py, datetime.date(py, 1, 1), datetime.date(py, 12, 31), 'month')
+        df = pd.DataFrame(partitions, columns=['partition', 'filter', 'nb_records'])
+        df = df.sort_values(by='nb_records', ascending=False).reset_index(drop=True)
+        load = [0] * max(nb_workers, 1)
+        workers = []
+        for nb in df['nb_records']:
+            w = load.index(min(load))
+            load[w] += nb
+            workers.append(w)
+        df['worker'] = workers
+        print('\t\t {} partitions planned for {} records ({} workers, max {} records per worker)'.format(df.shape[0], df['nb_records'].sum(), len(load), max(load)))
+        return df
+
+    def scroll_lens_query(self, partition_filter, label, call_tracker=None):
+        # Retrieve all the records of the query restricted by a partition filter (search request followed by scroll requests)
+        # Returns: the DF of records (json normalised) and the max score
+        df = pd.DataFrame()
+        max_score = 0
+        if call_tracker is None:
+            call_tracker = get_call_tracker(self._api_configuration.get('apikey'))
+        method = 'POST'
+        token = 'Bearer {}'.format(self._api_configuration['apikey'])
+        headers = {'Authorization': token, 'Content-Type': 'application/json'}
+        query_strategy = self.build_query_strategy(self._query_string, self._query_parameters)
+        query_strategy['bool']['must'] = query_strategy['bool']['must'] + [partition_filter] # restrict by partition (eg year)
+        url = '{}{}'.format(self._api_configuration['endpoint'], 'search')
+        json_params = {
+            "query": query_strategy,
+            "size": self._page_size,
+            "sort": self._api_sort,
+            "exclude": self._api_exclude,
+            "scroll": "1m",
+            "stemming": self._api_stemming,
+            "regex": self._api_regex,
+            "min_score": self._api_min_score
+        }
+        if self._api_include:
+            json_params["include"] = self._api_include
+        json_query = json_dumps(json_params)  ## format the python dictionary into json (notably for parameters with null values)
+        query_response = call_tracker.loop_call(json_query, headers, method, url, max_tries=10, n=self._api_configuration.get('requests_per_minute', 10))
+        if query_response is None or query_response.status_code != 200:  # failed after the retries of loop_call: the partition fails
+            raise ValueError("Lens search failed for partition {}: {}".format(label, 'no response' if query_response is None else query_response.status_code))
+        r = response_json(query_response)
+        nb_total = r['total']
+        if nb_total > 0:
+            nb_results = r['results']
+            max_score = r['max_score']
+            df = records_to_frame(r['data'], self._api_include)
+            df['score'] = max_score
+            print("\t\t", nb_total, "records in", label)
+            if nb_total > nb_results and r["scroll_id"]:
+                json_params = {"scroll": "1m", "scroll_id": r['scroll_id']}
+                if self._api_include:
+                    json_params["include"] = self._api_include
+                pages = [df]
+                for i in range(nb_results, nb_total, self._page_size):
+                    json_query = json_dumps(json_params)
+                    query_response = call_tracker.loop_call(json_query, headers, method, url, max_tries=10, n=self._api_configuration.get('requests_per_minute', 10))
+                    if query_response is None or query_response.status_code != 200:  # a missing page would be a silent gap in the records
+                        raise ValueError("Lens scroll failed for partition {} after {} records: {}".format(
+                            label, i, 'no response' if query_response is None else query_response.status_code))
+                    r_id = response_json(query_response)
+                    print("\t\t\t", i, "records retrieved for ", label)
+                    if r_id["scroll_id"]:
+                        json_params["scroll_id"] = r_id['scroll_id']
+                    d_id = records_to_frame(r_id['data'], self._api_include)
+                    d_id['score'] = max_score
+                    pages.append(d_id)
+                df = pd.concat(pages)
+            if df.shape[0] < nb_total:
+                raise ValueError("Lens harvest incomplete for partition {}: {} records of {}".format(label, df.shape[0], nb_total))
+        return df, max_score
+
+    def get_lens_partitions(self, partitions, call_tracker=None):
+        # Harvest a work list of partitions (see plan_lens_partitions), one thread per worker,
+        # the call tracker is shared by all the workers so that the rate limit applies to the whole harvest
+        if call_tracker is None:
+            call_tracker = get_call_tracker(self._api_configuration.get('apikey'))
+        parent = metrics_current()  # the API calls of the workers are counted in the step of the harvest
+
+        def run_worker(worker_partitions):
+            results = []
+            with metrics_attach(parent):
+                for p in worker_partitions.itertuples():
+                    results.append(self.scroll_lens_query(p.filter, p.partition, call_tracker=call_tracker))
+            return results
+
+        groups = [g for w, g in partitions.groupby('worker')]
+        results = []
+        load_lazy_modules()  # before the worker threads
+        with ThreadPoolExecutor(max_workers=max(len(groups), 1)) as executor:
+            for worker_results in executor.map(run_worker, groups):
+                results = results + worker_results
+        frames = [d for d, m in results if d.shape[0] > 0]
+        df = pd.concat(frames) if frames else pd.DataFrame()
+        max_score = max([m for d, m in results], default=0)
+        return df, max_score, call_tracker
+
+    def get_lens_data(self, start_year, end_year, call_tracker=None, max_partition_size=None, nb_workers=1):
         # Retrieve Lens data from a query.
         # Returns: 1 panda dataframe objects with data fields:
         #   df = list of lens_id
@@ -238,6 +509,9 @@ class GetLensData:
         # aggregation_string: json parameters from aggragation details
         # api_type: the complete endpoint (scholarly, patent), by default search
         # Response is paged by increments of 10 per page
+        # max_partition_size: when set, the query is first partitioned by date_published (see plan_lens_partitions)
+        #   so that no partition has more records than max_partition_size, by default partitions are years
+        # nb_workers: the number of partitions harvested in parallel
         """
         Sample query strings
         query = {
@@ -289,95 +563,32 @@ class GetLensData:
             }
         }
         """
-        try:
-            print('\t start Lens query')
-            if call_tracker is None:
-                call_tracker = APICallTracker()
-            method = 'POST'
-            token = 'Bearer {}'.format(self._api_configuration['apikey'])
-            headers = {'Authorization': token, 'Content-Type': 'application/json'}
-            df = pd.DataFrame()
-            df_aggregation = pd.DataFrame()  
-            nb_total = 0
-            max_score = 0
-            query_strategy = self.build_query_strategy(self._query_string, self._query_parameters)
-            if self._aggregation_string:
-                query_strategy['bool']['must'] = query_strategy['bool']['must'] + [{"range": {"year_published": {"gte": start_year, "lte": end_year}}}] # restrict by year
-                url = '{}{}'.format(self._api_configuration['endpoint'], 'aggregate')
-                json_params = {
-                    "query": query_strategy,
-                    "aggregations": self._aggregation_string,
-                    "size": 0,
-                    "stemming": self._api_stemming,
-                    "regex": self._api_regex
-                    # "min_score": self._api_min_score
-                }
-                json_query = json.dumps(json_params)  ## format the python dictionary into json (notably for parameters with null values)
-                query_response = call_tracker.loop_call(json_query, headers, method, url, max_tries=10, n=5)
-                # print(query_response.content)
-                if query_response.status_code == 200:
-                        r = query_response.json()
-                        nb_total = r['total']
-                        if nb_total > 0:
-                            data = r['aggregations']
-                            agg_key = list(data.keys())[0]
-                            df_aggregation = pd.DataFrame.from_dict(data[agg_key], orient='index').reset_index()
-                            df_aggregation.rename(columns={'index': agg_key}, inplace=True)
+        print('\t start Lens query')
+        if call_tracker is None:
+            call_tracker = get_call_tracker(self._api_configuration.get('apikey'))
+        df = pd.DataFrame()
+        df_aggregation = pd.DataFrame()
+        nb_total = 0
+        max_score = 0
+        if self._aggregation_string:
+            data, nb_total, call_tracker = self.get_lens_aggregate(start_year, end_year, call_tracker=call_tracker)
+            if nb_total > 0:
+                agg_key = list(data.keys())[0]
+                df_aggregation = lens_aggregation_to_dataframe(agg_key, data[agg_key])
+        else:
+            if max_partition_size:
+                partitions = self.plan_lens_partitions(start_year, end_year, max_partition_size=max_partition_size, nb_workers=nb_workers, call_tracker=call_tracker)
             else:
-                for py in range(end_year, start_year -1,  -1):
-                    query_strategy['bool']['must'] = query_strategy['bool']['must'] + [{"match": {"year_published": py}}] # restrict by year
-                    url = '{}{}'.format(self._api_configuration['endpoint'], 'search')
-                    # self._page_size = self._page_size
-                    json_params = {
-                        "query": query_strategy,
-                        "size": self._page_size,
-                        "sort": self._api_sort,
-                        "exclude": self._api_exclude,
-                        "scroll": "1m",
-                        "stemming": self._api_stemming,
-                        "regex": self._api_regex,
-                        "min_score": self._api_min_score
-                    }
-                    if self._api_include:
-                        json_params["include"] = self._api_include,
-                    json_query = json.dumps(json_params)  ## format the python dictionary into json (notably for parameters with null values)
-                    # method = 'POST'
-                    # token = 'Bearer {}'.format(self._api_configuration['apikey'])
-                    # headers = {'Authorization': token, 'Content-Type': 'application/json'}
-                    query_response = request_retry(json_query, headers, method, url, max_tries=10, n=10)
-                    if query_response.status_code == 200:
-                        r = query_response.json()
-                        nb_total = r['total']
-                        if nb_total > 0:
-                            nb_results = r['results']
-                            max_score = r['max_score']
-                            data = r['data']
-                            df_py = pd.json_normalize(data, errors='ignore')
-                            df = pd.concat([df, df_py])
-                            print("\t\t", nb_total, "records in", py)
-                            if nb_total > nb_results:
-                                if r["scroll_id"]:
-                                    json_params = {"scroll": "1m", "scroll_id": r['scroll_id'], "include": self._api_include }
-                                    for i in range(nb_results, nb_total, self._page_size):
-                                        json_query = json.dumps(json_params)
-                                        query_response = call_tracker.loop_call(json_query, headers, method, url, max_tries=10, n=10)
-                                        # query_response = request_retry(json_query, headers, method, url, max_tries=10)
-                                        if query_response.status_code == 200:
-                                            r_id = query_response.json()
-                                            print("\t\t\t", i, "records retrieved for ", py)
-                                            if r_id["scroll_id"]:
-                                                json_params["scroll_id"] = r_id['scroll_id']
-                                                data_id = r_id['data']
-                                                max_score = r['max_score']
-                                                d_id = pd.json_normalize(data_id, errors='ignore')
-                                                d_id['score'] = max_score
-                                                df = pd.concat([df, d_id])
-                                                i += self._page_size
-        finally:
+                years = [py for py in range(end_year, start_year -1,  -1)]
+                partitions = pd.DataFrame({
+                    'partition': [str(py) for py in years],
+                    'filter': [{"match": {"year_published": py}} for py in years],
+                    'worker': [i % max(nb_workers, 1) for i in range(len(years))]})
+            # a failed partition (see scroll_lens_query) raises: the harvest fails instead of missing records
+            df, max_score, call_tracker = self.get_lens_partitions(partitions, call_tracker=call_tracker)
             nb_total = df.shape[0]
-            print('\t Last Lens data retrieved')
-            # print(df.shape[0])
-            return df, df_aggregation, nb_total, max_score, call_tracker
+        print('\t Last Lens data retrieved')
+        return df, df_aggregation, nb_total, max_score, call_tracker
     # =============================================================================
     # Pipeline steps
     # ============================================================================
@@ -17,17 +17,18 @@
 # modules to import
 # =============================================================================
 import pandas as pd
-import json
-from pyalex import config, Topics, Concepts, Subfield, Field, Domain
+from pyalex import config, Topics, Concepts
 import requests
 import gzip
 import io
-import json
+from ..utils.utils_api import retry
+from ..utils.utils_json import json_loads_lines, response_json
 
 
 # =============================================================================
 # Functions and classes
 # =============================================================================
+OPENALEX_URL = 'https://api.openalex.org/'
 
 
 class GetOpenAlexData:
@@ -68,6 +69,10 @@ class GetOpenAlexData:
     # =============================================================================
     # Methods
     # =============================================================================
+    def openalex_url(self):
+        # the API endpoint of the configuration (eg a local test server), by default https://api.openalex.org/
+        return self._api_configuration.get('endpoint') or OPENALEX_URL
+
     def set_openalex_api(self):
         # Setup Open Alex API.
         try:
@@ -76,6 +81,7 @@ class GetOpenAlexData:
             config.max_retries = 10
             config.retry_backoff_factor = 0.1
             config.retry_http_codes = [429, 500, 503]
+            config.openalex_url = self.openalex_url().rstrip('/')
         finally:
             print('\t OA setup completed')
     
@@ -86,12 +92,12 @@ class GetOpenAlexData:
         def get_tree_data(drow, column):
             idx = drow[column]
             data = {'wikidata': None, 'wikipedia': None}
-            url = idx.replace('https://openalex.org/', 'https://api.openalex.org/')
+            url = idx.replace('https://openalex.org/', self.openalex_url())
             print(url)
             try:
                 response = requests.get(url)
                 if response.status_code == 200:
-                    data = response.json()
+                    data = response_json(response)
                     data = data['ids']
             finally:
                 # print(data['wikidata'], data['wikipedia'])
@@ -129,7 +135,7 @@ class GetOpenAlexData:
             nb_total = Concepts().count()  ## retrieve concepts (deprecated 2024)
             url = 'https://openalex.s3.amazonaws.com/data/concepts/manifest'
             response = requests.get(url)
-            data = response.json()
+            data = response_json(response)
             data = [x['url'] for x in data['entries']]
             for i in data:
                 url = i.replace('s3://openalex/', 'https://openalex.s3.amazonaws.com/')
@@ -137,11 +143,8 @@ class GetOpenAlexData:
                 response = requests.get(url)
                 # Use io.BytesIO to handle the in-memory bytes buffer
                 with gzip.GzipFile(fileobj=io.BytesIO(response.content)) as f:
-                    # Read the decompressed content as text
-                    file_content = f.read().decode('utf-8')
-                    file_content = file_content.strip()
-                    json_objects = file_content.splitlines()
-                    json_obj = [json.loads(x) for x in json_objects]
+                    # Decode the decompressed JSON lines in one call
+                    json_obj = json_loads_lines(f.read().strip())
                 concepts = concepts + json_obj
             concepts = pd.json_normalize(concepts, errors='ignore')
             print('\t ', nb_total, "concepts extracted")
@@ -156,31 +159,31 @@ class GetOpenAlexData:
   
 
 
-def get_openalex_object(search, entity='author'):
+def get_openalex_object(search, entity='author', url=None):
     # Retrieve
     # Returns
     # https://docs.openalex.org/api/get-single-entities
     # url: https://api.openalex.org/works/W2741809807
     try:
-        url = 'https://api.openalex.org/'
+        url = url or OPENALEX_URL
         query = "{}{}/{}".format(url, entity, search)
         headers = ''
         query_response = retry(query, headers)
         data = None
         if query_response.status_code == 200:
-            resp = query_response.json()
+            resp = response_json(query_response)
             data = resp
     finally:
         return data
 
 
-def search_openalex(search, entity='author', page=1, perpage=100, cursor=None):
+def search_openalex(search, entity='author', page=1, perpage=100, cursor=None, url=None):
     # Retrieve
     # Returns
     # https://docs.openalex.org/api/get-single-entities
     # url: https://api.openalex.org/works/W2741809807
     try:
-        url = 'https://api.openalex.org/'
+        url = url or OPENALEX_URL
         if cursor:
             query = "{}{}?filter={}&page={}&per-page={}&cursor={}".format(url, entity, search, page, perpage, cursor)
         else:
@@ -190,7 +193,7 @@ def search_openalex(search, entity='author', page=1, perpage=100, cursor=None):
         query_response = retry(query, headers)
         data = None
         if query_response.status_code == 200:
-            resp = query_response.json()
+            resp = response_json(query_response)
             data = resp
     finally:
         return data
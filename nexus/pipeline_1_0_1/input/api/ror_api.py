@@ -19,7 +19,7 @@ from ..utils.utils_api import request_retry
 import requests
 import zipfile
 import io
-import json
+from ..utils.utils_json import json_loads, response_json
 
 # =============================================================================
 # Functions and classes
@@ -53,7 +53,7 @@ class RORapi:
             query_response = request_retry(query, headers)  # request_retry is defined in utils_api/request_retry
             
             if query_response.status_code == 200:
-                resp = query_response.json()
+                resp = response_json(query_response)
                 dump_file = resp['hits']['hits'][0]['files'][0]['links']['self']
                 dump_string = resp['hits']['hits'][0]['files'][0]['key']
                 dump_json = dump_string.replace(".zip", "_schema_v2.json")
@@ -62,7 +62,7 @@ class RORapi:
                 if response.status_code == 200:
                     with zipfile.ZipFile(io.BytesIO(response.content)) as zip_ref:
                         with zip_ref.open(dump_json) as file:
-                            json_obj = json.load(file)
+                            json_obj = json_loads(file.read())
                             
             print('\t Last ROR data dump retrieved')
             return json_obj
@@ -16,7 +16,8 @@
 # modules to import
 # =============================================================================
 import yaml
-import pandas as pd
+from ..utils.utils_lazy import lazy_import
+pd = lazy_import('pandas')
 
 # =============================================================================
 # Functions and classes
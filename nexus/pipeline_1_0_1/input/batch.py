@@ -0,0 +1,210 @@
+# coding=utf-8
+
+# =============================================================================
+# """
+# .. module:: pipeline_input.batch.py
+# .. moduleauthor:: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# .. version:: 1.0
+#
+# :Copyright: Jean-Francois Desvignes for Science Data Nexus
+# Science Data Nexus, 2026
+# :Contact: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# :Updated: 19/10/2026
+# """
+# =============================================================================
+"""
+Batch runner: runs the pipeline of several projects (one config/project_variables.yaml per project) built on the same baseline DB.
+    - the baseline steps (bas_setup, bas_openalex, bas_ror, nor) run once for all the projects
+    - the baseline lookups (concepts, topics, ROR ids and locations) are read once and shared by the projects
+    - the projects share one HTTP connection pool and one rate limiter per API key
+    - the projects run in parallel as long as their estimated memory fits in the memory budget
+    python -m nexus.pipeline_1_0_1.input.batch project_a/config/project_variables.yaml project_b/config/project_variables.yaml
+        --configfile ~/config.yaml --jobs 4 --memory-mb 12000 --steps ddb
+"""
+# =============================================================================
+# modules to import
+# =============================================================================
+import os
+import sys
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import yaml
+if "nexus.pipeline_input.pipeline" not in sys.modules:  # run as a module (python -m), not from a project script
+    sys.modules["nexus.pipeline_input.pipeline"] = sys.modules[__package__]
+from .datapipeline import DataPipeLine
+from .utils.utils_metrics import start_run, end_run, metrics_step
+from .utils.utils_steps import StepScheduler
+from .utils.utils_lazy import load_lazy_modules
+
+# =============================================================================
+# Functions and classes
+# =============================================================================
+
+""" Steps writing the baseline DB shared by the projects, run once per batch """
+BASELINE_STEPS = ('bas_setup', 'bas_openalex', 'bas_ror', 'nor')
+""" Memory of a project (MB) = size of its raw Lens pickle x factor (DataFrames of the ddb step), default when not harvested yet """
+MEMORY_FACTOR = 8
+DEFAULT_PROJECT_MB = 2000
+
+
+def available_memory_mb():
+    # physical memory of the machine (MB), 8GB when unknown (eg Windows)
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 1024 / 1024
+    except (ValueError, OSError, AttributeError):
+        return 8192
+
+def load_project(project_config, configfile=None, data_dir=None):
+    # project_config: a config/project_variables.yaml file
+    # configfile: the API credentials (config.yaml), by default the one of the project variables
+    # data_dir: the data directory, by default the one of the project variables
+    # returns a DataPipeLine object and the project variables
+    with open(project_config, 'r') as f:
+        project_variables = yaml.safe_load(f)
+    root_dir = project_variables.get("main_directory") or os.path.dirname(os.path.dirname(os.path.abspath(project_config)))
+    p = DataPipeLine(
+        project_name=project_variables["project_name"],
+        ror_version=project_variables["ror_version"],
+        project_start_year=project_variables["project_start_year"],
+        project_end_year=project_variables["project_end_year"],
+        project_dir_name=project_variables.get("project_dir_name"),
+        root_dir=root_dir,
+        data_dir=data_dir or project_variables["data_directory"],
+        configfile=configfile or project_variables["configfile"],
+        baseline_version=project_variables.get("baseline_version", 'baselines'),
+        project_variant=project_variables.get("project_variant")
+    )
+    return p, project_variables
+
+
+class BatchRunner:
+    def __init__(self, project_configs, configfile=None, data_dir=None, jobs=2, memory_budget_mb=None, step_jobs=1):
+        # project_configs: list of config/project_variables.yaml files
+        # configfile, data_dir: override the values of the project variables (same credentials and data directory for all)
+        # jobs: the maximum number of projects running at the same time
+        # memory_budget_mb: the memory available for the projects, by default 60% of the physical memory
+        # step_jobs: the number of steps of a project running in parallel (see DataPipeLine.pipeline_run)
+        self.projects = []
+        self.memory = {}
+        for project_config in project_configs:
+            p, project_variables = load_project(project_config, configfile, data_dir)
+            if p.project_name in [q.project_name for q in self.projects]:
+                raise ValueError("Please enter a single config per project: {}".format(p.project_name))
+            self.projects.append(p)
+            self.memory[p.project_name] = project_variables.get("batch_memory_mb")
+        if not self.projects:
+            raise ValueError("Please enter at least one project config")
+        baselines = set(os.path.abspath(os.path.join(p.data_dir, p.baseline_version)) for p in self.projects)
+        if len(baselines) > 1:
+            raise ValueError("Please enter projects using the same baseline DB: {}".format(', '.join(sorted(baselines))))
+        self.baseline_db = os.path.join(baselines.pop(), 'baseline_data.duckdb')
+        self.jobs = max(int(jobs), 1)
+        self.memory_budget_mb = memory_budget_mb or round(available_memory_mb() * 0.6)
+        self.step_jobs = step_jobs
+        self.baseline_lock = threading.Lock()
+        for p in self.projects:
+            p._baseline_lock = self.baseline_lock  # the baseline DB is shared: one writer at a time across the projects
+
+    def estimate_memory_mb(self, p):
+        # memory needed by a project (MB): batch_memory_mb of its project variables or an estimate from its raw Lens records
+        if self.memory.get(p.project_name):
+            return self.memory[p.project_name]
+        variant = p.project_variant + "_" if p.project_variant else ""
+        raw_file = os.path.join(p.tempdir, '{}lens_scholarly_raw.pkl'.format(variant))
+        if os.path.exists(raw_file):
+            return max(round(os.path.getsize(raw_file) / 1024 / 1024 * MEMORY_FACTOR), 500)
+        return DEFAULT_PROJECT_MB
+
+    def run_baselines(self, steps=None, force=False):
+        # runs the baseline steps needed by the steps of the projects (once, with the first project) and loads the baseline lookups
+        from .core.ddb_baselines import preload_baseline_lookups
+        p = self.projects[0]
+        scheduler = StepScheduler(p.pipeline_steps(), os.path.join(p.tempdir, '_pipeline_state.json'))
+        selected = [name for name in scheduler.select(steps) if name in BASELINE_STEPS]
+        report = {}
+        if selected:
+            report = p.pipeline_run(selected, jobs=self.step_jobs, force=force)
+        if os.path.exists(self.baseline_db):
+            print("\t\t baseline lookups loaded ({} MB)".format(preload_baseline_lookups(self.baseline_db)))
+        return report
+
+    def run_project(self, p, steps=None, force=False):
+        with metrics_step(p.project_name, kind='project'):
+            return p.pipeline_run(steps, jobs=self.step_jobs, force=force, skip=BASELINE_STEPS)
+
+    def run(self, steps=None, force=False, outdir=None):
+        # steps: the steps to run for each project (default: all)
+        # returns a dictionary {project name: {'status': ..., 'seconds': ..., 'memory_mb': ..., 'steps': report of pipeline_run}}
+        print("\t >>> BATCH, {} projects, {} jobs, memory budget {} MB".format(len(self.projects), self.jobs, self.memory_budget_mb))
+        run = start_run('batch', outdir or os.path.join(self.projects[0].data_dir, '_batch_reports'))
+        results = {}
+        try:
+            with metrics_step('baselines', kind='step'):
+                baselines = self.run_baselines(steps, force)
+            if any(r['status'] in ('failed', 'cancelled') for r in baselines.values()):
+                raise ValueError("Baseline steps failed: {}".format(baselines))
+            pending = sorted(self.projects, key=self.estimate_memory_mb, reverse=True)  # largest projects first
+            running = {}
+            used_mb = 0
+            load_lazy_modules()  # before the worker threads
+            with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+                while pending or running:
+                    for p in list(pending):
+                        memory_mb = self.estimate_memory_mb(p)
+                        if len(running) >= self.jobs:
+                            break
+                        if running and used_mb + memory_mb > self.memory_budget_mb:
+                            continue  # waits for memory, a smaller project may fit
+                        print("\t\t project {} started ({} MB)".format(p.project_name, memory_mb))
+                        running[executor.submit(self.run_project, p, steps, force)] = (p, memory_mb, time.time())
+                        used_mb += memory_mb
+                        pending.remove(p)
+                    done, not_done = wait(list(running), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        p, memory_mb, start = running.pop(future)
+                        used_mb -= memory_mb
+                        result = {'memory_mb': memory_mb, 'seconds': round(time.time() - start, 3)}
+                        try:
+                            result['steps'] = future.result()
+                            failed = [n for n, r in result['steps'].items() if r['status'] in ('failed', 'cancelled')]
+                            result['status'] = 'failed' if failed else 'done'
+                        except Exception as e:
+                            result.update(status='failed', error=str(e), steps={})
+                        results[p.project_name] = result
+                        print("\t\t project {} {} in {:.1f}s".format(p.project_name, result['status'], result['seconds']))
+        finally:
+            run = end_run()
+            print("\t >>> BATCH report saved in {}".format(run.outdir))
+            for line in run.summary():
+                print("\t\t " + line)
+        self.last_run = run
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Runs the input pipeline of several projects sharing the same baseline DB')
+    parser.add_argument('project_configs', nargs='+', help='config/project_variables.yaml files of the projects')
+    parser.add_argument('--configfile', default=None, help='API credentials (config.yaml) used by all the projects')
+    parser.add_argument('--data-dir', default=None, help='data directory used by all the projects')
+    parser.add_argument('--steps', nargs='+', default=None, help='steps to run for each project (default: all)')
+    parser.add_argument('--jobs', type=int, default=2, help='number of projects running in parallel')
+    parser.add_argument('--step-jobs', type=int, default=1, help='number of steps of a project running in parallel')
+    parser.add_argument('--memory-mb', type=int, default=None, help='memory budget of the projects running in parallel (MB)')
+    parser.add_argument('--force', action='store_true', help='runs the steps even if they are up to date')
+    args = parser.parse_args(argv)
+    batch = BatchRunner(args.project_configs, configfile=args.configfile, data_dir=args.data_dir, jobs=args.jobs,
+                        memory_budget_mb=args.memory_mb, step_jobs=args.step_jobs)
+    results = batch.run(args.steps, force=args.force)
+    if any(r['status'] != 'done' for r in results.values()):
+        sys.exit(1)
+    return results
+
+
+if __name__ == '__main__':
+    main()
+
+# =============================================================================
+# End of script
+# =============================================================================
@@ -0,0 +1,138 @@
+# coding=utf-8
+
+# =============================================================================
+# """
+# .. module:: pipeline.input.bench.bench_ddb.py
+# .. moduleauthor:: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# .. version:: 1.0
+#
+# :Copyright: Jean-Francois Desvignes for Science Data Nexus
+# Science Data Nexus, 2026
+# :Contact: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# :Updated: 19/10/2026
+# """
+# =============================================================================
+"""
+Benchmark of create_ddb (each table builder and the organisations network) on synthetic data.
+Results are appended to a CSV file with the git commit to compare the timings across commits:
+    python -m nexus.pipeline_1_0_1.input.bench.bench_ddb --scales 10k 100k --workdir /tmp/bench
+    python -m nexus.pipeline_1_0_1.input.bench.bench_ddb --workdir /tmp/bench --compare <commit_a> <commit_b>
+"""
+# =============================================================================
+# modules to import
+# =============================================================================
+import os
+import time
+import argparse
+import subprocess
+import pandas as pd
+from .synthetic_data import SyntheticLensData, SCALES
+from ..core.ddb_data import create_ddb, lens_include_profile
+from ..utils.utils_metrics import start_run, end_run, peak_rss_mb
+
+# =============================================================================
+# Functions and classes
+# =============================================================================
+
+def git_commit():
+    # the short hash of the current commit ('+' when the working tree has changes), 'unknown' outside a git repo
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=here, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=here, capture_output=True, text=True).stdout.strip()
+        return commit + ('+' if dirty else '')
+    except Exception:
+        return 'unknown'
+
+def synthetic_inputs(scale, workdir, seed=42):
+    # scale: a key of SCALES (eg '100k') or a number of records
+    # returns the pickle of the records and the baseline DB, generated once per scale and seed in workdir
+    nb_records = SCALES.get(str(scale).lower(), None) or int(scale)
+    os.makedirs(workdir, exist_ok=True)
+    infile = os.path.join(workdir, 'synthetic_{}_{}.pkl'.format(nb_records, seed))
+    baseline_db = os.path.join(workdir, 'synthetic_baseline_{}.duckdb'.format(seed))
+    generator = SyntheticLensData(seed=seed)
+    generation_seconds = 0
+    if not os.path.exists(baseline_db):
+        generator.create_baseline_db(baseline_db)
+    if not os.path.exists(infile):
+        print('\t generating {} synthetic records'.format(nb_records))
+        start = time.perf_counter()
+        df = generator.records_frame(nb_records, fields=lens_include_profile('ddb_full'))
+        df.to_pickle(infile)
+        generation_seconds = round(time.perf_counter() - start, 3)
+        del df
+    return nb_records, infile, baseline_db, generation_seconds
+
+def run_benchmark(scales=('10k',), workdir='bench_data', results_file=None, seed=42, network_max_team_size=20, tables=None, jobs=(1,)):
+    # times each table builder and the network step of create_ddb for each scale
+    # jobs: the numbers of table builders running in parallel to compare, the speedup of ddb.total is relative to jobs=1
+    # returns a DF of the results (one row per scale and builder), appended to results_file (CSV) if given
+    commit = git_commit()
+    rows = []
+    for scale, nb_jobs in [(scale, j) for scale in scales for j in jobs]:
+        nb_records, infile, baseline_db, generation_seconds = synthetic_inputs(scale, workdir, seed)
+        outfile = os.path.join(workdir, 'bench_project_{}.duckdb'.format(nb_records))
+        if os.path.exists(outfile):
+            os.remove(outfile)
+        print('\t scale {} ({} records), {} jobs'.format(scale, nb_records, nb_jobs))
+        run = start_run('bench_{}'.format(nb_records), os.path.join(workdir, '_run_reports'))
+        start = time.perf_counter()
+        create_ddb(infile, outfile, '', baseline_db, network_max_team_size=network_max_team_size, tables=tables, jobs=nb_jobs)
+        total_seconds = round(time.perf_counter() - start, 3)
+        end_run()
+        for r in run.records:
+            rows.append({'commit': commit, 'date': time.strftime("%Y-%m-%d %H:%M:%S"), 'scale': str(scale),
+                         'nb_records': nb_records, 'seed': seed, 'jobs': nb_jobs, 'step': r['name'], 'status': r['status'],
+                         'wall_seconds': r['wall_seconds'], 'cpu_seconds': r['cpu_seconds'],
+                         'peak_rss_mb': r['peak_rss_mb'], 'rows_in': r['rows_in'], 'rows_out': r['rows_out'],
+                         'overlap': r.get('overlap')})
+        rows.append({'commit': commit, 'date': time.strftime("%Y-%m-%d %H:%M:%S"), 'scale': str(scale),
+                     'nb_records': nb_records, 'seed': seed, 'jobs': nb_jobs, 'step': 'ddb.total', 'status': 'done',
+                     'wall_seconds': total_seconds, 'cpu_seconds': None, 'peak_rss_mb': peak_rss_mb(),
+                     'rows_in': nb_records, 'rows_out': None, 'generation_seconds': generation_seconds})
+    results = pd.DataFrame(rows)
+    total = results[results.step == 'ddb.total']
+    base = total[total.jobs == 1].set_index('scale')['wall_seconds']
+    results.loc[total.index, 'speedup'] = [round(base[s] / w, 2) if s in base.index and w else None for s, w in zip(total.scale, total.wall_seconds)]
+    if results_file:
+        results.to_csv(results_file, mode='a', index=False, header=not os.path.exists(results_file))
+    return results
+
+def compare_results(results_file, base_commit, commit):
+    # returns a DF of the wall time per scale and step for 2 commits (last run of each) and their ratio
+    df = pd.read_csv(results_file, dtype={'commit': str})
+    df['jobs'] = df['jobs'].fillna(1).astype(int) if 'jobs' in df.columns else 1
+    for c in (base_commit, commit):
+        if c not in set(df.commit):
+            raise ValueError("Please enter a commit of the results file: {}".format(", ".join(df.commit.unique())))
+    df = df[df.commit.isin([base_commit, commit])].drop_duplicates(subset=['commit', 'nb_records', 'jobs', 'step'], keep='last')
+    df = df.pivot_table(index=['nb_records', 'jobs', 'step'], columns='commit', values='wall_seconds')
+    df['ratio'] = df[commit] / df[base_commit]
+    return df.reset_index()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark of the DuckDB tables built from synthetic Lens records')
+    parser.add_argument('--scales', nargs='+', default=['10k'], help='scales ({}) or numbers of records'.format(', '.join(SCALES)))
+    parser.add_argument('--workdir', default='bench_data', help='folder of the synthetic data and of the DBs')
+    parser.add_argument('--results', default=None, help='CSV file of the results (default: [workdir]/bench_ddb.csv)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--max-team-size', type=int, default=20)
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1], help='numbers of table builders running in parallel, eg 1 4')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE_COMMIT', 'COMMIT'), help='compares 2 commits of the results file')
+    args = parser.parse_args(argv)
+    results_file = args.results or os.path.join(args.workdir, 'bench_ddb.csv')
+    if args.compare:
+        print(compare_results(results_file, *args.compare).to_string(index=False))
+        return
+    results = run_benchmark(args.scales, args.workdir, results_file, args.seed, args.max_team_size, jobs=args.jobs)
+    print(results[['scale', 'jobs', 'step', 'status', 'wall_seconds', 'cpu_seconds', 'peak_rss_mb', 'rows_out', 'overlap', 'speedup']].to_string(index=False))
+    print('\t results saved in {}'.format(results_file))
+
+
+if __name__ == '__main__':
+    main()
+
+# =============================================================================
+# End of script
+# =============================================================================
@@ -0,0 +1,80 @@
+# coding=utf-8
+
+# =============================================================================
+# """
+# .. module:: pipeline.input.bench.bench_harvest.py
+# .. moduleauthor:: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# .. version:: 1.0
+#
+# :Copyright: Jean-Francois Desvignes for Science Data Nexus
+# Science Data Nexus, 2026
+# :Contact: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# :Updated: 19/10/2026
+# """
+# =============================================================================
+"""
+Throughput and resilience of the Lens harvest against the local fake API server (no Lens key needed):
+    python -m nexus.pipeline_1_0_1.input.bench.bench_harvest --records 20000 --error-rate 0.1 --workers 4
+Reports the records harvested per second, the API calls and the 429 responses, and checks that
+no record is lost or duplicated.
+"""
+# =============================================================================
+# modules to import
+# =============================================================================
+import time
+import argparse
+from .fake_server import FakeAPIServer
+from ..api.lens_api import GetLensData
+from ..utils.utils_api import APICallTracker
+
+# =============================================================================
+# Functions and classes
+# =============================================================================
+
+def run_harvest_benchmark(nb_records=10000, start_year=2015, end_year=2024, page_size=1000, nb_workers=1, max_partition_size=None,
+                          latency=0.0, error_rate=0.0, rate_limit=None, requests_per_minute=600, include='minimal_ids', seed=42):
+    # harvests all the synthetic records of the fake server with GetLensData.get_lens_data
+    # returns a dictionary with the timings, the server statistics and the completeness of the harvest
+    server = FakeAPIServer(nb_records, seed=seed, latency=latency, error_rate=error_rate, rate_limit=rate_limit, retry_after=0.2)
+    with server:
+        lens = GetLensData(api_configuration=server.api_config(requests_per_minute)['APILENSS'],
+                           query_string={"match": {"title": "synthetic"}},
+                           page_size=page_size,
+                           api_include=include)
+        start = time.perf_counter()
+        df, df_aggregation, nb_total, max_score, call_tracker = lens.get_lens_data(
+            start_year, end_year, call_tracker=APICallTracker(), max_partition_size=max_partition_size, nb_workers=nb_workers)
+        seconds = time.perf_counter() - start
+        stats = dict(server.stats)
+    nb_unique = df['lens_id'].nunique() if nb_total else 0
+    return {
+        'records_expected': nb_records, 'records_harvested': nb_total, 'records_unique': nb_unique,
+        'complete': nb_unique == nb_records and nb_total == nb_records,
+        'seconds': round(seconds, 3), 'records_per_second': round(nb_total / seconds, 1) if seconds else None,
+        'requests': stats['requests'], 'errors_429': stats['errors_429'], 'mb_sent': round(stats['bytes_sent'] / 1024 / 1024, 2),
+        'workers': nb_workers, 'page_size': page_size, 'latency': latency, 'error_rate': error_rate}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark of the Lens harvest against the local fake API server')
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--partition-size', type=int, default=None, help='max_partition_size of the harvest plan')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int, default=None, help='requests per minute accepted by the server')
+    parser.add_argument('--include', default='minimal_ids', help='include profile of the requests (eg ddb_full)')
+    args = parser.parse_args(argv)
+    result = run_harvest_benchmark(args.records, page_size=args.page_size, nb_workers=args.workers,
+                                   max_partition_size=args.partition_size, latency=args.latency, error_rate=args.error_rate,
+                                   rate_limit=args.rate_limit, include=args.include)
+    for k, v in result.items():
+        print('\t {:<20} {}'.format(k, v))
+
+
+if __name__ == '__main__':
+    main()
+
+# =============================================================================
+# End of script
+# =============================================================================
@@ -0,0 +1,87 @@
+# coding=utf-8
+
+# =============================================================================
+# """
+# .. module:: pipeline.input.bench.bench_imports.py
+# .. moduleauthor:: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# .. version:: 1.0
+#
+# :Copyright: Jean-Francois Desvignes for Science Data Nexus
+# Science Data Nexus, 2026
+# :Contact: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# :Updated: 19/10/2026
+# """
+# =============================================================================
+"""
+Import time budget of the pipeline package: each module is imported in a new interpreter
+(python -X importtime) and checked against its budget, and the heavy libraries must not be loaded.
+    python -m nexus.pipeline_1_0_1.input.bench.bench_imports
+Exits with 1 when a budget is exceeded (eg in CI).
+"""
+# =============================================================================
+# modules to import
+# =============================================================================
+import os
+import sys
+import subprocess
+
+# =============================================================================
+# Functions and classes
+# =============================================================================
+
+PACKAGE = __package__.rsplit('.', 1)[0] if __package__ else 'nexus.pipeline_1_0_1.input'
+""" Modules and their import budget (seconds, cumulative import time of the module) """
+IMPORT_BUDGETS = {
+    'datapipeline': 0.3,
+    'utils.utils_steps': 0.1,
+    'utils.utils_metrics': 0.1,
+    'utils.utils_api': 0.1,
+    'utils.utils_json': 0.1,
+}
+""" Libraries that must not be loaded by importing the pipeline (they are loaded by the steps using them) """
+HEAVY_MODULES = ['pandas', 'numpy', 'duckdb', 'requests', 'pyalex', 'sqlalchemy', 'recordlinkage', 'sklearn', 'ibis', 'scipy']
+
+
+def import_time(module):
+    # imports a module in a new interpreter, returns its cumulative import time (seconds)
+    # and the heavy libraries actually loaded (not only registered by lazy_import)
+    code = ("import {0}; "
+            "from {1}.utils.utils_lazy import is_loaded; "
+            "print([m for m in {2} if is_loaded(m)])").format(module, PACKAGE, HEAVY_MODULES)
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([root, os.environ.get('PYTHONPATH', '')]))
+    r = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, env=env)
+    if r.returncode != 0:
+        raise RuntimeError("Import of {} failed: {}".format(module, r.stderr.strip().splitlines()[-1]))
+    seconds = None
+    for line in r.stderr.splitlines():
+        parts = [p.strip() for p in line.replace('import time:', '').split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            seconds = int(parts[1]) / 1e6
+    loaded = eval(r.stdout.strip().splitlines()[-1])
+    return seconds, loaded
+
+def check_import_budgets(budgets=None):
+    # returns a list of (module, seconds, budget, heavy libraries loaded, ok)
+    results = []
+    for name, budget in (budgets or IMPORT_BUDGETS).items():
+        seconds, loaded = import_time('{}.{}'.format(PACKAGE, name))
+        ok = seconds is not None and seconds <= budget and not loaded
+        results.append((name, seconds, budget, loaded, ok))
+    return results
+
+def main():
+    results = check_import_budgets()
+    for name, seconds, budget, loaded, ok in results:
+        print('\t {:<22} {:>7.3f}s (budget {:.2f}s) {} {}'.format(name, seconds or 0, budget, 'ok' if ok else 'FAILED',
+                                                                  'loads ' + ', '.join(loaded) if loaded else ''))
+    if not all(r[-1] for r in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
+
+# =============================================================================
+# End of script
+# =============================================================================
@@ -0,0 +1,442 @@
+# coding=utf-8
+
+# =============================================================================
+# """
+# .. module:: pipeline.input.bench.fake_server.py
+# .. moduleauthor:: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# .. version:: 1.0
+#
+# :Copyright: Jean-Francois Desvignes for Science Data Nexus
+# Science Data Nexus, 2026
+# :Contact: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# :Updated: 19/10/2026
+# """
+# =============================================================================
+"""
+Local stand-in for the Lens, OpenAlex and Zenodo (ROR dump) APIs serving synthetic data,
+to test the harvests offline (scroll pagination, rate limits, retries) and measure their throughput:
+    python -m nexus.pipeline_1_0_1.input.bench.fake_server --records 10000 --latency 0.05 --error-rate 0.05
+The API configurations of the server (same keys as config.yaml) are given by FakeAPIServer.api_config().
+Routes:
+    POST /lens/scholarly/search      Lens search (size, include, scroll, scroll_id), size=0 for counts
+    POST /lens/scholarly/aggregate   Lens aggregations (terms, date_histogram, histogram, avg/min/max/sum/cardinality)
+    GET  /openalex/[entity]/[id]     OpenAlex single entity (works, topics, concepts, institutions, domains, fields, subfields)
+    GET  /openalex/[entity]          OpenAlex list (filter=key:value, page, per-page, cursor)
+    GET  /zenodo/api/communities/ror-data/records   Zenodo listing of the ROR dump, the file is served by /zenodo/files/
+"""
+# =============================================================================
+# modules to import
+# =============================================================================
+import io
+import time
+import random
+import zipfile
+import argparse
+import datetime
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .synthetic_data import SyntheticLensData
+from ..utils.utils_json import json_dumps, json_loads
+
+# =============================================================================
+# Functions and classes
+# =============================================================================
+
+""" Lens query fields and their path in the records (a list in the path is flattened) """
+LENS_FIELDS = {
+    'field_of_study': 'fields_of_study',
+    'author.affiliation.address.country_code': 'authors.affiliations.country_code',
+    'author.affiliation.name': 'authors.affiliations.name',
+    'author.affiliation.grid_id': 'authors.affiliations.grid_id',
+    'funding.organisation': 'funding.org',
+    'mesh_term.mesh_heading': 'mesh_terms.mesh_heading',
+}
+OPENALEX_ENTITIES = ['works', 'topics', 'concepts', 'institutions', 'domains', 'fields', 'subfields']
+ROR_DUMP = 'v1.0-{}-ror-data.zip'
+
+
+def field_values(record, field):
+    # returns the list of values of a Lens field in a record (eg 'source.title', 'author.affiliation.address.country_code')
+    values = [record]
+    for key in LENS_FIELDS.get(field, field).split('.'):
+        flat = []
+        for v in values:
+            v = v.get(key) if isinstance(v, dict) else None
+            if isinstance(v, list):
+                flat = flat + v
+            elif v is not None:
+                flat.append(v)
+        values = flat
+    return values
+
+def epoch_ms(day):
+    return int(datetime.datetime(day.year, day.month, day.day, tzinfo=datetime.timezone.utc).timestamp() * 1000)
+
+
+class FakeAPIServer:
+    def __init__(self, nb_records=10000, seed=42, host='127.0.0.1', port=0, latency=0.0, error_rate=0.0,
+                 rate_limit=None, retry_after=1):
+        # nb_records: number of synthetic records served by the Lens and OpenAlex works endpoints
+        # latency: seconds added to each response
+        # error_rate: share of the requests answered by a 429 (random, seeded)
+        # rate_limit: maximum number of requests per minute (429 above), None for no limit
+        # retry_after: the value of the Retry-After header of the 429 responses (seconds)
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = []  # timestamps of the requests of the last minute (rate limit)
+        self.stats = {'requests': 0, 'errors_429': 0, 'records_sent': 0, 'bytes_sent': 0}
+        self.scrolls = {}
+        self.generator = SyntheticLensData(seed=seed)
+        self.records = [r for chunk in self.generator.iter_records(nb_records) for r in chunk]
+        self.dates = [datetime.date.fromisoformat(r['date_published']) for r in self.records]
+        self.openalex = self.openalex_entities()
+        self.ror_dump = None
+        self.httpd = None
+        self.thread = None
+
+    # =============================================================================
+    # Server
+    # =============================================================================
+    @property
+    def url(self):
+        return 'http://{}:{}/'.format(self.host, self.port)
+
+    def api_config(self, requests_per_minute=600):
+        # the API configurations of the server, same keys as config.yaml (eg lens = GetLensData(api_configuration=server.api_config()['APILENSS'], ...))
+        return {
+            'APILENSS': {'endpoint': self.url + 'lens/scholarly/', 'apikey': 'fake-key', 'requests_per_minute': requests_per_minute},
+            'APIOA': {'endpoint': self.url + 'openalex/', 'apikey': 'contact@example.org'},
+            'APIZENODO': {'endpoint': self.url + 'zenodo/api/'},
+        }
+
+    def start(self):
+        # starts the server in a background thread (port=0 uses a free port)
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server.handle(self, 'GET')
+
+            def do_POST(self):
+                server.handle(self, 'POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def throttle(self):
+        # returns the remaining number of requests of the minute, or None when the request gets a 429
+        with self.lock:
+            self.stats['requests'] += 1
+            now = time.time()
+            self.calls = [t for t in self.calls if now - t < 60]
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.stats['errors_429'] += 1
+                return None
+            if self.rate_limit and len(self.calls) >= self.rate_limit:
+                self.stats['errors_429'] += 1
+                return None
+            self.calls.append(now)
+            return self.rate_limit - len(self.calls) if self.rate_limit else 1000
+
+    def handle(self, request, method):
+        if self.latency:
+            time.sleep(self.latency)
+        # the body is read before any response (a 429 too), else it is left in the keep-alive connection
+        length = int(request.headers.get('Content-Length', 0))
+        payload = request.rfile.read(length) if length else b''
+        remaining = self.throttle()
+        headers = {}
+        if remaining is None:
+            status, body, content_type = 429, json_dumps({'message': 'Too many requests'}), 'application/json'
+            headers['Retry-After'] = str(self.retry_after)
+            headers['x-rate-limit-retry-after-seconds'] = str(self.retry_after)
+            remaining = 0
+        else:
+            try:
+                status, body, content_type = self.route(request, method, payload)
+            except Exception as e:
+                status, body, content_type = 500, json_dumps({'message': str(e)}), 'application/json'
+        headers['x-rate-limit-remaining-request-per-minute'] = str(remaining)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        with self.lock:
+            self.stats['bytes_sent'] += len(body)
+        request.send_response(status)
+        request.send_header('Content-Type', content_type)
+        request.send_header('Content-Length', str(len(body)))
+        for k, v in headers.items():
+            request.send_header(k, v)
+        request.end_headers()
+        request.wfile.write(body)
+
+    def route(self, request, method, payload=b''):
+        url = urlparse(request.path)
+        path = [p for p in url.path.split('/') if p]
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if method == 'POST' and path[:2] == ['lens', 'scholarly']:
+            query = json_loads(payload) if payload else {}
+            if path[2:] == ['search']:
+                return 200, json_dumps(self.lens_search(query)), 'application/json'
+            if path[2:] == ['aggregate']:
+                return 200, json_dumps(self.lens_aggregate(query)), 'application/json'
+        if method == 'GET' and path[:1] == ['openalex'] and len(path) in (2, 3) and path[1] in OPENALEX_ENTITIES:
+            if len(path) == 3:
+                entity = self.openalex[path[1]].get(path[2])
+                if entity is None:
+                    return 404, json_dumps({'error': 'Not found'}), 'application/json'
+                return 200, json_dumps(entity), 'application/json'
+            return 200, json_dumps(self.openalex_list(path[1], params)), 'application/json'
+        if method == 'GET' and path[:4] == ['zenodo', 'api', 'communities', 'ror-data']:
+            return 200, json_dumps(self.zenodo_listing()), 'application/json'
+        if method == 'GET' and path[:2] == ['zenodo', 'files']:
+            return 200, self.ror_dump_file(), 'application/zip'
+        return 404, json_dumps({'error': 'Unknown route {} {}'.format(method, url.path)}), 'application/json'
+
+    # =============================================================================
+    # Lens
+    # =============================================================================
+    def lens_filters(self, query):
+        # the year_published and date_published clauses of a query (other clauses, eg topic searches, match all records)
+        # (must_not: records matching none of its clauses)
+        filters = []
+
+        def walk(clause, filters):
+            if isinstance(clause, list):
+                for c in clause:
+                    walk(c, filters)
+            elif isinstance(clause, dict):
+                for k, v in clause.items():
+                    if k == 'must_not':
+                        for c in (v if isinstance(v, list) else [v]):
+                            sub = []
+                            walk(c, sub)
+                            if sub:
+                                filters.append(lambda i, sub=sub: not all(f(i) for f in sub))
+                    elif k == 'match' and isinstance(v, dict) and 'year_published' in v:
+                        y = int(v['year_published'])
+                        filters.append(lambda i, y=y: self.dates[i].year == y)
+                    elif k == 'range' and isinstance(v, dict) and 'year_published' in v:
+                        r = v['year_published']
+                        gte, lte = int(r.get('gte', 0)), int(r.get('lte', 9999))
+                        filters.append(lambda i, gte=gte, lte=lte: gte <= self.dates[i].year <= lte)
+                    elif k == 'range' and isinstance(v, dict) and 'date_published' in v:
+                        r = v['date_published']
+                        gte = datetime.date.fromisoformat(r.get('gte', '0001-01-01')[:10])
+                        lte = datetime.date.fromisoformat(r.get('lte', '9999-12-31')[:10])
+                        filters.append(lambda i, gte=gte, lte=lte: gte <= self.dates[i] <= lte)
+                    elif k in ('bool', 'must', 'filter'):
+                        walk(v, filters)
+
+        walk(query, filters)
+        return [i for i in range(len(self.records)) if all(f(i) for f in filters)]
+
+    def lens_page(self, indices, include):
+        data = []
+        for i in indices:
+            r = self.records[i]
+            data.append({k: r[k] for k in include if k in r} if include else r)
+        with self.lock:
+            self.stats['records_sent'] += len(data)
+        return data
+
+    def lens_search(self, query):
+        if query.get('scroll_id'):
+            scroll = self.scrolls.get(query['scroll_id'])
+            if scroll is None:
+                return {'total': 0, 'results': 0, 'data': [], 'scroll_id': None, 'max_score': 0}
+            page = scroll['indices'][scroll['position']:scroll['position'] + scroll['size']]
+            scroll['position'] += len(page)
+            data = self.lens_page(page, query.get('include') or scroll['include'])
+            return {'total': len(scroll['indices']), 'results': len(data), 'data': data,
+                    'scroll_id': query['scroll_id'], 'max_score': 1.0}
+        indices = self.lens_filters(query.get('query', {}))
+        size = int(query.get('size', 10))
+        start = int(query.get('from', 0))
+        page = indices[start:start + size]
+        data = self.lens_page(page, query.get('include'))
+        scroll_id = None
+        if query.get('scroll') and size > 0:
+            with self.lock:
+                scroll_id = 'scroll-{}'.format(len(self.scrolls) + 1)
+                self.scrolls[scroll_id] = {'indices': indices, 'position': start + len(page), 'size': size, 'include': query.get('include')}
+        return {'total': len(indices), 'results': len(data), 'data': data, 'scroll_id': scroll_id, 'max_score': 1.0 if indices else 0}
+
+    def lens_aggregate(self, query):
+        indices = self.lens_filters(query.get('query', {}))
+        return {'total': len(indices), 'aggregations': self.aggregate(indices, query.get('aggregations') or query.get('aggs') or {})}
+
+    def aggregate(self, indices, aggregations):
+        # computes Lens/Elasticsearch style aggregations on a list of records, sub-aggregations can be set
+        # next to the aggregation type or inside it (eg {"date_histogram": {"field": ..., "aggregations": {...}}})
+        result = {}
+        for name, body in aggregations.items():
+            sub = body.get('aggregations') or body.get('aggs')
+            agg_type = [k for k in body if k not in ('aggregations', 'aggs')][0]
+            params = dict(body[agg_type])
+            sub = params.pop('aggregations', None) or params.pop('aggs', None) or sub
+            field = params.get('field')
+            if agg_type in ('terms', 'histogram', 'date_histogram'):
+                groups = {}
+                for i in indices:
+                    if agg_type == 'date_histogram':
+                        d = self.dates[i]
+                        interval = str(params.get('interval', params.get('calendar_interval', 'year'))).lower()
+                        keys = [d.replace(day=1) if interval == 'month' else d.replace(month=1, day=1)]
+                    else:
+                        keys = field_values(self.records[i], field)
+                        if agg_type == 'histogram':
+                            step = params.get('interval', 1)
+                            keys = [v // step * step for v in keys]
+                    for k in set(keys):
+                        groups.setdefault(k, []).append(i)
+                buckets = []
+                for k, members in groups.items():
+                    bucket = {'key': k, 'doc_count': len(members)}
+                    if agg_type == 'date_histogram':
+                        bucket = {'key': epoch_ms(k), 'key_as_string': k.isoformat(), 'doc_count': len(members)}
+                    if sub:
+                        bucket.update(self.aggregate(members, sub))
+                    buckets.append(bucket)
+                if agg_type == 'terms':
+                    buckets = sorted(buckets, key=lambda b: (-b['doc_count'], str(b['key'])))[:int(params.get('size', 10))]
+                else:
+                    buckets = sorted(buckets, key=lambda b: b['key'])
+                result[name] = {'buckets': buckets}
+            else:
+                values = [v for i in indices for v in field_values(self.records[i], field)]
+                if agg_type == 'cardinality':
+                    value = len(set(values))
+                elif agg_type == 'value_count':
+                    value = len(values)
+                elif not values:
+                    value = None
+                else:
+                    value = {'avg': lambda x: sum(x) / len(x), 'sum': sum, 'min': min, 'max': max}[agg_type](values)
+                result[name] = {'value': value}
+        return result
+
+    # =============================================================================
+    # OpenAlex
+    # =============================================================================
+    def openalex_entities(self):
+        # OpenAlex entities {entity: {short id: record}} built from the synthetic baselines and records
+        oa = 'https://openalex.org/'
+        entities = {e: {} for e in OPENALEX_ENTITIES}
+        ids = {'wikidata': None, 'wikipedia': None}
+        levels = {0: 'domains', 1: 'fields', 2: 'subfields'}
+        for c in self.generator.concepts:
+            entities['concepts'][c['category_id']] = {'id': oa + c['category_id'], 'display_name': c['display_name'], 'level': c['level'],
+                                                      'ancestors': [{'id': oa + c['parent']}] if c['parent'] else [], 'ids': dict(ids)}
+            entities[levels[c['level']]][c['category_id']] = {'id': oa + c['category_id'], 'display_name': c['display_name'], 'ids': dict(ids)}
+        parent = {c['category_id']: c['parent'] for c in self.generator.concepts}
+        for c in self.generator.concepts:
+            if c['level'] == 2:
+                t = 'T' + c['category_id'][2:]
+                field = parent[c['category_id']]
+                entities['topics'][t] = {'id': oa + t, 'display_name': c['display_name'], 'ids': {'openalex': oa + t},
+                                         'subfield': {'id': oa + c['category_id'], 'display_name': c['display_name']},
+                                         'field': {'id': oa + field}, 'domain': {'id': oa + parent[field]}}
+        for i, name in enumerate(self.generator.org_names):
+            key = 'I{}'.format(i)
+            entities['institutions'][key] = {'id': oa + key, 'display_name': name, 'ror': self.generator.org_ror[i],
+                                             'country_code': self.generator.org_country[i]}
+        for i, r in enumerate(self.records):
+            key = 'W{}'.format(i)
+            entities['works'][key] = {'id': oa + key, 'doi': r['external_ids'][0]['value'], 'publication_year': r['year_published'],
+                                      'type': r['publication_type'], 'cited_by_count': r['scholarly_citations_count']}
+        return entities
+
+    def openalex_list(self, entity, params):
+        # list of entities, filter as "key:value,key:value" (exact match on the top level fields)
+        results = list(self.openalex[entity].values())
+        for f in [x for x in params.get('filter', '').split(',') if ':' in x]:
+            k, v = f.split(':', 1)
+            results = [r for r in results if str(r.get(k)) == v]
+        per_page = min(int(params.get('per-page', params.get('per_page', 25))), 200)
+        cursor = params.get('cursor')
+        if cursor:
+            start = 0 if cursor == '*' else int(cursor)
+            page = None
+        else:
+            page = int(params.get('page', 1))
+            start = (page - 1) * per_page
+        end = start + per_page
+        next_cursor = str(end) if cursor and end < len(results) else None
+        return {'meta': {'count': len(results), 'db_response_time_ms': 1, 'page': page, 'per_page': per_page, 'next_cursor': next_cursor},
+                'results': results[start:end]}
+
+    # =============================================================================
+    # Zenodo (ROR data dump)
+    # =============================================================================
+    def zenodo_listing(self):
+        key = ROR_DUMP.format(datetime.date.today().isoformat())
+        return {'hits': {'total': 1, 'hits': [{'id': 1, 'files': [{'key': key, 'links': {'self': self.url + 'zenodo/files/' + key}}]}]}}
+
+    def ror_dump_file(self):
+        # the zipped ROR dump (schema v2 JSON) of the synthetic organisations
+        if self.ror_dump is None:
+            key = ROR_DUMP.format(datetime.date.today().isoformat())
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as z:
+                z.writestr(key.replace('.zip', '_schema_v2.json'), json_dumps(self.generator.ror_records()))
+            self.ror_dump = buffer.getvalue()
+        return self.ror_dump
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local fake Lens/OpenAlex/Zenodo API serving synthetic data')
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to each response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of the requests answered by a 429')
+    parser.add_argument('--rate-limit', type=int, default=None, help='maximum number of requests per minute')
+    args = parser.parse_args(argv)
+    server = FakeAPIServer(args.records, args.seed, args.host, args.port, args.latency, args.error_rate, args.rate_limit)
+    server.start()
+    print('\t fake API server on {} ({} records)'.format(server.url, len(server.records)))
+    for k, v in server.api_config().items():
+        print('\t\t {}: {}'.format(k, v))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+        print('\t {}'.format(server.stats))
+
+
+if __name__ == '__main__':
+    main()
+
+# =============================================================================
+# End of script
+# =============================================================================
@@ -0,0 +1,251 @@
+# coding=utf-8
+
+# =============================================================================
+# """
+# .. module:: pipeline.input.bench.synthetic_data.py
+# .. moduleauthor:: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# .. version:: 1.0
+#
+# :Copyright: Jean-Francois Desvignes for Science Data Nexus
+# Science Data Nexus, 2026
+# :Contact: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# :Updated: 19/10/2026
+# """
+# =============================================================================
+"""
+Seeded generator of Lens-scholarly-shaped records and of matching baseline tables
+(concepts, topics, ROR) to measure the pipeline without a Lens API key.
+The same seed always gives the same records and baselines.
+"""
+# =============================================================================
+# modules to import
+# =============================================================================
+import os
+import numpy as np
+import pandas as pd
+import duckdb
+from ..utils.utils_json import records_to_frame
+
+# =============================================================================
+# Functions and classes
+# =============================================================================
+
+SCALES = {'10k': 10000, '100k': 100000, '1m': 1000000, '5m': 5000000}
+PUBLICATION_TYPES = ['journal article', 'conference proceedings article', 'book chapter', 'review', 'preprint', 'dataset', 'editorial', 'book', 'report', 'other']
+PUBLICATION_TYPES_P = [0.62, 0.1, 0.07, 0.06, 0.05, 0.03, 0.03, 0.01, 0.02, 0.01]
+COUNTRIES = ['AU', 'US', 'GB', 'FR', 'DE', 'CN', 'JP', 'CA', 'NZ', 'IN', 'BR', 'IT', 'ES', 'NL', 'SG']
+SOURCE_TYPES = ['Journal', 'Conference Proceedings', 'Book Series', 'Repository']
+
+
+class SyntheticLensData:
+    def __init__(self, seed=42, nb_organisations=5000, nb_sources=2000, nb_concepts=(19, 300, 3000), nb_funders=300,
+                 start_year=2015, end_year=2024):
+        # seed: the random seed (records and baselines are reproducible)
+        # nb_organisations: number of distinct organisations (affiliations, with ROR records)
+        # nb_sources: number of distinct sources (journals, conferences)
+        # nb_concepts: number of concepts for levels 0, 1 and 2 of the hierarchy (fields of study)
+        # nb_funders: number of distinct funding organisations
+        self.seed = seed
+        self.start_year = start_year
+        self.end_year = end_year
+        rng = np.random.default_rng(seed)
+        """ Organisations (Zipf-like popularity, a few large universities and a long tail) """
+        self.org_names = np.array(['Organisation {:05d}'.format(i) for i in range(nb_organisations)], dtype=object)
+        self.org_country = rng.choice(COUNTRIES, size=nb_organisations, p=self.country_weights())
+        self.org_grid = np.array(['grid.{}.{:x}'.format(1000 + i, i) for i in range(nb_organisations)], dtype=object)
+        self.org_ror = np.array(['https://ror.org/0{:08x}'.format(i * 7919) for i in range(nb_organisations)], dtype=object)
+        self.org_p = self.zipf_weights(nb_organisations, 1.1, rng)
+        self.org_cum = np.cumsum(self.org_p)
+        self.org_geonames = rng.integers(1000000, 9999999, size=nb_organisations)
+        self.org_lat = rng.uniform(-45, 60, size=nb_organisations).round(4)
+        self.org_lng = rng.uniform(-120, 175, size=nb_organisations).round(4)
+        """ Sources """
+        self.source_title = np.array(['Journal of Synthetic Studies {:04d}'.format(i) for i in range(nb_sources)], dtype=object)
+        self.source_publisher = rng.choice(['Publisher {}'.format(i) for i in range(50)], size=nb_sources)
+        self.source_type = rng.choice(SOURCE_TYPES, size=nb_sources, p=[0.8, 0.1, 0.05, 0.05])
+        self.source_country = rng.choice(COUNTRIES, size=nb_sources)
+        self.source_p = self.zipf_weights(nb_sources, 1.0, rng)
+        """ Concepts (3 levels: domains, disciplines, topics) """
+        self.concepts = []
+        parents = [None]
+        for level, n in enumerate(nb_concepts):
+            level_concepts = []
+            for i in range(n):
+                parent = parents[rng.integers(len(parents))]
+                level_concepts.append({'category_id': 'C{}{:06d}'.format(level, i), 'level': level,
+                                       'display_name': 'Concept L{} {:05d}'.format(level, i), 'parent': parent})
+            self.concepts = self.concepts + level_concepts
+            parents = [c['category_id'] for c in level_concepts]
+        self.concept_names = np.array([c['display_name'] for c in self.concepts], dtype=object)
+        self.concept_p = self.zipf_weights(len(self.concepts), 0.9, rng)
+        self.concept_cum = np.cumsum(self.concept_p)
+        """ Funders """
+        self.funder_names = np.array(['Funder {:04d}'.format(i) for i in range(nb_funders)], dtype=object)
+        self.funder_country = rng.choice(COUNTRIES, size=nb_funders)
+        self.funder_p = self.zipf_weights(nb_funders, 1.2, rng)
+        self.funder_cum = np.cumsum(self.funder_p)
+
+    @staticmethod
+    def country_weights():
+        w = np.array([30, 20, 10, 8, 8, 8, 4, 4, 2, 2, 1, 1, 1, 0.5, 0.5])
+        return w / w.sum()
+
+    @staticmethod
+    def zipf_weights(n, a, rng):
+        w = 1 / np.arange(1, n + 1) ** a
+        w = w[rng.permutation(n)]
+        return w / w.sum()
+
+    def iter_records(self, nb_records, chunk_size=50000):
+        # yields lists of records (dictionaries with the shape of the Lens scholarly API) by chunk
+        for chunk_start in range(0, nb_records, chunk_size):
+            n = min(chunk_size, nb_records - chunk_start)
+            rng = np.random.default_rng([self.seed, chunk_start])
+            years = rng.integers(self.start_year, self.end_year + 1, size=n)
+            days = rng.integers(0, 365, size=n)
+            pubtypes = rng.choice(PUBLICATION_TYPES, size=n, p=PUBLICATION_TYPES_P)
+            sources = draw(np.cumsum(self.source_p), n, rng)
+            # authors per record: lognormal (median ~5) with 0.2% of large consortia (200 to 3000 authors)
+            nb_authors = np.maximum(1, rng.lognormal(1.6, 0.8, size=n).astype(int))
+            consortia = rng.random(n) < 0.002
+            nb_authors[consortia] = rng.integers(200, 3000, size=consortia.sum())
+            citations = rng.negative_binomial(1, 0.08, size=n)
+            references = rng.poisson(35, size=n)
+            nb_orgs_per_record = np.minimum(nb_authors, rng.integers(1, 8, size=n))
+            records = []
+            for i in range(n):
+                lens_id = '{:03d}-{:03d}-{:03d}-{:03d}-{:03d}'.format(*divmod_digits(chunk_start + i))
+                record_orgs = draw(self.org_cum, nb_orgs_per_record[i], rng)
+                authors = []
+                for a in range(nb_authors[i]):
+                    aff_orgs = [record_orgs[rng.integers(len(record_orgs))]]
+                    if rng.random() < 0.15 and len(record_orgs) > 1:  # joint appointments
+                        aff_orgs.append(record_orgs[rng.integers(len(record_orgs))])
+                    affiliations = []
+                    for o in set(aff_orgs):
+                        affiliations.append({
+                            'name': self.org_names[o], 'name_original': self.org_names[o], 'grid_id': self.org_grid[o],
+                            'country_code': self.org_country[o],
+                            'ids': [{'type': 'grid', 'value': self.org_grid[o]}, {'type': 'ror', 'value': self.org_ror[o]}]})
+                    ids = [{'type': 'magid', 'value': str(rng.integers(1000000000, 9000000000))}]
+                    if rng.random() < 0.6:
+                        ids.append({'type': 'orcid', 'value': '0000-000{}-{:04d}-{:04d}'.format(rng.integers(1, 4), rng.integers(10000), rng.integers(10000))})
+                    authors.append({'first_name': 'A{}'.format(a), 'last_name': 'Author{}'.format(rng.integers(100000)),
+                                    'initials': 'A', 'ids': ids, 'affiliations': affiliations})
+                s = sources[i]
+                fos = list(set(self.concept_names[draw(self.concept_cum, rng.integers(1, 6), rng)]))
+                record = {
+                    'lens_id': lens_id,
+                    'external_ids': [{'type': 'doi', 'value': '10.5555/synthetic.{}'.format(chunk_start + i)},
+                                     {'type': 'magid', 'value': str(3000000000 + chunk_start + i)}],
+                    'source': {'title': self.source_title[s], 'publisher': self.source_publisher[s],
+                               'issn': [{'type': 'print', 'value': '{:04d}-{:04d}'.format(s // 10000, s % 10000)}],
+                               'type': self.source_type[s], 'country': self.source_country[s]},
+                    'year_published': int(years[i]),
+                    'date_published': '{}-{:02d}-{:02d}'.format(years[i], 1 + days[i] // 31 % 12, 1 + days[i] % 28),
+                    'is_open_access': bool(rng.random() < 0.45),
+                    'publication_type': pubtypes[i],
+                    'author_count': int(nb_authors[i]),
+                    'scholarly_citations_count': int(citations[i]),
+                    'referenced_by_count': int(citations[i]),
+                    'references_resolved_count': int(references[i] * 0.9),
+                    'references_count': int(references[i]),
+                    'patent_citations_count': int(rng.random() < 0.03),
+                    'authors': authors,
+                    'fields_of_study': fos,
+                    'mesh_terms': None,
+                    'funding': None,
+                }
+                if rng.random() < 0.3:
+                    record['mesh_terms'] = [{'mesh_heading': 'Heading {}'.format(m), 'mesh_id': 'D{:06d}'.format(m),
+                                             'qualifier_name': None, 'qualifier_id': None} for m in rng.integers(0, 5000, size=rng.integers(1, 4))]
+                if rng.random() < 0.4:
+                    f = draw(self.funder_cum, rng.integers(1, 3), rng)
+                    record['funding'] = [{'org': self.funder_names[x], 'funding_id': 'G{}'.format(rng.integers(1000000)),
+                                          'country': self.funder_country[x]} for x in set(f)]
+                records.append(record)
+            yield records
+
+    def records_frame(self, nb_records, fields=None, chunk_size=50000):
+        # returns the records as a json normalised DF (the input of create_ddb)
+        frames = [records_to_frame(r, fields) for r in self.iter_records(nb_records, chunk_size=chunk_size)]
+        return pd.concat(frames, ignore_index=True)
+
+    def baseline_tables(self):
+        # returns the baseline tables read by create_ddb (concepts, topics and ROR) as a dictionary {table: DF}
+        c = pd.DataFrame(self.concepts)
+        names = c.set_index('category_id')['display_name']
+        parent = c.set_index('category_id')['parent']
+        """ concepts_hierarchy """
+        h = c[['category_id', 'level', 'display_name']].copy()
+        h['raw_display_name'] = h['display_name']
+        level_1_parent = h.category_id.map(parent)
+        h['parent_1'] = np.where(h.level == 1, h.category_id, np.where(h.level == 2, level_1_parent, 'N/A'))
+        h['parent_0'] = np.where(h.level == 0, h.category_id, np.where(h.level == 1, level_1_parent, level_1_parent.map(parent)))
+        h['display_name_1'] = h.parent_1.map(names)
+        h['display_name_0'] = h.parent_0.map(names)
+        h['nb_parent_1'] = 1
+        h['nb_parent_0'] = 1
+        """ topics_nodes and topics_edgelist_parents (levels 0-2 of the concepts used as domain/field/subfield) """
+        t = c[['category_id', 'level', 'display_name']].rename(columns={'category_id': 'ids.openalex'})
+        t['subfield.id'] = np.where(t.level == 2, t['ids.openalex'], None)
+        t['field.id'] = np.where(t.level == 2, t['ids.openalex'].map(parent), np.where(t.level == 1, t['ids.openalex'], None))
+        t['domain.id'] = np.where(t.level == 0, t['ids.openalex'], pd.Series(t['field.id']).map(parent))
+        e = c.loc[c.parent.notna(), ['category_id', 'parent']].rename(columns={'category_id': 'ids.openalex'})
+        e['nb_parents'] = 1
+        """ ROR """
+        n = len(self.org_names)
+        ror = pd.DataFrame({'id': self.org_ror, 'ror_display': self.org_names, 'status': 'active', 'main_type': 'education'})
+        ror_external_id = pd.DataFrame({'id': self.org_ror, 'type': 'grid', 'value': self.org_grid, 'preferred': self.org_grid})
+        ror_location = pd.DataFrame({'id': self.org_ror, 'geonames_id': self.org_geonames})
+        ror_location_id = pd.DataFrame({'geonames_id': self.org_geonames, 'country_code': self.org_country,
+                                        'country_name': self.org_country, 'lat': self.org_lat, 'lng': self.org_lng,
+                                        'name': ['City {}'.format(i) for i in range(n)]}).drop_duplicates(subset='geonames_id')
+        return {'concepts_hierarchy': h, 'topics_nodes': t, 'topics_edgelist_parents': e, 'ror': ror,
+                'ror_external_id': ror_external_id, 'ror_location': ror_location, 'ror_location_id': ror_location_id}
+
+    def ror_records(self):
+        # returns the organisations as ROR schema v2 records (the content of the ROR data dump)
+        records = []
+        for i in range(len(self.org_names)):
+            records.append({
+                'id': self.org_ror[i], 'status': 'active', 'established': 1850 + i % 170, 'types': ['education'],
+                'names': [{'value': self.org_names[i], 'types': ['ror_display', 'label'], 'lang': 'en'}],
+                'links': [{'type': 'website', 'value': 'https://www.org{:05d}.example'.format(i)}],
+                'domains': [], 'relationships': [],
+                'external_ids': [{'type': 'grid', 'all': [self.org_grid[i]], 'preferred': self.org_grid[i]}],
+                'locations': [{'geonames_id': int(self.org_geonames[i]), 'geonames_details': {
+                    'name': 'City {}'.format(i), 'country_code': self.org_country[i], 'country_name': self.org_country[i],
+                    'lat': float(self.org_lat[i]), 'lng': float(self.org_lng[i])}}],
+                'admin': {'created': {'date': '2020-01-01', 'schema_version': '1.0'},
+                          'last_modified': {'date': '2026-01-01', 'schema_version': '2.1'}}})
+        return records
+
+    def create_baseline_db(self, db_file):
+        # writes the baseline tables in a DuckDB file (schema 'baselines'), replaces an existing file
+        if os.path.exists(db_file):
+            os.remove(db_file)
+        conn = duckdb.connect(db_file)
+        conn.execute("CREATE SCHEMA IF NOT EXISTS baselines;")
+        for table, df in self.baseline_tables().items():
+            conn.execute("CREATE TABLE baselines.{} AS SELECT * FROM df;".format(table))
+        conn.close()
+        return db_file
+
+
+def draw(cum_weights, size, rng):
+    # weighted draw with replacement from cumulative weights (faster than rng.choice(p=...) for small sizes)
+    return np.minimum(np.searchsorted(cum_weights, rng.random(size) * cum_weights[-1]), len(cum_weights) - 1)
+
+def divmod_digits(i):
+    # the 5 groups of 3 digits of a Lens-like id (eg 000-024-593-676-416)
+    groups = []
+    for _ in range(5):
+        i, r = divmod(i, 1000)
+        groups.append(r)
+    return tuple(reversed(groups))
+
+
+# =============================================================================
+# End of script
+# =============================================================================
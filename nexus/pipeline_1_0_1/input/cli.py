@@ -0,0 +1,125 @@
+# coding=utf-8
+
+# =============================================================================
+# """
+# .. module:: pipeline_input.cli.py
+# .. moduleauthor:: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# .. version:: 1.0
+#
+# :Copyright: Jean-Francois Desvignes for Science Data Nexus
+# Science Data Nexus, 2026
+# :Contact: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# :Updated: 19/10/2026
+# """
+# =============================================================================
+"""
+Command line over a DataPipeLine object (see the project script input/input_[PROJECT].py):
+    python input_project_regioninnovation.py --steps len ddb --years 2019-2023 --jobs 2
+    python input_project_regioninnovation.py --steps len --plan
+--plan does not run anything: it lists the steps to run or skip and sizes the Lens harvest with count-only
+requests (records, requests, download volume and duration).
+"""
+# =============================================================================
+# modules to import
+# =============================================================================
+import time
+import argparse
+
+# =============================================================================
+# Functions and classes
+# =============================================================================
+
+""" Average size of a Lens record in the API responses (bytes, JSON) by include profile (None = full records) """
+LENS_RECORD_BYTES = {'minimal_ids': 300, 'network_only': 5000, 'ddb_full': 7000, None: 15000}
+
+
+def parse_years(value):
+    # '2019-2023' or '2020' => (start year, end year)
+    parts = value.split('-')
+    try:
+        start, end = int(parts[0]), int(parts[-1])
+    except ValueError:
+        raise argparse.ArgumentTypeError("Please enter years as YYYY or YYYY-YYYY")
+    if len(parts) > 2 or start > end:
+        raise argparse.ArgumentTypeError("Please enter years as YYYY or YYYY-YYYY")
+    return start, end
+
+def estimate_harvest(plan, requests_per_minute=10, record_bytes=7000, nb_workers=1, seconds_per_request=1.0):
+    # plan: the DF of DataPipeLine.pipeline_len_plan()
+    # returns a dictionary with the number of records, requests, the download volume (MB) and the duration (seconds)
+    # the duration is bounded by the rate limit of the key (shared by all the workers) and by the response time
+    nb_requests = int(plan['nb_requests'].sum())
+    nb_records = int(plan.loc[plan.category == 'main', 'nb_records'].sum())
+    rate_seconds = nb_requests * 60 / requests_per_minute
+    response_seconds = nb_requests * seconds_per_request / max(nb_workers, 1)
+    return {'nb_records': nb_records, 'nb_requests': nb_requests, 'preflight_requests': int(plan['preflight_requests'].sum()),
+            'download_mb': round(nb_records * record_bytes / 1024 / 1024, 1),
+            'duration_seconds': round(max(rate_seconds, response_seconds))}
+
+def format_duration(seconds):
+    return '{:d}h{:02d}m{:02d}s'.format(int(seconds // 3600), int(seconds % 3600 // 60), int(seconds % 60))
+
+def print_run_summary(report, run, seconds):
+    # timing and throughput of a run (report of pipeline_run and its RunMetrics)
+    print("\t >>> SUMMARY ({} total)".format(format_duration(seconds)))
+    for name, r in report.items():
+        print("\t\t {:<14} {:<10} {:>10.1f}s".format(name, r['status'], r['seconds']))
+    if run is not None:
+        totals = run.totals
+        calls = totals.get('api_calls', 0)
+        mb = totals.get('bytes_downloaded', 0) / 1024 / 1024
+        rows = sum(r['rows_out'] or 0 for r in run.records if r['kind'] == 'table')
+        print("\t\t {} API calls ({:.1f} per minute), {:.1f} MB downloaded ({:.2f} MB/s), {:.0f}s throttled".format(
+            calls, calls * 60 / seconds if seconds else 0, mb, mb / seconds if seconds else 0, totals.get('throttle_seconds', 0)))
+        if rows:
+            print("\t\t {} rows written in the DB tables ({:.0f} rows/s)".format(rows, rows / seconds if seconds else 0))
+
+def run_pipeline_cli(pipeline_object, argv=None):
+    # pipeline_object: a DataPipeLine object (the project settings)
+    # argv: the command line arguments (eg sys.argv[1:])
+    steps = [s.name for s in pipeline_object.pipeline_steps()]
+    parser = argparse.ArgumentParser(description='Runs steps of the input pipeline with their dependencies')
+    parser.add_argument('--steps', nargs='+', choices=steps, default=None, help='steps to run (default: all), with the steps they depend on')
+    parser.add_argument('--variant', default=None, help='project variant (prefix of the tables and temp files)')
+    parser.add_argument('--years', type=parse_years, default=None, help='years of the harvest, YYYY or YYYY-YYYY')
+    parser.add_argument('--jobs', type=int, default=1, help='number of steps running in parallel')
+    parser.add_argument('--workers', type=int, default=None, help='number of Lens partitions harvested in parallel')
+    parser.add_argument('--ddb-jobs', type=int, default=None, help='number of DuckDB table builders running in parallel')
+    parser.add_argument('--force', action='store_true', help='runs the steps even if they are up to date')
+    parser.add_argument('--plan', action='store_true', help='dry run: steps to run and size of the Lens harvest (count-only requests)')
+    parser.add_argument('--page-size', type=int, default=1000, help='records per Lens request (for --plan)')
+    parser.add_argument('--seconds-per-request', type=float, default=1.0, help='average response time of the Lens API (for --plan)')
+    args = parser.parse_args(argv)
+    if args.variant is not None:
+        pipeline_object.project_variant = args.variant
+    if args.years is not None:
+        pipeline_object.project_start_year, pipeline_object.project_end_year = args.years
+        pipeline_object.years = [i for i in range(args.years[0], args.years[1] + 1)]
+    if args.workers is not None:
+        pipeline_object.lens_workers = args.workers
+    if args.ddb_jobs is not None:
+        pipeline_object.ddb_jobs = args.ddb_jobs
+    if args.plan:
+        plan = pipeline_object.pipeline_run(args.steps, jobs=args.jobs, force=args.force, plan_only=True)
+        if any(name == 'len' and action == 'run' for name, action in plan):
+            print("\t >>> PLAN, Lens harvest {}-{} (count-only requests)".format(pipeline_object.project_start_year, pipeline_object.project_end_year))
+            harvest = pipeline_object.pipeline_len_plan(page_size=args.page_size)
+            print(harvest.to_string(index=False))
+            estimate = estimate_harvest(harvest,
+                                        requests_per_minute=pipeline_object.api_config_lenss.get('requests_per_minute', 10),
+                                        record_bytes=LENS_RECORD_BYTES.get(pipeline_object.lens_include_profile, LENS_RECORD_BYTES[None]),
+                                        nb_workers=pipeline_object.lens_workers,
+                                        seconds_per_request=args.seconds_per_request)
+            print("\t\t {nb_records} records, {nb_requests} requests, ~{download_mb} MB to download".format(**estimate))
+            print("\t\t estimated duration {} ({} preflight requests used)".format(format_duration(estimate['duration_seconds']), estimate['preflight_requests']))
+            return plan, harvest, estimate
+        return plan, None, None
+    start = time.perf_counter()
+    report = pipeline_object.pipeline_run(args.steps, jobs=args.jobs, force=args.force)
+    print_run_summary(report, pipeline_object.last_run, time.perf_counter() - start)
+    return report
+
+
+# =============================================================================
+# End of script
+# =============================================================================
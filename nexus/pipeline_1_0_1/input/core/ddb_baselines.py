@@ -16,12 +16,12 @@
 # =============================================================================
 # modules to import
 # =============================================================================
-import numpy as np
 import pandas as pd
-from recordlinkage.preprocessing import clean
-import recordlinkage
 import os
+import datetime
+import threading
 import duckdb
+from ..api.lens_api import iter_lens_buckets
 # =============================================================================
 # Functions and classes
 # =============================================================================
@@ -35,6 +35,46 @@ if __name__ == '__main__':
     print_hi('Python start')
 
 
+""" Baseline lookups read by the table builders of the project DBs (name: query on the baseline DB) """
+BASELINE_LOOKUPS = {
+    'concepts_hierarchy': "SELECT * from baselines.concepts_hierarchy;",
+    'topics_nodes': "SELECT * from baselines.topics_nodes;",
+    'topics_edgelist_parents': "SELECT * from baselines.topics_edgelist_parents;",
+    'ror_external_id': "SELECT B.id, A.type, A.value  FROM baselines.ror_external_id A inner join baselines.ror B on A.id = B.id where B.status = 'active';",
+    'ror_location': "SELECT * FROM baselines.ror_location A inner join baselines.ror_location_id B on A.geonames_id=B.geonames_id;",
+}
+_baseline_cache = {}
+_baseline_cache_lock = threading.Lock()
+
+def baseline_lookup(source_baseline_version, name):
+    # source_baseline_version = the baseline DB file, name = a key of BASELINE_LOOKUPS
+    # returns the lookup as a DF, read once per baseline DB (again if the file was modified) and shared by
+    # all the projects run in the same process (eg the batch runner): the DF must not be modified in place
+    key = (os.path.abspath(source_baseline_version), name)
+    stamp = os.path.getmtime(source_baseline_version)
+    with _baseline_cache_lock:
+        cached = _baseline_cache.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        conn_bas = duckdb.connect(source_baseline_version, read_only=True)
+        try:
+            df = conn_bas.execute(BASELINE_LOOKUPS[name]).fetchdf()
+        finally:
+            conn_bas.close()
+        _baseline_cache[key] = (stamp, df)
+    return df
+
+def preload_baseline_lookups(source_baseline_version, names=None):
+    # reads the baseline lookups once (eg before running several projects), returns their size in MB
+    size = 0
+    for name in names or BASELINE_LOOKUPS:
+        size += baseline_lookup(source_baseline_version, name).memory_usage(deep=True).sum()
+    return round(size / 1024 / 1024, 1)
+
+def clear_baseline_lookups():
+    with _baseline_cache_lock:
+        _baseline_cache.clear()
+
 def create_baseline_table(db_directory, baseline_version):
     # db_infile = a DuckDB (.duckdb) DB
     try:
@@ -52,6 +92,7 @@ def create_baseline_table(db_directory, baseline_version):
         conn.close()
     except Exception as e:
         print(e)
+        raise
     finally:
         print('\t baseline DB created in {}'.format(db_infile))
 
@@ -193,6 +234,7 @@ def get_classification_openalex(db_directory, baseline_version, file_concepts, f
         conn.close()
     except Exception as e:
         print(e)
+        raise
     finally:
         files = [my_file_concepts, file_concepts, file_topics]
         for file_path in files:
@@ -276,6 +318,7 @@ def openalex_concepts_hierarchy(db_directory, baseline_version):
         conn.close()
     except Exception as e:
         print(e)
+        raise
     finally: 
         print('\t classification hierarchy from OA\'s concepts')
 
@@ -346,8 +389,60 @@ def get_ror_organisations(db_directory, baseline_version, json_object):
         conn.close()
     except Exception as e:
         print(e)
+        raise
     finally:
         print('\t baseline DB updated in {}'.format(db_infile))
+def bucket_year(bucket):
+    # bucket: a 'date_histogram' bucket from the Lens aggregate API
+    # returns the year of the bucket (the key is either a date string or an epoch in milliseconds)
+    if bucket.get('key_as_string'):
+        return int(str(bucket['key_as_string'])[:4])
+    key = bucket.get('key')
+    if isinstance(key, (int, float)) and abs(key) > 10000:
+        return datetime.datetime.fromtimestamp(key / 1000, tz=datetime.timezone.utc).year
+    return int(str(key)[:4])
+
+def citation_distribution_from_aggregations(aggregations, year_agg='year_published', cites_agg='referenced_by_count'):
+    # aggregations = the 'aggregations' dictionary of a single Lens aggregate request:
+    #   {year_agg: {"buckets": [{"key": ..., "doc_count": N, cites_agg: {"buckets": [{"key": c, "doc_count": n}, ...]}}]}}
+    # returns a DF with one row per (year_published, referenced_by_count) and cumulative percentiles:
+    #   nb_records = records with exactly c citations, cum_records = records with c citations or less,
+    #   percentile = share (0-100) of the records of the year with c citations or less (ie the threshold to reach c),
+    #   out of all the records of the year (doc_count of the year bucket, including the records without citation count
+    #   and beyond the size of the terms aggregation)
+    rows = []
+    nb_year = {}
+    for y in iter_lens_buckets(aggregations.get(year_agg, {})):
+        year = bucket_year(y)
+        nb_year[year] = nb_year.get(year, 0) + int(y.get('doc_count', 0))
+        for c in iter_lens_buckets(y.get(cites_agg, {})):
+            if c.get('doc_count', 0) > 0:
+                rows.append({'year_published': year, 'referenced_by_count': int(c['key']), 'nb_records': int(c['doc_count'])})
+    df = pd.DataFrame(rows, columns=['year_published', 'referenced_by_count', 'nb_records'])
+    if df.shape[0] == 0:
+        return df.assign(cum_records=pd.Series(dtype='int64'), percentile=pd.Series(dtype='float64'))
+    df = (df.groupby(['year_published', 'referenced_by_count'], as_index=False)['nb_records'].sum()
+            .sort_values(by=['year_published', 'referenced_by_count'])
+            .reset_index(drop=True))
+    df['cum_records'] = df.groupby('year_published')['nb_records'].cumsum()
+    df['percentile'] = 100 * df['cum_records'] / df['year_published'].map(nb_year).clip(lower=df['cum_records'])
+    return df
+
+def citation_percentile_thresholds(df, percentiles=(50, 75, 90, 95, 99), group_by=('parent_1', 'pubtype_id', 'year_published')):
+    # df = a citation distribution from citation_distribution_from_aggregations() (with the group_by columns)
+    # returns, for each group and percentile p, the lowest number of citations (referenced_by_count) at which
+    #   the cumulative share of records reaches p (records above the threshold are in the top (100 - p)%)
+    group_by = list(group_by)
+    d = df.sort_values(by=group_by + ['referenced_by_count'])
+    rows = []
+    for p in percentiles:
+        x = (d[d['percentile'] >= p]
+             .groupby(group_by, as_index=False, observed=True)['referenced_by_count'].first()
+             .rename(columns={'referenced_by_count': 'threshold'}))
+        x['percentile'] = p
+        rows.append(x)
+    return pd.concat(rows, ignore_index=True)
+
 # =============================================================================
 # Global variables
 # =============================================================================
@@ -20,13 +20,20 @@ import numpy as np
 import pandas as pd
 import duckdb
 from itertools import combinations
-from collections import Counter
-from recordlinkage.preprocessing import clean
+from collections import Counter, defaultdict
 import math
-import recordlinkage
 import os
-import ibis
-import ast
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from ..utils.utils_metrics import metrics_step, metrics_current, metrics_attach
+from ..utils.utils_lazy import load_lazy_modules
+from .ddb_baselines import baseline_lookup
+from .ddb_topics import create_table_topic_membership
+from .ddb_serving import create_serving_tables, serving_rows
+from .ddb_network_rollup import create_network_rollup
+from .ddb_network_top import create_networks_top
+from .ddb_network_analytics import create_network_analytics
+from .ddb_network_sample import sample_records_sql, SAMPLE_SEED
 
 
 # =============================================================================
@@ -41,8 +48,63 @@ def print_hi(name):
 if __name__ == '__main__':
     print_hi('Python start')
 
+""" Columns of the raw data (json normalised Lens scholarly records) read by each table builder """
+TABLE_BUILDER_COLUMNS = {
+    'records_id': ['lens_id', 'external_ids'],
+    'source': ['source.title', 'source.publisher', 'source.issn', 'source.type', 'source.country'],
+    'records': ['lens_id', 'year_published', 'is_open_access', 'publication_type', 'author_count',
+                'scholarly_citations_count', 'references_resolved_count', 'references_count', 'patent_citations_count',
+                'source.title', 'source.publisher', 'source.type', 'source.country'],
+    'categories': ['lens_id', 'fields_of_study', 'mesh_terms'],
+    'contribution_information': ['lens_id', 'authors'],
+    'funding': ['lens_id', 'funding'],
+}
+""" Lens 'include' profiles: the table builders whose columns are requested from the API """
+LENS_INCLUDE_PROFILES = {
+    'minimal_ids': ['records_id'],
+    'ddb_full': list(TABLE_BUILDER_COLUMNS),
+    'network_only': ['source', 'records', 'contribution_information'],  # records needs the source table
+}
+
+def lens_include_profile(profile):
+    # profile = a name in LENS_INCLUDE_PROFILES (eg 'ddb_full')
+    # returns the list of Lens fields to include in the API requests (top level fields, eg 'source' for 'source.title')
+    if profile not in LENS_INCLUDE_PROFILES:
+        raise ValueError("Please enter a valid include profile: {}".format(", ".join(LENS_INCLUDE_PROFILES)))
+    fields = []
+    for builder in LENS_INCLUDE_PROFILES[profile]:
+        for column in TABLE_BUILDER_COLUMNS[builder]:
+            field = column.split('.')[0]
+            if field not in fields:
+                fields.append(field)
+    return fields
+
+def check_builder_columns(df, builders=None):
+    # df = the raw data (json normalised), builders = the table builders to check (by default all)
+    # returns a dictionary {builder: [missing columns]} for the builders that would not find all their columns
+    missing = {}
+    for builder in builders or TABLE_BUILDER_COLUMNS:
+        m = [c for c in TABLE_BUILDER_COLUMNS[builder] if c not in df.columns]
+        if m:
+            missing[builder] = m
+    return missing
+
+def prepare_builder_records(df, builders):
+    # df = the raw data (json normalised), builders = the table builders to run
+    # returns df with the missing source fields as 'other', raises an error if a builder would not find its columns
+    missing = check_builder_columns(df, builders)
+    if missing:
+        raise ValueError("Please harvest the records with the columns of the table builders (see lens_include_profile): {}".format(
+            '; '.join("{}: {}".format(k, ', '.join(v)) for k, v in missing.items())))
+    for i in TABLE_BUILDER_COLUMNS['source']:
+        if i in df.columns:
+            df[i] = df[i].fillna('other')
+    return df
+
 def create_table_records_id(df, rec_id, conn, label):
     """External ids table"""
+    sql_code = "drop TABLE if exists project.{}records_id;".format(label)
+    conn.execute(sql_code)
     d = df[[rec_id, 'external_ids']].copy()
     d = d.explode('external_ids')
     dict_df = d['external_ids'].apply(pd.Series)
@@ -110,10 +172,7 @@ def create_table_records(df, d_source, rec_id, conn, label):
 def generate_categories_oaconcepts(df, rec_id, source_baseline_version):
     # outfile = os.path.join(project_variables['data_directory'], project_variables['baseline_version'], 'baseline_data.duckdb')    
     df = df.loc[df.type=='fields_of_study', ['lens_id', 'value']]
-    conn_bas = duckdb.connect(source_baseline_version, read_only=True)
-    sql_code = "SELECT * from baselines.concepts_hierarchy;" # list of concepts with their hierarchy (discipline and domain)
-    c_parents = conn_bas.execute(sql_code).fetchdf()
-    conn_bas.close()
+    c_parents = baseline_lookup(source_baseline_version, 'concepts_hierarchy') # list of concepts with their hierarchy (discipline and domain)
     df.rename(columns={'value': 'raw_display_name'}, inplace=True)
     df = df.merge(c_parents, on='raw_display_name', how='left').drop(columns="raw_display_name")
     df['is_not_linked'] = df.groupby(rec_id)['category_id'].transform(lambda x: all([pd.isna(element) for element in x]))
@@ -121,12 +180,8 @@ def generate_categories_oaconcepts(df, rec_id, source_baseline_version):
 def generate_categories_oatopics(df, rec_id, source_baseline_version):
     # outfile = os.path.join(project_variables['data_directory'], project_variables['baseline_version'], 'baseline_data.duckdb')    
     df = df.loc[df.type=='fields_of_study', ['lens_id', 'value']]
-    conn_bas = duckdb.connect(source_baseline_version, read_only=True)
-    sql_query = "SELECT * from baselines.topics_nodes;"
-    topics = conn_bas.execute(sql_query).fetchdf()
-    sql_query = "SELECT * from baselines.topics_edgelist_parents;"
-    e = conn_bas.execute(sql_query).fetchdf()
-    conn_bas.close()
+    topics = baseline_lookup(source_baseline_version, 'topics_nodes')
+    e = baseline_lookup(source_baseline_version, 'topics_edgelist_parents')
     t = topics.loc[topics.level != 3, ['ids.openalex', 'level', 'display_name']].copy().rename(columns={'ids.openalex': 'category_id'})
     e = e[['ids.openalex', 'parent']].rename(columns={'ids.openalex': 'category_id'})
     e = t[['category_id', 'level']].merge(e, on='category_id', how='left', suffixes=("", "_p"))
@@ -227,28 +282,53 @@ def create_table_organisations_id(org_ids, conn, label):
     sql_code = "CREATE TABLE project.{}organisations_id AS SELECT * FROM org_ids;".format(label)
     conn.execute(sql_code)
     print("\t\t table_organisations_id")
-def generate_collaboration_network(rec_id, publications_df, network_sample_size=None):
-    # rec_id: the unique record ID (e.g. lens_id)
-    # publications_df: the list of records with affiliation data
-    # Preparation step (subset the list of publications)
-    # publications_df = publications_df[publications_df.lens_id == '000-024-593-676-416'].copy()
-    if network_sample_size:
-        # Get a sample of 1,000 unique values in the 'lens_id' column
-        sampled_ids = publications_df[rec_id].drop_duplicates().sample(n=network_sample_size, random_state=42)
-        # If you need the rows corresponding to these unique 'lens_id' values, use `isin()`
-        publications_df = publications_df[publications_df[rec_id].isin(sampled_ids)]
-    # Step 1: Group and reduce org_id to unique sets within each contribution
-    d = (publications_df
-         .groupby([rec_id, "contribution_id"])["org_id"]
-         .agg(lambda orgs: tuple(set(orgs)))
-         .reset_index())
-    nb_authors = d.groupby(by=[rec_id])['contribution_id'].agg(nb_authors=("nunique"))
+def team_pair_weights(org_sets):
+    # org_sets: the organisations of each contribution of a record (1 set per author)
+    # returns the normalised weights {(from, to): weight} of the pairwise method (Steps 2 to 7 of
+    # generate_collaboration_network) in closed form: the authors with the same set of organisations (profile) are counted
+    # once, the cost depends on the number of profiles and not on the number of authors
+    # - 2 authors with disjoint profiles S and T add nb_pairs(S, T) to each pair of S x T (external collaboration)
+    # - 2 authors sharing an organisation add nb_pairs(S, T) to each (a, a) of S & T (joint appointments are removed)
+    # with nb_pairs(S, T) = the number of distinct unordered pairs of S x T = |S|.|T| - C(|S & T|, 2)
+    profiles = list(Counter(frozenset(o for o in orgs if o == o) for orgs in org_sets).items())  # o == o: no NaN
+    weights = defaultdict(float)
+    for i, (s, n_s) in enumerate(profiles):
+        for t, n_t in profiles[i:]:
+            nb_contribution_pairs = n_s * (n_s - 1) // 2 if s is t else n_s * n_t
+            if not nb_contribution_pairs or not s or not t:
+                continue
+            shared = s & t
+            w = nb_contribution_pairs * (len(s) * len(t) - math.comb(len(shared), 2))
+            if shared:
+                for a in shared:
+                    weights[(a, a)] += w
+            else:
+                for a in s:
+                    for b in t:
+                        weights[(a, b) if a <= b else (b, a)] += w
+    total = sum(weights.values())
+    return {p: w / total for p, w in weights.items()} if total else {}
+
+def large_team_edges(rec_id, d):
+    # d: the sets of organisations of the contributions (Step 1 of generate_collaboration_network) of large teams
+    # returns the normalised weights per record (rec_id, from, to, is_ext, weight), as Step 7 of the pairwise method
+    rows = []
+    for rec, orgs in d.groupby(rec_id)['org_id']:
+        for (a, b), w in team_pair_weights(orgs).items():
+            rows.append((rec, a, b, a != b, w))
+    return pd.DataFrame(rows, columns=[rec_id, 'from', 'to', 'is_ext', 'weight'])
+
+def pairwise_team_edges(rec_id, d, nb_authors):
+    # d: the sets of organisations of the contributions (Step 1 of generate_collaboration_network)
+    # returns the normalised weights per record from the pairs of contributions
     # Step 2: Generate all pairs of contributions per rec_id
     contribution_pairs = (d.groupby(rec_id)["contribution_id"]
                           .apply(lambda orgs: list(combinations(orgs, 2)))
                           .explode()
                           .dropna()
                           .reset_index())
+    if contribution_pairs.empty:  # only records with 1 contribution
+        return pd.DataFrame(columns=[rec_id, 'pair', 'is_ext', 'weight', 'from', 'to']).astype({'is_ext': bool, 'weight': float})
     # Step 3: Split pairs into 'from' and 'to' columns
     contribution_pairs[["from", "to"]] = pd.DataFrame(contribution_pairs["contribution_id"].tolist(), index=contribution_pairs.index)
     contribution_pairs.rename(columns={"contribution_id": "contribution_pairs"}, inplace=True)
@@ -287,9 +367,49 @@ def generate_collaboration_network(rec_id, publications_df, network_sample_size=
     o = o[(o.is_ext) | (o['to'] == o['from'])]
     # Normalize weights by rec_id
     o['weight'] /= o.groupby(rec_id)['weight'].transform("sum")
+    return o
+
+def generate_collaboration_network(rec_id, publications_df, network_sample_size=None, by=None, max_team_size=None):
+    # rec_id: the unique record ID (e.g. lens_id)
+    # publications_df: the list of records with affiliation data
+    # by: a column of the records (eg 'year') => 1 network per value, with the column in the edges and nodes
+    #   (the weights are normalised per record, the networks of the values add up to the network of all the records)
+    # max_team_size: the records with more contributions have their weights computed in closed form (see team_pair_weights)
+    #   instead of pairs of contributions, None for pairs of contributions for all the records
+    # Preparation step (subset the list of publications)
+    # publications_df = publications_df[publications_df.lens_id == '000-024-593-676-416'].copy()
+    if network_sample_size:
+        # Get a sample of 1,000 unique values in the 'lens_id' column
+        # (the pipeline samples the records in the DB instead, see core/ddb_network_sample.py)
+        sampled_ids = publications_df[rec_id].drop_duplicates().sample(n=network_sample_size, random_state=42)
+        # If you need the rows corresponding to these unique 'lens_id' values, use `isin()`
+        publications_df = publications_df[publications_df[rec_id].isin(sampled_ids)]
+    # Step 1: Group and reduce org_id to unique sets within each contribution
+    # (the affiliations without organisation are dropped for both methods: no NaN node, no pair with NaN)
+    d = (publications_df
+         .dropna(subset=['org_id'])
+         .groupby([rec_id, "contribution_id"])["org_id"]
+         .agg(lambda orgs: tuple(set(orgs)))
+         .reset_index())
+    nb_authors = d.groupby(by=[rec_id])['contribution_id'].agg(nb_authors=("nunique"))
+    large = d.iloc[0:0]
+    if max_team_size is not None:
+        is_large = d[rec_id].map(nb_authors['nb_authors']) > max_team_size
+        large, d = d[is_large], d[~is_large]
+    columns = [rec_id, 'from', 'to', 'is_ext', 'weight']
+    parts = []
+    if len(d):
+        parts.append(pairwise_team_edges(rec_id, d, nb_authors)[columns])
+    if len(large):
+        parts.append(large_team_edges(rec_id, large))
+    parts = [p for p in parts if len(p)]
+    o = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=columns).astype({'is_ext': bool, 'weight': float})
 
+    keys = [by] if by else []
+    if by:
+        o = o.merge(publications_df[[rec_id, by]].drop_duplicates(subset=[rec_id]), on=rec_id, how='left')
     o = (o[(o.is_ext) | (o['to'] == o['from'])]
-         .groupby(['from', 'to', 'is_ext']).agg(weight=('weight', 'sum'))
+         .groupby(keys + ['from', 'to', 'is_ext'], dropna=False).agg(weight=('weight', 'sum'))
          .reset_index()
          .sort_values(by="weight", ascending=False)
         )
@@ -297,12 +417,12 @@ def generate_collaboration_network(rec_id, publications_df, network_sample_size=
     # Step 9: Create nodes DataFrame
     list_nodes = sorted(set(o['from']).union(o['to']))
     nodes = pd.DataFrame(list_nodes, columns=['org_id'])
-    # Step 10: add nodes metrics
+    # Step 10: add nodes metrics (by: 1 row per value with records of the node)
     publications_df['nb'] = publications_df.groupby(rec_id)['org_id'].transform('count')
-    n = publications_df.groupby('org_id').agg(
+    n = publications_df.groupby(keys + ['org_id'], dropna=False).agg(
         nb_contributions=("nb", lambda x: sum(1/x)),
         nb_records=(rec_id, "nunique")
-        )
+        ).reset_index()
     nodes = nodes.merge(n, on='org_id', how = 'left')
     return o, nodes
 def create_table_contribution_information(df, rec_id, conn, label, source_baseline_version):
@@ -360,13 +480,10 @@ def create_table_contribution_information(df, rec_id, conn, label, source_baseli
     conn.execute(sql_code)
     # conn.sql("select country_code, count(*) as n from project.organisations group by country_code order by n Desc limit 10;")  # check DuckDB table    
     """Import ROR information to add to the Organisations table """
-    ids = conn.sql("SELECT * FROM project.organisations_id;").fetchdf()
-    conn_bas = duckdb.connect(source_baseline_version, read_only=True) 
-    query = "SELECT B.id, A.type, A.value  FROM baselines.ror_external_id A inner join baselines.ror B on A.id = B.id where B.status = 'active';"
-    ror_id = conn_bas.execute(query).fetchdf()
+    ids = conn.sql("SELECT * FROM project.{}organisations_id;".format(label)).fetchdf()
+    ror_id = baseline_lookup(source_baseline_version, 'ror_external_id')
     loc = ids.merge(ror_id, on=['type', 'value'],how="left")
-    query = "SELECT * FROM baselines.ror_location A inner join baselines.ror_location_id B on A.geonames_id=B.geonames_id;"
-    geo = conn_bas.execute(query).fetchdf()
+    geo = baseline_lookup(source_baseline_version, 'ror_location')
     loc = loc.merge(geo, on='id').drop_duplicates(subset=['org_id', 'geonames_id'])
     loc = loc[['org_id', 'id', 'geonames_id', 'name', 'country_code', 'country_name', 'lat', 'lng']]
     sql_code = "CREATE TABLE project.{}locations AS SELECT * FROM loc;".format(label)
@@ -381,31 +498,61 @@ def create_table_contribution_information(df, rec_id, conn, label, source_baseli
     # conn.sql("select count(*) as n from project.affiliation;")  # check DuckDB table
     print("\t\t table_contribution_information")
 
-def create_table_network_organisations(rec_id, conn, label, max_team_size=20, net_sample=None):
-    # max_team_size: the maximum number of authors per paper to include as collaborations, by default = 20
+def create_table_network_organisations(rec_id, conn, label, max_team_size=20, net_sample=None, large_teams=True,
+                                       sample_seed=SAMPLE_SEED, sample_strata=None):
+    # max_team_size: the maximum number of authors per paper for the pairs of contributions, by default = 20
+    # large_teams: True => the papers with more authors are included with closed form weights (see team_pair_weights),
+    #   False => they are excluded from the collaborations
+    # net_sample: the number of records sampled in the DB (sample_seed, sample_strata: see core/ddb_network_sample.py)
     sql_code = "drop TABLE if exists project.{}net_org_edges;".format(label)
     conn.execute(sql_code)
     sql_code = "drop TABLE if exists project.{}net_org_nodes;".format(label)
     conn.execute(sql_code)    
-    aff = conn.sql("SELECT * FROM project.affiliation;").fetchdf()
-    org = conn.sql("SELECT * FROM project.organisations;").fetchdf()
-    rec = conn.sql("SELECT {} FROM project.records where nb_authors <= {};".format(rec_id, max_team_size)).fetchdf()
-    df = conn.sql("SELECT {}, contribution_id FROM project.contribution".format(rec_id)).fetchdf()
-    df = df.merge(rec, on=rec_id, how='inner') ## limit collaborations to 0-20 authors
+    for t in ['net_org_edges_year', 'net_org_nodes_year']:
+        conn.execute("drop TABLE if exists project.{}{};".format(label, t))
+    org = conn.sql("SELECT * FROM project.{}organisations;".format(label)).fetchdf()
+    where = "" if large_teams else " where nb_authors <= {}".format(max_team_size)  ## limit collaborations to 0-20 authors (without large_teams)
+    sql_code = sample_records_sql(rec_id, label, ['TRY_CAST(CAST(year_published AS VARCHAR) AS INTEGER) as year'], where,
+                                  net_sample, sample_seed, sample_strata)
+    conn.execute("CREATE OR REPLACE TEMP TABLE network_records AS {};".format(sql_code))
+    rec = conn.sql("SELECT * FROM network_records;").fetchdf()
+    df = conn.sql("""SELECT c.{0}, c.contribution_id FROM project.{1}contribution c
+        JOIN network_records r ON r.{0} = c.{0};""".format(rec_id, label)).fetchdf()
+    aff = conn.sql("""SELECT a.* FROM project.{1}affiliation a
+        JOIN project.{1}contribution c ON c.contribution_id = a.contribution_id
+        JOIN network_records r ON r.{0} = c.{0};""".format(rec_id, label)).fetchdf()
+    conn.execute("DROP TABLE IF EXISTS network_records;")
+    df = df.merge(rec, on=rec_id, how='inner')
     publications_df = df.merge(aff, on="contribution_id", how='left')
     del aff, rec
-    df_e, df_n = generate_collaboration_network(rec_id, publications_df, network_sample_size=net_sample)
-    df_n = df_n.merge(org, on='org_id', how='inner')
-    sql_code = "CREATE TABLE project.{}net_org_nodes AS SELECT * FROM df_n;".format(label)
+    df_e, df_n = generate_collaboration_network(rec_id, publications_df, by='year',
+                                                max_team_size=max_team_size if large_teams else None)
+    """ Networks per year (any interval is the sum of its years, see core/ddb_network_years.py) """
+    sql_code = """CREATE TABLE project.{}net_org_edges_year AS
+        SELECT year::INTEGER as year, "from", "to", is_ext, weight FROM df_e ORDER BY year, "from", "to", is_ext;""".format(label)
+    conn.execute(sql_code)
+    sql_code = """CREATE TABLE project.{}net_org_nodes_year AS
+        SELECT year::INTEGER as year, org_id, nb_contributions, nb_records FROM df_n ORDER BY year, org_id;""".format(label)
     conn.execute(sql_code)
-    sql_code = "CREATE TABLE project.{}net_org_edges AS SELECT * FROM df_e;".format(label)
+    """ Network of all the years """
+    sql_code = """CREATE TABLE project.{0}net_org_nodes AS
+        SELECT n.*, org.* EXCLUDE (org_id) FROM (
+            SELECT org_id, sum(nb_contributions) as nb_contributions, sum(nb_records)::BIGINT as nb_records
+            FROM project.{0}net_org_nodes_year GROUP BY org_id) n
+        JOIN org ON org.org_id = n.org_id ORDER BY n.org_id;""".format(label)
+    conn.execute(sql_code)
+    sql_code = """CREATE TABLE project.{}net_org_edges AS
+        SELECT "from", "to", is_ext, sum(weight) as weight FROM project.{}net_org_edges_year
+        GROUP BY "from", "to", is_ext ORDER BY weight DESC;""".format(label, label)
     conn.execute(sql_code)
     # conn_bas.close()
-    print("\t\t network data tables (edges, nodes)")
+    print("\t\t network data tables (edges, nodes, per year)")
     # conn.sql("select country_code, count(*) as n from project.organisations group by country_code order by n Desc limit 10;")  # check 
 
 def create_table_funding(df, rec_id, conn, label):
     """External ids table"""
+    sql_code = "drop TABLE if exists project.{}funding;".format(label)
+    conn.execute(sql_code)
     d = df[[rec_id, 'funding']].copy()
     d = d.explode('funding')
     dict_df = d['funding'].apply(pd.Series)
@@ -416,11 +563,86 @@ def create_table_funding(df, rec_id, conn, label):
     conn.execute(sql_code)
     # conn.sql("select count(*) from project.records_id;")  # check DuckDB table
     print("\t\t table_funding")
-def create_ddb(infile, outfile, project_variant_string, source_baseline_version, source_data="lens_scholarly", network_max_team_size=20, network_sample_size=None):
+def table_rows(conn, label, table):
+    # number of rows of a project table (eg for the run report)
+    return conn.sql("SELECT count(*) FROM project.{}{};".format(label, table)).fetchone()[0]
+
+""" Table builders of create_ddb and the builders they need first (when both are (re)built) """
+TABLE_BUILDER_DEPENDENCIES = {
+    'records_id': [],
+    'source': [],
+    'records': ['source'],
+    'categories': [],
+    'contribution_information': [],
+    'funding': [],
+    'topic_membership': [],
+    'network_organisations': ['records', 'contribution_information'],
+    'network_analytics': ['network_organisations'],
+    'network_rollup': ['contribution_information', 'network_organisations', 'network_analytics'],
+    'network_categories': ['records', 'categories', 'contribution_information'],
+    'network_top': ['network_organisations', 'network_analytics', 'network_rollup', 'network_categories'],
+    'serving': ['records', 'contribution_information', 'network_organisations', 'network_analytics'],
+}
+
+def run_table_builders(builders, conn, jobs=1):
+    # builders = {name: function(cursor)} in dependency order (see TABLE_BUILDER_DEPENDENCIES)
+    # jobs > 1: the builders run in worker threads, each with its own DuckDB cursor, as soon as the builders they depend on are done
+    # returns a dictionary {name: seconds} and the overlap of the builders (sum of their time / elapsed time, 1 when run one by one)
+    start = time.perf_counter()
+    seconds = {}
+    parent = metrics_current()  # the builders run in worker threads record their metrics in the step of the build
+
+    def run_builder(name):
+        t = time.perf_counter()
+        cursor = conn.cursor() if jobs > 1 else conn
+        try:
+            with metrics_attach(parent):
+                builders[name](cursor)
+        finally:
+            if jobs > 1:
+                cursor.close()
+        return time.perf_counter() - t
+
+    if jobs <= 1:
+        for name in builders:
+            seconds[name] = run_builder(name)
+    else:
+        load_lazy_modules()  # before the worker threads
+        pending = list(builders)
+        running = {}
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            while pending or running:
+                for name in list(pending):
+                    if all(d in seconds or d not in builders for d in TABLE_BUILDER_DEPENDENCIES.get(name, [])):
+                        running[executor.submit(run_builder, name)] = name
+                        pending.remove(name)
+                if not running:
+                    raise ValueError("Please check the dependencies of the table builders: {}".format(pending))
+                done, not_done = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    seconds[name] = future.result()  # a failed builder stops the build
+    elapsed = time.perf_counter() - start
+    overlap = sum(seconds.values()) / elapsed if elapsed > 0 else 1
+    return seconds, round(overlap, 2)
+
+def create_ddb(infile, outfile, project_variant_string, source_baseline_version, source_data="lens_scholarly", network_max_team_size=20, network_sample_size=None, tables=None, topics_infile=None, jobs=1, network_top_n=(100,), network_top_metric='nb_records', network_min_weight=0, network_by_category=False, network_jobs=1, network_large_teams=True, network_sample_seed=SAMPLE_SEED, network_sample_strata=None):
     # infile = a pandas DF with raw data from xml or API for records (eg Lens, OpenAlex)
     # outfile = a DuckDB (.duckdb) DB
     # uid = the label of the header which contains the records unique identifiers (eg: lens_id, openalex)
+    # tables = the tables to (re)build: keys of TABLE_BUILDER_COLUMNS, 'network_organisations', 'network_analytics', 'network_rollup',
+    #   'network_categories', 'network_top' and 'serving', None for all
+    #   eg ['network_organisations', 'serving'] to rebuild only the network and the dashboard tables from the tables already in the DB
+    # topics_infile = a pickle of the (uid, topic, score) rows of the main searches (see pipeline_len), for the table topic_membership
+    # jobs = the number of table builders running in parallel (see TABLE_BUILDER_DEPENDENCIES), 1 to build the tables one by one
+    # network_top_n, network_top_metric, network_min_weight = the top-N networks (see core/ddb_network_top.py), None for no top-N tables
+    # network_by_category = True => 1 network per category in network_jobs worker processes (see core/ddb_network_categories.py)
+    # network_large_teams = True => the records with more than network_max_team_size authors are in the networks (closed form weights)
+    # network_sample_size, network_sample_seed, network_sample_strata = records sampled in the DB for the networks, None for all
+    #   (see core/ddb_network_sample.py)
     try:
+        if tables is None:
+            tables = list(TABLE_BUILDER_COLUMNS) + ['topic_membership', 'network_organisations', 'network_analytics', 'network_rollup', 'network_categories', 'network_top', 'serving']
         print('\t start data export to DDB')
         """database setup"""
         conn = duckdb.connect(outfile)
@@ -428,24 +650,97 @@ def create_ddb(infile, outfile, project_variant_string, source_baseline_version,
         conn.execute(sql_code)
         if source_data=="lens_scholarly":
             uid = "lens_id"
-            df = pd.DataFrame()
-            # df = pd.read_pickle(infile)
-            # def_source = [
-            #     'source.title',
-            #     'source.publisher',
-            #     'source.issn',
-            #     'source.type',
-            #     'source.country'
-            #     ]
-            # for i in def_source:
-            #     df[i] = df[i].fillna('other')
-            # create_table_records_id(df, uid, conn, project_variant_string)
-            # list_source = create_table_source(df, def_source, conn, project_variant_string)
-            # create_table_records(df, list_source, uid, conn, project_variant_string)
-            # create_table_categories(df, uid, conn, project_variant_string, source_baseline_version)
-            # create_table_contribution_information(df, uid, conn, project_variant_string, source_baseline_version)
-            # create_table_funding(df, uid, conn, project_variant_string)
-            create_table_network_organisations(uid, conn, project_variant_string, network_max_team_size, network_sample_size)
+            label = project_variant_string
+            builders = [t for t in TABLE_BUILDER_COLUMNS if t in tables]
+            if builders:
+                df = prepare_builder_records(pd.read_pickle(infile), builders)
+            def_source = TABLE_BUILDER_COLUMNS['source']
+            results = {}
+
+            def build_records_id(cursor):
+                with metrics_step('ddb.records_id', kind='table', rows_in=df.shape[0]) as m:
+                    create_table_records_id(df, uid, cursor, label)
+                    m['rows_out'] = table_rows(cursor, label, 'records_id')
+            def build_source(cursor):
+                with metrics_step('ddb.source', kind='table', rows_in=df.shape[0]) as m:
+                    results['source'] = create_table_source(df, def_source, cursor, label)
+                    m['rows_out'] = table_rows(cursor, label, 'source')
+            def build_records(cursor):
+                list_source = results['source'] if 'source' in results else cursor.sql("SELECT * FROM project.{}source;".format(label)).fetchdf()
+                with metrics_step('ddb.records', kind='table', rows_in=df.shape[0]) as m:
+                    create_table_records(df, list_source, uid, cursor, label)
+                    m['rows_out'] = table_rows(cursor, label, 'records')
+            def build_categories(cursor):
+                with metrics_step('ddb.categories', kind='table', rows_in=df.shape[0]) as m:
+                    create_table_categories(df, uid, cursor, label, source_baseline_version)
+                    m['rows_out'] = table_rows(cursor, label, 'categories')
+            def build_contribution_information(cursor):
+                with metrics_step('ddb.contribution_information', kind='table', rows_in=df.shape[0]) as m:
+                    create_table_contribution_information(df, uid, cursor, label, source_baseline_version)
+                    m['rows_out'] = table_rows(cursor, label, 'contribution')
+            def build_funding(cursor):
+                with metrics_step('ddb.funding', kind='table', rows_in=df.shape[0]) as m:
+                    create_table_funding(df, uid, cursor, label)
+                    m['rows_out'] = table_rows(cursor, label, 'funding')
+            def build_topic_membership(cursor):
+                with metrics_step('ddb.topic_membership', kind='table') as m:
+                    create_table_topic_membership(topics_infile, uid, cursor, label)
+                    m['rows_out'] = table_rows(cursor, label, 'topic_membership')
+            def build_network_organisations(cursor):
+                with metrics_step('ddb.network_organisations', kind='table') as m:
+                    create_table_network_organisations(uid, cursor, label, network_max_team_size, network_sample_size, network_large_teams,
+                                                       network_sample_seed, network_sample_strata)
+                    m['rows_out'] = table_rows(cursor, label, 'net_org_edges')
+            def build_network_analytics(cursor):
+                with metrics_step('ddb.network_analytics', kind='table', rows_in=table_rows(cursor, label, 'net_org_edges')) as m:
+                    m['rows_out'] = len(create_network_analytics(cursor, label))
+            def build_network_rollup(cursor):
+                with metrics_step('ddb.network_rollup', kind='table', rows_in=table_rows(cursor, label, 'net_org_edges')) as m:
+                    create_network_rollup(cursor, label)
+                    m['rows_out'] = table_rows(cursor, label, 'net_country_edges') + table_rows(cursor, label, 'net_precinct_edges')
+            def build_network_categories(cursor):
+                from .ddb_network_categories import create_table_network_categories
+                with metrics_step('ddb.network_categories', kind='table') as m:
+                    seconds = create_table_network_categories(uid, cursor, label, network_max_team_size, network_sample_size,
+                                                              jobs=network_jobs, large_teams=network_large_teams, sample_seed=network_sample_seed,
+                                                              workdir=os.path.dirname(os.path.abspath(outfile)))
+                    m['rows_out'] = table_rows(cursor, label, 'net_org_category_edges') if seconds else 0
+                    m['worker_seconds'] = round(sum(seconds.values()), 3)
+            def build_network_top(cursor):
+                with metrics_step('ddb.network_top', kind='table') as m:
+                    create_networks_top(cursor, label, network_top_n, network_top_metric, network_min_weight)
+            def build_serving(cursor):
+                with metrics_step('ddb.serving', kind='table') as m:
+                    create_serving_tables(cursor, label)
+                    m['rows_out'] = sum(serving_rows(cursor, label).values())
+
+            functions = {
+                'records_id': build_records_id,
+                'source': build_source,
+                'records': build_records,
+                'categories': build_categories,
+                'contribution_information': build_contribution_information,
+                'funding': build_funding,
+                'topic_membership': build_topic_membership,
+                'network_organisations': build_network_organisations,
+                'network_analytics': build_network_analytics,
+                'network_rollup': build_network_rollup,
+                'network_categories': build_network_categories,
+                'network_top': build_network_top,
+                'serving': build_serving,
+            }
+            if not (topics_infile and os.path.exists(topics_infile)):
+                functions.pop('topic_membership')
+            if not network_top_n:
+                functions.pop('network_top')
+            if not network_by_category:
+                functions.pop('network_categories')
+            with metrics_step('ddb.tables', kind='build') as m:
+                seconds, overlap = run_table_builders({t: f for t, f in functions.items() if t in tables}, conn, jobs=jobs)
+                m['builder_seconds'] = round(sum(seconds.values()), 3)
+                m['overlap'] = overlap
+            if jobs > 1:
+                print("\t\t {} table builders in {} threads: {:.1f}s of builders, overlap x{}".format(len(seconds), jobs, sum(seconds.values()), overlap))
         elif source_data == "lens_patents":
             uid = "lens_id"
             print("\t Lens patents data not implemented yet")
@@ -453,10 +748,11 @@ def create_ddb(infile, outfile, project_variant_string, source_baseline_version,
             print("\t No source selected (eg Lens, OpenAlex)")
         """ Final code """
         conn.close()
+        print('\t data exported to the DB in {}'.format(outfile))
     except Exception as e:
+        print("error in create_ddb")
         print(e)
-    finally:
-        print('\t data exported to the DB in {}'.format(outfile))
+        raise
 
 
 # =============================================================================
@@ -0,0 +1,257 @@
+# coding=utf-8
+
+# =============================================================================
+# """
+# .. module:: input_pipeline.core.ddb_network_analytics.py
+# .. moduleauthor:: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# .. version:: 1.0
+#
+# :Copyright: Jean-Francois Desvignes for Science Data Nexus
+# Science Data Nexus, 2026
+# :Contact: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# :Updated: 19/10/2026
+# """
+# =============================================================================
+"""
+Graph analytics of the organisation network, precomputed after the network so that the dashboard only draws it.
+The external edges of project.[VARIANT]net_org_edges are loaded as a symmetric CSR matrix (indptr, indices, weights
+arrays) and the results are added as columns of project.[VARIANT]net_org_nodes:
+    weighted_degree   sum of the weights of the external edges of the organisation
+    betweenness       betweenness centrality estimated from a sample of sources (distance of an edge = 1 / weight),
+                      batches of sources processed together as NumPy arrays
+    community         Louvain community (0 = the largest community), NULL for an organisation without external edge,
+                      the modularity gains of all the nodes computed at once in each sweep
+    x, y              force-directed layout (Fruchterman-Reingold, vectorised NumPy iterations) in [-1, 1]
+"""
+# =============================================================================
+# modules to import
+# =============================================================================
+import numpy as np
+import pandas as pd
+
+# =============================================================================
+# Functions and classes
+# =============================================================================
+
+""" Columns added to net_org_nodes """
+ANALYTICS_COLUMNS = ['weighted_degree', 'betweenness', 'community', 'x', 'y']
+""" Number of sources of the betweenness estimate (exact when the network has fewer nodes) """
+BETWEENNESS_SAMPLES = 64
+""" Iterations of the layout, and the number of nodes sampled for the repulsion of each node in the larger networks """
+LAYOUT_ITERATIONS = 50
+LAYOUT_REPULSION_SAMPLE = 2000
+""" Maximum number of sweeps of the local moving phase of each Louvain level """
+LOUVAIN_SWEEPS = 200
+
+
+def csr_graph(edges, nb_nodes):
+    # edges = arrays (from, to, weight) of node indices (0 to nb_nodes - 1), 1 row per undirected edge
+    # returns the symmetric CSR arrays (indptr, indices, weights), self loops once on the diagonal, duplicate entries summed
+    a, b, w = (np.asarray(x) for x in edges)
+    loop = a == b
+    rows = np.concatenate([a, b[~loop]])
+    cols = np.concatenate([b, a[~loop]])
+    data = np.concatenate([w, w[~loop]]).astype(np.float64)
+    key, inverse = np.unique(rows.astype(np.int64) * nb_nodes + cols, return_inverse=True)
+    data = np.bincount(inverse.ravel(), weights=data)
+    rows, indices = key // nb_nodes, key % nb_nodes
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=nb_nodes))])
+    return indptr, indices, data
+
+def weighted_degree(indptr, weights):
+    # sum of the weights of each row of a CSR matrix
+    return np.add.reduceat(np.append(weights, 0), indptr[:-1]) * (np.diff(indptr) > 0)
+
+def csr_links(indptr, indices, weights):
+    # the entries of a CSR matrix without the diagonal: (rows, cols, weights, starts of the non empty rows, non empty rows)
+    n = len(indptr) - 1
+    rows = np.repeat(np.arange(n), np.diff(indptr))
+    link = rows != indices
+    rows, cols, w = rows[link], indices[link], weights[link]
+    counts = np.bincount(rows, minlength=n)
+    filled = np.flatnonzero(counts)
+    starts = np.concatenate([[0], np.cumsum(counts)])[filled]
+    return rows, cols, w, starts, filled
+
+def row_reduce(ufunc, values, starts, filled, n, empty):
+    # ufunc (np.add, np.minimum) of each CSR row of values (1 row per source, 1 column per entry), empty for the empty rows
+    out = np.full((values.shape[0], n), empty, dtype=np.float64)
+    if len(filled):
+        out[:, filled] = ufunc.reduceat(values, starts, axis=1)
+    return out
+
+def approximate_betweenness(indptr, indices, weights, samples=BETWEENNESS_SAMPLES, seed=42, batch_size=None):
+    # Brandes' algorithm from a random sample of sources (distance of an edge = 1 / weight), scaled to all the
+    # sources; exact when samples >= number of nodes. Undirected: each path is counted once.
+    # Vectorised over a batch of sources: the distances, the number of shortest paths (sigma) and the dependencies
+    # (delta) are fixed points over the CSR rows (np.minimum / np.add reduceat), reached after as many rounds as
+    # edges in the longest shortest path
+    n = len(indptr) - 1
+    centrality = np.zeros(n)
+    if n == 0:
+        return centrality
+    sources = np.arange(n) if samples >= n else np.random.default_rng(seed).choice(n, size=samples, replace=False)
+    rows, cols, w, starts, filled = csr_links(indptr, indices, weights)
+    length = 1 / w
+    batch_size = batch_size or max(1, 4_000_000 // max(len(rows), 1))
+    for first in range(0, len(sources), batch_size):
+        batch = sources[first:first + batch_size]
+        at = (np.arange(len(batch)), batch)
+        dist = np.full((len(batch), n), np.inf)
+        dist[at] = 0
+        while True:
+            new = np.minimum(row_reduce(np.minimum, dist[:, cols] + length, starts, filled, n, np.inf), dist)
+            if np.array_equal(new, dist):
+                break
+            dist = new
+        # shortest path DAG: cols -> rows (pred) and rows -> cols (succ)
+        pred = np.isfinite(dist[:, cols]) & np.isclose(dist[:, cols] + length, dist[:, rows], rtol=1e-9, atol=1e-12)
+        succ = np.isfinite(dist[:, rows]) & np.isclose(dist[:, rows] + length, dist[:, cols], rtol=1e-9, atol=1e-12)
+        sigma = np.zeros((len(batch), n))
+        sigma[at] = 1
+        while True:
+            new = row_reduce(np.add, sigma[:, cols] * pred, starts, filled, n, 0)
+            new[at] = 1
+            if np.array_equal(new, sigma):
+                break
+            sigma = new
+        inverse = np.divide(1, sigma, out=np.zeros_like(sigma), where=sigma > 0)
+        delta = np.zeros((len(batch), n))
+        while True:
+            new = sigma * row_reduce(np.add, (inverse * (1 + delta))[:, cols] * succ, starts, filled, n, 0)
+            if np.array_equal(new, delta):
+                break
+            delta = new
+        delta[at] = 0
+        centrality += delta.sum(axis=0)
+    return centrality * n / len(sources) / 2
+
+def louvain_level(indptr, indices, weights, rng, resolution=1.0, max_sweeps=LOUVAIN_SWEEPS):
+    # local moving phase of Louvain, vectorised: in each sweep the modularity gain of every node towards each
+    # neighbour community is computed at once, and a random half of the nodes with a positive gain move to their
+    # best community (moving all of them together would let pairs of nodes swap forever); stops when no node
+    # improves or after max_sweeps sweeps; returns the community of each node (0 to nb_communities - 1)
+    n = len(indptr) - 1
+    k = weighted_degree(indptr, weights)
+    m2 = k.sum()
+    rows, cols, w, _, _ = csr_links(indptr, indices, weights)
+    community = np.arange(n)
+    for _ in range(max_sweeps):
+        tot = np.bincount(community, weights=k, minlength=n)
+        key, inverse = np.unique(rows.astype(np.int64) * n + community[cols], return_inverse=True)
+        links = np.bincount(inverse.ravel(), weights=w)
+        node, target = key // n, key % n
+        own = target == community[node]
+        gain = links - resolution * (tot[target] - k[node] * own) * k[node] / m2
+        stay = -resolution * (tot[community] - k) * k / m2
+        np.add.at(stay, node[own], links[own])
+        best = np.lexsort((target, -gain, node))
+        first = best[np.r_[True, node[best][1:] != node[best][:-1]]]
+        better = (gain[first] > stay[node[first]] + 1e-12) & ~own[first]
+        movers = first[better & (rng.random(len(first)) < 0.5)]
+        if not better.any():
+            break
+        community[node[movers]] = target[movers]
+    return np.unique(community, return_inverse=True)[1].ravel()
+
+def louvain_communities(indptr, indices, weights, seed=42, resolution=1.0):
+    # Louvain communities: local moving, then the communities aggregated into the nodes of the next level, until a
+    # level leaves all the nodes in their own community; communities numbered by decreasing size (0 = the largest)
+    n = len(indptr) - 1
+    membership = np.arange(n)
+    if n == 0 or weights.sum() == 0:
+        return membership
+    rng = np.random.default_rng(seed)
+    while True:
+        community = louvain_level(indptr, indices, weights, rng, resolution)
+        nb = community.max() + 1
+        if nb == len(indptr) - 1:
+            break
+        membership = community[membership]
+        # aggregated graph: C^T.A.C (self loops = 2 x the internal weight, as in a symmetric matrix)
+        rows = community[np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))]
+        key, inverse = np.unique(rows.astype(np.int64) * nb + community[indices], return_inverse=True)
+        weights = np.bincount(inverse.ravel(), weights=weights)
+        rows, indices = key // nb, key % nb
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=nb))])
+    sizes = np.bincount(membership)
+    rank = np.empty_like(sizes)
+    rank[np.lexsort((np.arange(len(sizes)), -sizes))] = np.arange(len(sizes))
+    return rank[membership]
+
+def force_layout(indptr, indices, weights, iterations=LAYOUT_ITERATIONS, seed=42, repulsion_sample=LAYOUT_REPULSION_SAMPLE):
+    # Fruchterman-Reingold layout, each iteration vectorised: repulsion k^2 / d between the nodes (against a random
+    # sample of repulsion_sample nodes in the larger networks, scaled to all the nodes), attraction d^2 / k along the
+    # edges weighted by weight / max weight, moves limited by a temperature cooling down linearly
+    # returns the (x, y) positions scaled to [-1, 1]
+    n = len(indptr) - 1
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform(-1, 1, size=(n, 2))
+    if n < 2:
+        return pos * 0
+    k = np.sqrt(4 / n)
+    rows = np.repeat(np.arange(n), np.diff(indptr))
+    link = rows != indices
+    rows, cols, w = rows[link], indices[link], weights[link] / weights.max()
+    temperature = 0.1
+    for it in range(iterations):
+        sample = np.arange(n) if n <= repulsion_sample else rng.choice(n, size=repulsion_sample, replace=False)
+        scale = n / len(sample)
+        # sum over j of (pos_i - pos_j) / d_ij^2 as matrix products (d_ij^2 = |pos_i|^2 + |pos_j|^2 - 2 pos_i.pos_j)
+        square = (pos ** 2).sum(axis=1)
+        d2 = square[:, None] + square[None, sample] - 2 * pos @ pos[sample].T
+        inverse = np.divide(1, d2, out=np.zeros_like(d2), where=d2 > 1e-9)
+        displacement = scale * k * k * (pos * inverse.sum(axis=1)[:, None] - inverse @ pos[sample])
+        delta = pos[rows] - pos[cols]
+        d = np.sqrt(np.maximum((delta ** 2).sum(axis=1), 1e-9))
+        np.add.at(displacement, rows, -delta * (d * w / k)[:, None])
+        length = np.sqrt(np.maximum((displacement ** 2).sum(axis=1), 1e-9))
+        pos += displacement / length[:, None] * np.minimum(length, temperature)[:, None]
+        temperature = 0.1 * (1 - (it + 1) / iterations) + 1e-4
+    pos -= pos.mean(axis=0)
+    return pos / max(np.abs(pos).max(), 1e-9)
+
+def network_analytics(nodes, edges, betweenness_samples=BETWEENNESS_SAMPLES, iterations=LAYOUT_ITERATIONS, seed=42):
+    # nodes = the node ids, edges = a DF (from, to, weight) of the external edges
+    # returns a DF (org_id + ANALYTICS_COLUMNS), the community and the position only for the nodes with edges
+    ids = np.asarray(nodes)
+    index = pd.Series(np.arange(len(ids)), index=ids)
+    edges = edges[edges['from'].isin(index.index) & edges['to'].isin(index.index)]
+    a, b = index[edges['from']].to_numpy(), index[edges['to']].to_numpy()
+    indptr, indices, weights = csr_graph((a, b, edges['weight'].to_numpy()), len(ids))
+    df = pd.DataFrame({'org_id': ids, 'weighted_degree': weighted_degree(indptr, weights)})
+    df['betweenness'] = approximate_betweenness(indptr, indices, weights, betweenness_samples, seed)
+    # communities and layout of the connected nodes (the isolated nodes would only be spread around the network)
+    linked = np.flatnonzero(np.diff(indptr) > 0)
+    sub = np.full(len(ids), -1)
+    sub[linked] = np.arange(len(linked))
+    indptr_l, indices_l, weights_l = csr_graph((sub[a], sub[b], edges['weight'].to_numpy()), len(linked))
+    community = louvain_communities(indptr_l, indices_l, weights_l, seed)
+    pos = force_layout(indptr_l, indices_l, weights_l, iterations, seed)
+    df['community'] = pd.array([pd.NA] * len(ids), dtype='Int64')
+    df.loc[linked, 'community'] = community
+    df['x'], df['y'] = np.nan, np.nan
+    df.loc[linked, 'x'], df.loc[linked, 'y'] = pos[:, 0], pos[:, 1]
+    return df
+
+def create_network_analytics(conn, label, betweenness_samples=BETWEENNESS_SAMPLES, iterations=LAYOUT_ITERATIONS, seed=42):
+    # conn = a connection (or cursor) to the project DB with net_org_edges and net_org_nodes
+    # replaces the ANALYTICS_COLUMNS of net_org_nodes (same seed => same communities and layout)
+    nodes = conn.execute("SELECT org_id FROM project.{}net_org_nodes ORDER BY org_id;".format(label)).fetchdf()
+    edges = conn.execute("""SELECT "from", "to", weight FROM project.{}net_org_edges WHERE is_ext AND weight > 0;""".format(label)).fetchdf()
+    analytics = network_analytics(nodes['org_id'], edges, betweenness_samples, iterations, seed)
+    columns = [r[0] for r in conn.execute("""SELECT column_name FROM information_schema.columns
+        WHERE table_schema = 'project' AND table_name = ?;""", ['{}net_org_nodes'.format(label)]).fetchall()]
+    previous = [c for c in ANALYTICS_COLUMNS if c in columns]
+    sql_code = """CREATE OR REPLACE TABLE project.{0}net_org_nodes AS
+        SELECT n.*{1}, a.* EXCLUDE (org_id) FROM project.{0}net_org_nodes n
+        LEFT JOIN analytics a ON a.org_id = n.org_id ORDER BY n.org_id;""".format(
+        label, " EXCLUDE ({})".format(', '.join(previous)) if previous else "")
+    conn.execute(sql_code)
+    print("\t\t network analytics ({} nodes, {} communities)".format(len(analytics), analytics['community'].nunique()))
+    return analytics
+
+
+# =============================================================================
+# End of script
+# =============================================================================
@@ -0,0 +1,141 @@
+# coding=utf-8
+
+# =============================================================================
+# """
+# .. module:: input_pipeline.core.ddb_network_categories.py
+# .. moduleauthor:: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# .. version:: 1.0
+#
+# :Copyright: Jean-Francois Desvignes for Science Data Nexus
+# Science Data Nexus, 2026
+# :Contact: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# :Updated: 19/10/2026
+# """
+# =============================================================================
+"""
+Organisation networks per category (DataPipeLine.network_categories = None): the records are split by the parent_1
+concept of project.categories_openalex_concepts (a record in several categories is in each of their networks) and
+the network of each category is generated in a worker process. The publications are handed to the workers as
+integer coded Parquet files partitioned by category (written by DuckDB), the workers return Parquet files, and the
+networks are saved in 2 tables with a category column:
+    project.[VARIANT]net_org_category_edges   (category, from, to, is_ext, weight)
+    project.[VARIANT]net_org_category_nodes   (category, org_id, nb_contributions, nb_records + organisation columns)
+"""
+# =============================================================================
+# modules to import
+# =============================================================================
+import os
+import time
+import shutil
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import duckdb
+from .ddb_data import generate_collaboration_network
+from .ddb_network_sample import SAMPLE_SEED
+
+# =============================================================================
+# Functions and classes
+# =============================================================================
+
+""" Column of project.categories_openalex_concepts splitting the records, and the values left out (records not linked) """
+CATEGORY_COLUMN = 'parent_1'
+CATEGORY_EXCLUDED = ['N/A']
+
+
+def build_category_network(indir, outdir, category, network_sample_size=None, max_team_size=None):
+    # worker process: network of the publications of a category (Parquet files of indir: rec, contribution_id, org_id)
+    # max_team_size = the records with more contributions have closed form weights (see generate_collaboration_network)
+    # writes [outdir]/edges_[category].parquet and nodes_[category].parquet, returns the category and the time (s)
+    start = time.perf_counter()
+    conn = duckdb.connect()
+    try:
+        publications_df = conn.execute("SELECT rec, contribution_id, org_id FROM read_parquet('{}');".format(
+            os.path.join(indir, '*.parquet').replace("'", "''"))).fetchdf()
+        df_e, df_n = generate_collaboration_network('rec', publications_df, network_sample_size=network_sample_size,
+                                                    max_team_size=max_team_size)
+        for name, d in [('edges', df_e), ('nodes', df_n)]:
+            outfile = os.path.join(outdir, '{}_{}.parquet'.format(name, category)).replace("'", "''")
+            conn.execute("COPY (SELECT ?::VARCHAR as category, * FROM d) TO '{}' (FORMAT PARQUET);".format(outfile), [category])
+    finally:
+        conn.close()
+    return category, time.perf_counter() - start
+
+def export_category_publications(conn, label, rec_id, outdir, max_team_size=20, sample_size=None, seed=SAMPLE_SEED):
+    # writes the publications of the categories in [outdir]/category=[CATEGORY]/*.parquet (records as integers)
+    # max_team_size = the maximum number of authors of the records, None for all the records
+    # sample_size = the number of records sampled per category (the first by hash(record id, seed)), None for all
+    # returns the categories
+    excluded = ", ".join("'{}'".format(c) for c in CATEGORY_EXCLUDED)
+    where = " WHERE nb_authors <= {}".format(int(max_team_size)) if max_team_size is not None else ""
+    sample = """QUALIFY row_number() OVER (PARTITION BY cat.category ORDER BY hash(concat(rec.{0}, ':', {1})), rec.rec)
+                <= {2}""".format(rec_id, int(seed), int(sample_size)) if sample_size else ""
+    sql_code = """COPY (
+        WITH rec AS (
+            SELECT {0}, row_number() OVER (ORDER BY {0}) as rec FROM project.{1}records{2}),
+        cat AS (
+            SELECT DISTINCT {0}, {3} as category FROM project.{1}categories_openalex_concepts
+            WHERE {3} IS NOT NULL AND {3} NOT IN ({4})),
+        rc AS (
+            SELECT rec.{0}, rec.rec, cat.category FROM rec JOIN cat ON cat.{0} = rec.{0}
+            {5})
+        SELECT rc.category, rc.rec, c.contribution_id, a.org_id
+        FROM rc JOIN project.{1}contribution c ON c.{0} = rc.{0}
+        LEFT JOIN project.{1}affiliation a ON a.contribution_id = c.contribution_id
+        ORDER BY rc.category, rc.rec
+    ) TO '{6}' (FORMAT PARQUET, PARTITION_BY (category));""".format(rec_id, label, where, CATEGORY_COLUMN, excluded, sample,
+                                                                  outdir.replace("'", "''"))
+    conn.execute(sql_code)
+    if not os.path.isdir(outdir):
+        return []
+    return sorted(d.split('=', 1)[1] for d in os.listdir(outdir) if d.startswith('category='))
+
+def create_table_network_categories(rec_id, conn, label, max_team_size=20, net_sample=None, jobs=1, workdir=None, large_teams=True,
+                                    sample_seed=SAMPLE_SEED):
+    # conn = a connection (or cursor) to the project DB with the records, contribution, affiliation, organisations
+    # and categories_openalex_concepts tables
+    # jobs = the number of worker processes (1 => the categories one by one in this process)
+    # workdir = the directory of the temporary Parquet files (by default the temp directory of the system)
+    # large_teams = True => the records with more than max_team_size authors are included (closed form weights), False => excluded
+    # net_sample = the number of records sampled per category in the DB, None for all
+    for t in ['net_org_category_edges', 'net_org_category_nodes']:
+        conn.execute("drop TABLE if exists project.{}{};".format(label, t))
+    tmpdir = tempfile.mkdtemp(prefix='net_categories_', dir=workdir)
+    try:
+        indir, outdir = os.path.join(tmpdir, 'publications'), os.path.join(tmpdir, 'networks')
+        os.makedirs(outdir)
+        categories = export_category_publications(conn, label, rec_id, indir, None if large_teams else max_team_size,
+                                                  net_sample, sample_seed)
+        tasks = [(os.path.join(indir, 'category={}'.format(c)), outdir, c, None, max_team_size if large_teams else None)
+                 for c in categories]
+        seconds = {}
+        if jobs > 1 and len(tasks) > 1:
+            # spawn: the DuckDB threads of the parent process are not forked
+            with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('spawn')) as executor:
+                chunksize = max(len(tasks) // (jobs * 4), 1)  # small categories are sent by chunks
+                for category, s in executor.map(build_category_network, *zip(*tasks), chunksize=chunksize):
+                    seconds[category] = s
+        else:
+            for task in tasks:
+                category, s = build_category_network(*task)
+                seconds[category] = s
+        if categories:
+            sql_code = """CREATE TABLE project.{}net_org_category_edges AS
+                SELECT category, "from", "to", is_ext, weight FROM read_parquet('{}') ORDER BY category, weight DESC;""".format(
+                label, os.path.join(outdir, 'edges_*.parquet').replace("'", "''"))
+            conn.execute(sql_code)
+            sql_code = """CREATE TABLE project.{0}net_org_category_nodes AS
+                SELECT n.category, n.org_id, n.nb_contributions, n.nb_records, o.* EXCLUDE (org_id)
+                FROM read_parquet('{1}') n JOIN project.{0}organisations o ON o.org_id = n.org_id
+                ORDER BY n.category, n.org_id;""".format(label, os.path.join(outdir, 'nodes_*.parquet').replace("'", "''"))
+            conn.execute(sql_code)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    print("\t\t network data tables per category ({} categories, {} processes, {:.1f}s of workers)".format(
+        len(categories), max(min(jobs, len(categories)), 1), sum(seconds.values())))
+    return seconds
+
+
+# =============================================================================
+# End of script
+# =============================================================================
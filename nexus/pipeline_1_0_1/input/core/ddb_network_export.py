@@ -0,0 +1,140 @@
+# coding=utf-8
+
+# =============================================================================
+# """
+# .. module:: input_pipeline.core.ddb_network_export.py
+# .. moduleauthor:: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# .. version:: 1.0
+#
+# :Copyright: Jean-Francois Desvignes for Science Data Nexus
+# Science Data Nexus, 2026
+# :Contact: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# :Updated: 19/10/2026
+# """
+# =============================================================================
+"""
+Compact binary export of the networks (organisation, country and precinct networks of the project and of the
+variants) as symmetric CSR arrays, 1 directory per network:
+    [outdir]/[VARIANT]net_[LEVEL]/node_ids.npy   the node ids (the row i of the matrix is the node node_ids[i])
+                                  indptr.npy     int64, the edges of the node i are indices[indptr[i]:indptr[i + 1]]
+                                  indices.npy    int32 (int64 above 2^31 nodes), the neighbours
+                                  weights.npy    float64 or float32, the weights of the edges
+                                  graph.json     the description of the network (level, numbers of nodes, edges and entries, dtypes)
+Plain .npy files (not a .npz archive) so that load_network_csr maps them in memory without copy; each edge is stored
+in the 2 rows of its nodes (as a scipy.sparse.csr_matrix of an undirected graph), the internal collaborations of a
+node on the diagonal when with_internal.
+"""
+# =============================================================================
+# modules to import
+# =============================================================================
+import os
+import re
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from .ddb_network_analytics import csr_graph
+
+# =============================================================================
+# Functions and classes
+# =============================================================================
+
+""" Networks exported: level => key of the nodes """
+EXPORT_LEVELS = {'org': 'org_id', 'country': 'country_code', 'precinct': 'precinct_id'}
+""" Arrays of an exported network """
+EXPORT_ARRAYS = ['node_ids', 'indptr', 'indices', 'weights']
+
+
+def network_csr(conn, label='', level='org', weights_dtype='float64', with_internal=False):
+    # conn = a connection (or cursor) to the project DB (or the snapshot) with project.[label]net_[level]_edges and _nodes
+    # returns the arrays (EXPORT_ARRAYS) of the network, nodes sorted by id
+    if level not in EXPORT_LEVELS:
+        raise ValueError("Please enter a network level: {}".format(', '.join(EXPORT_LEVELS)))
+    if np.dtype(weights_dtype) not in (np.float32, np.float64):
+        raise ValueError("Please enter float64 or float32 for the weights")
+    key = EXPORT_LEVELS[level]
+    nodes = conn.execute("SELECT DISTINCT {} as id FROM project.{}net_{}_nodes WHERE {} IS NOT NULL ORDER BY id;".format(
+        key, label, level, key)).fetchdf()['id']
+    edges = conn.execute("""SELECT "from", "to", weight FROM project.{}net_{}_edges WHERE ({}) AND weight > 0;""".format(
+        label, level, "true" if with_internal else "is_ext")).fetchdf()
+    index = pd.Series(np.arange(len(nodes)), index=nodes.to_numpy())
+    edges = edges[edges['from'].isin(index.index) & edges['to'].isin(index.index)]
+    indptr, indices, weights = csr_graph((index[edges['from']].to_numpy(), index[edges['to']].to_numpy(),
+                                          edges['weight'].to_numpy()), len(nodes))
+    node_ids = nodes.to_numpy()
+    if node_ids.dtype == object:
+        node_ids = node_ids.astype(str)  # fixed width unicode (object arrays can not be mapped in memory)
+    return {'node_ids': node_ids,
+            'indptr': indptr.astype(np.int64),
+            'indices': indices.astype(np.int32 if len(nodes) < 2 ** 31 else np.int64),
+            'weights': weights.astype(weights_dtype)}
+
+def save_network_csr(graph, outdir, info=None):
+    # writes the arrays of a network (see network_csr) and graph.json in outdir, written aside and swapped with the
+    # previous export (a process with the previous arrays mapped in memory keeps reading them)
+    tmpdir, olddir = outdir + '.tmp', outdir + '.old'
+    for d in [tmpdir, olddir]:
+        shutil.rmtree(d, ignore_errors=True)
+    os.makedirs(tmpdir)
+    for name in EXPORT_ARRAYS:
+        np.save(os.path.join(tmpdir, name + '.npy'), graph[name], allow_pickle=False)
+    info = dict(info or {}, nb_nodes=len(graph['node_ids']), nb_edges=len(edge_list(graph)[0]), nb_entries=len(graph['indices']),
+                dtypes={name: str(graph[name].dtype) for name in EXPORT_ARRAYS}, symmetric=True)
+    with open(os.path.join(tmpdir, 'graph.json'), 'w') as f:
+        json.dump(info, f, indent=2)
+    if os.path.exists(outdir):
+        os.replace(outdir, olddir)
+    os.replace(tmpdir, outdir)
+    shutil.rmtree(olddir, ignore_errors=True)
+    return info
+
+def load_network_csr(indir, mmap=True):
+    # indir = the directory of a network (see save_network_csr)
+    # mmap = True => the arrays are mapped in memory (read-only, loaded by the OS on access), False => read in memory
+    # returns a dictionary of the arrays (EXPORT_ARRAYS) and 'info' (graph.json)
+    if not os.path.exists(os.path.join(indir, 'graph.json')):
+        raise ValueError("Please enter the directory of an exported network: {}".format(indir))
+    graph = {name: np.load(os.path.join(indir, name + '.npy'), mmap_mode='r' if mmap else None, allow_pickle=False)
+             for name in EXPORT_ARRAYS}
+    with open(os.path.join(indir, 'graph.json')) as f:
+        graph['info'] = json.load(f)
+    return graph
+
+def edge_list(graph):
+    # (from, to, weight) arrays of the node indices with from <= to, 1 row per edge (eg for igraph.Graph(n, edges))
+    rows = np.repeat(np.arange(len(graph['indptr']) - 1), np.diff(graph['indptr']))
+    upper = rows <= graph['indices']
+    return rows[upper], np.asarray(graph['indices'])[upper], np.asarray(graph['weights'])[upper]
+
+def to_scipy_csr(graph):
+    # scipy.sparse.csr_matrix sharing the arrays of the graph (scipy is not a dependency of the pipeline)
+    import scipy.sparse
+    n = len(graph['node_ids'])
+    return scipy.sparse.csr_matrix((graph['weights'], graph['indices'], graph['indptr']), shape=(n, n), copy=False)
+
+def export_networks_csr(conn, outdir, weights_dtype='float64', with_internal=False):
+    # exports the organisation, country and precinct networks of the project and its variants found in the DB of conn
+    # returns {network name: graph.json content}; the exports of networks no longer in the DB are removed
+    pattern = re.compile(r'^(.*_)?net_({})_edges$'.format('|'.join(EXPORT_LEVELS)))
+    tables = [r[0] for r in conn.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = 'project';").fetchall()]
+    os.makedirs(outdir, exist_ok=True)
+    results = {}
+    for table in sorted(tables):
+        match = pattern.match(table)
+        if not match or table.replace('_edges', '_nodes') not in tables:
+            continue
+        label, level = match.group(1) or '', match.group(2)
+        name = '{}net_{}'.format(label, level)
+        graph = network_csr(conn, label, level, weights_dtype, with_internal)
+        results[name] = save_network_csr(graph, os.path.join(outdir, name),
+                                         {'label': label, 'level': level, 'with_internal': with_internal})
+    for d in os.listdir(outdir):
+        if d not in results and os.path.exists(os.path.join(outdir, d, 'graph.json')):
+            shutil.rmtree(os.path.join(outdir, d))
+    print("\t\t {} networks exported as CSR arrays in {}".format(len(results), outdir))
+    return results
+
+
+# =============================================================================
+# End of script
+# =============================================================================
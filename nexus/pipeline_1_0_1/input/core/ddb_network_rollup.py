@@ -0,0 +1,90 @@
+# coding=utf-8
+
+# =============================================================================
+# """
+# .. module:: input_pipeline.core.ddb_network_rollup.py
+# .. moduleauthor:: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# .. version:: 1.0
+#
+# :Copyright: Jean-Francois Desvignes for Science Data Nexus
+# Science Data Nexus, 2026
+# :Contact: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# :Updated: 19/10/2026
+# """
+# =============================================================================
+"""
+Country and precinct networks rolled up from the organisation network (no new pair generation). Each organisation
+belongs to 1 cluster per level (project.[VARIANT]net_org_clusters): its country (organisations.country_code) and its
+precinct (the cell of a lat/lng grid of its location). The cluster edges are C^T.W.C with W the organisation edges and
+C the organisation x cluster membership matrix, computed as a join-aggregate in the DB: each organisation edge adds
+its weight to the edge of the clusters of its 2 organisations (is_ext = 2 different clusters).
+    project.[VARIANT]net_country_edges, _nodes, _edges_year
+    project.[VARIANT]net_precinct_edges, _nodes, _edges_year
+"""
+# =============================================================================
+# modules to import
+# =============================================================================
+
+# =============================================================================
+# Functions and classes
+# =============================================================================
+
+""" Size of the cells of the precinct grid (degrees of latitude and longitude, 0.1 = about 11 km) """
+PRECINCT_DEGREES = 0.1
+""" Levels of the roll-up: cluster column of net_org_clusters """
+ROLLUP_LEVELS = {'country': 'country_code', 'precinct': 'precinct_id'}
+""" Tables of the roll-up (see create_network_rollup) """
+ROLLUP_TABLES = ['net_org_clusters'] + ['net_{}_{}'.format(level, t) for level in ROLLUP_LEVELS for t in ['edges', 'nodes', 'edges_year']]
+
+
+def create_table_org_clusters(conn, label, precinct_degrees=PRECINCT_DEGREES):
+    # clusters of the organisations of the network: country and precinct (NULL without location)
+    # an organisation with several locations is placed at its location with the lowest geonames_id
+    if not precinct_degrees or precinct_degrees <= 0:
+        raise ValueError("Please enter a precinct size in degrees > 0")
+    sql_code = """CREATE TABLE project.{0}net_org_clusters AS
+        SELECT n.org_id, CAST(n.country_code AS VARCHAR) as country_code,
+            CASE WHEN l.lat IS NOT NULL AND l.lng IS NOT NULL
+                THEN printf('%d_%d', floor(l.lat / {1})::BIGINT, floor(l.lng / {1})::BIGINT) END as precinct_id,
+            l.lat, l.lng
+        FROM project.{0}net_org_nodes n
+        LEFT JOIN (
+            SELECT org_id, arg_min(TRY_CAST(lat AS DOUBLE), geonames_id) as lat, arg_min(TRY_CAST(lng AS DOUBLE), geonames_id) as lng
+            FROM project.{0}locations GROUP BY org_id) l ON l.org_id = n.org_id
+        ORDER BY n.org_id;""".format(label, float(precinct_degrees))
+    conn.execute(sql_code)
+
+def rollup_edges_sql(label, level, table='net_org_edges', by=''):
+    # SQL of the cluster edges of a level (C^T.W.C): the organisation edges joined to the clusters of their 2 ends
+    c = ROLLUP_LEVELS[level]
+    keys = "e.{}, ".format(by) if by else ""
+    return """SELECT {2}least(a.{1}, b.{1}) as "from", greatest(a.{1}, b.{1}) as "to", a.{1} <> b.{1} as is_ext, sum(e.weight) as weight
+        FROM project.{0}{3} e
+        JOIN project.{0}net_org_clusters a ON a.org_id = e."from"
+        JOIN project.{0}net_org_clusters b ON b.org_id = e."to"
+        WHERE a.{1} IS NOT NULL AND b.{1} IS NOT NULL
+        GROUP BY ALL""".format(label, c, keys, table)
+
+def create_network_rollup(conn, label, precinct_degrees=PRECINCT_DEGREES):
+    # conn = a connection (or cursor) to the project DB with net_org_edges, net_org_edges_year, net_org_nodes and locations
+    for t in ROLLUP_TABLES:
+        conn.execute("drop TABLE if exists project.{}{};".format(label, t))
+    create_table_org_clusters(conn, label, precinct_degrees)
+    for level, c in ROLLUP_LEVELS.items():
+        sql_code = "CREATE TABLE project.{0}net_{1}_edges AS {2} ORDER BY weight DESC;".format(label, level, rollup_edges_sql(label, level))
+        conn.execute(sql_code)
+        sql_code = "CREATE TABLE project.{0}net_{1}_edges_year AS {2} ORDER BY year, weight DESC;".format(
+            label, level, rollup_edges_sql(label, level, 'net_org_edges_year', by='year'))
+        conn.execute(sql_code)
+        location = ", avg(c.lat) as lat, avg(c.lng) as lng, mode(c.country_code) as country_code" if level == 'precinct' else ""
+        sql_code = """CREATE TABLE project.{0}net_{1}_nodes AS
+            SELECT c.{2}, count(*) as nb_org, sum(n.nb_contributions) as nb_contributions{3}
+            FROM project.{0}net_org_clusters c JOIN project.{0}net_org_nodes n ON n.org_id = c.org_id
+            WHERE c.{2} IS NOT NULL GROUP BY c.{2} ORDER BY nb_contributions DESC;""".format(label, level, c, location)
+        conn.execute(sql_code)
+    print("\t\t network roll-up tables (country, precinct)")
+
+
+# =============================================================================
+# End of script
+# =============================================================================
@@ -0,0 +1,78 @@
+# coding=utf-8
+
+# =============================================================================
+# """
+# .. module:: input_pipeline.core.ddb_network_sample.py
+# .. moduleauthor:: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# .. version:: 1.0
+#
+# :Copyright: Jean-Francois Desvignes for Science Data Nexus
+# Science Data Nexus, 2026
+# :Contact: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# :Updated: 19/10/2026
+# """
+# =============================================================================
+"""
+Sampling of the records of the networks (DataPipeLine.network_sample_size) in the first scan of project.records,
+before the contributions and affiliations are read: only the contributions of the sampled records leave the DB.
+    the records are ordered by hash(record id, seed) (hash(concat(id, ':', seed)), then the id) and the first are kept
+    with QUALIFY row_number():
+    without strata: the N first records
+    with strata ('year' or 'discipline'): the round(N x its share of the records) first records of each stratum, so the
+        sample keeps the distribution of the years or disciplines
+The same seed and records give the same sample, whatever the threads and the physical order of the table; a record
+sampled with N is also sampled with a larger N.
+"""
+# =============================================================================
+# modules to import
+# =============================================================================
+
+# =============================================================================
+# Functions and classes
+# =============================================================================
+
+""" Seed of the samples """
+SAMPLE_SEED = 42
+""" Strata of the stratified samples: the year of publication, or the discipline of the record (its most frequent
+level 0 concept, the first by name in case of tie; NULL => a stratum of the records without concept) """
+SAMPLE_STRATA = ['year', 'discipline']
+
+
+def strata_sql(rec_id, label, strata):
+    # SQL of the stratum of each record (rec_id, stratum)
+    if strata == 'year':
+        return "SELECT {0}, year_published as stratum FROM project.{1}records".format(rec_id, label)
+    if strata == 'discipline':
+        return """SELECT {0}, parent_0 as stratum FROM (
+                SELECT {0}, parent_0, count(*) as nb FROM project.{1}categories_openalex_concepts
+                WHERE parent_0 IS NOT NULL GROUP BY {0}, parent_0)
+            QUALIFY row_number() OVER (PARTITION BY {0} ORDER BY nb DESC, parent_0) = 1""".format(rec_id, label)
+    raise ValueError("Please enter sample strata: {}".format(', '.join(SAMPLE_STRATA)))
+
+def sample_records_sql(rec_id, label, columns, where='', sample_size=None, seed=SAMPLE_SEED, strata=None):
+    # SQL of the records (rec_id + columns, eg year) of project.[label]records matching where (eg ' WHERE nb_authors <= 20'),
+    # sampled when sample_size (see the module description)
+    select = "SELECT {}{} FROM project.{}records{}".format(rec_id, ''.join(', ' + c for c in columns), label, where)
+    if not sample_size:
+        return select
+    if strata is None:
+        return """SELECT * FROM ({0}) r
+        QUALIFY row_number() OVER (ORDER BY hash(concat(r.{1}, ':', {2})), r.{1}) <= {3}""".format(
+            select, rec_id, int(seed), int(sample_size))
+    return """SELECT r.* FROM ({0}) r LEFT JOIN ({1}) s ON s.{2} = r.{2}
+        QUALIFY row_number() OVER (PARTITION BY s.stratum ORDER BY hash(concat(r.{2}, ':', {3})), r.{2})
+            <= round({4} * count(*) OVER (PARTITION BY s.stratum) / count(*) OVER ())""".format(
+        select, strata_sql(rec_id, label, strata), rec_id, int(seed), int(sample_size))
+
+def sample_strata(conn, rec_id, label, sample_sql, strata):
+    # share of each stratum in the records and in the sample (to check a stratified sample)
+    sql_code = """SELECT s.stratum, count(*) / sum(count(*)) OVER () as share_records,
+            count(x.{0}) / sum(count(x.{0})) OVER () as share_sample
+        FROM project.{1}records r LEFT JOIN ({2}) s ON s.{0} = r.{0} LEFT JOIN ({3}) x ON x.{0} = r.{0}
+        GROUP BY s.stratum ORDER BY s.stratum;""".format(rec_id, label, strata_sql(rec_id, label, strata), sample_sql)
+    return conn.execute(sql_code).fetchdf()
+
+
+# =============================================================================
+# End of script
+# =============================================================================
@@ -0,0 +1,111 @@
+# coding=utf-8
+
+# =============================================================================
+# """
+# .. module:: input_pipeline.core.ddb_network_top.py
+# .. moduleauthor:: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# .. version:: 1.0
+#
+# :Copyright: Jean-Francois Desvignes for Science Data Nexus
+# Science Data Nexus, 2026
+# :Contact: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# :Updated: 19/10/2026
+# """
+# =============================================================================
+"""
+Top-N networks ready for display (DataPipeLine.network_nodes): the N first nodes of a network by a metric
+(QUALIFY row_number(), per category for the category networks) and the external edges between them above a
+minimum weight (induced subgraph), 1 pair of tables per N:
+    project.[VARIANT]net_[LEVEL]_top[N]_nodes   nodes with their rank (and the partition)
+    project.[VARIANT]net_[LEVEL]_top[N]_edges   edges with both ends in the top N nodes (of the same partition)
+"""
+# =============================================================================
+# modules to import
+# =============================================================================
+import re
+
+# =============================================================================
+# Functions and classes
+# =============================================================================
+
+""" Networks of the top-N selection: level => key of the nodes, and the partition of the partitioned networks """
+TOP_LEVELS = {'org': 'org_id', 'country': 'country_code', 'precinct': 'precinct_id', 'org_category': 'org_id'}
+TOP_PARTITIONS = {'org_category': 'category'}
+""" Metrics of the nodes ('degree' = weighted degree of the external edges), nb_contributions for a network without nb_records """
+TOP_METRICS = ['nb_records', 'nb_contributions', 'degree']
+
+
+def table_columns(conn, table):
+    return [r[0] for r in conn.execute("""SELECT column_name FROM information_schema.columns
+        WHERE table_schema = 'project' AND table_name = ?;""", [table]).fetchall()]
+
+def drop_top_tables(conn, label, level=None):
+    # removes the top-N tables of a label (all the N, eg the N no longer in network_nodes)
+    pattern = re.compile(r'^{}net_({})_top\d+_(nodes|edges)$'.format(re.escape(label), level or '|'.join(TOP_LEVELS)))
+    for (name,) in conn.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = 'project';").fetchall():
+        if pattern.match(name):
+            conn.execute("drop TABLE if exists project.{};".format(name))
+
+def create_network_top(conn, label, level='org', top_n=(100,), metric='nb_records', min_weight=0, partition=None):
+    # conn = a connection (or cursor) to the project DB with project.[label]net_[level]_nodes and _edges
+    # top_n = the numbers of nodes to keep (1 pair of tables per N)
+    # metric = nb_records, nb_contributions or degree (see TOP_METRICS), ties broken by the node key
+    # min_weight = the minimum weight of the edges kept
+    # partition = a column of the nodes and edges (eg category) => top N nodes and their edges per value
+    if level not in TOP_LEVELS:
+        raise ValueError("Please enter a network level: {}".format(', '.join(TOP_LEVELS)))
+    if metric not in TOP_METRICS:
+        raise ValueError("Please enter a node metric: {}".format(', '.join(TOP_METRICS)))
+    top_n = sorted(set(int(n) for n in top_n))
+    if not top_n or top_n[0] < 1:
+        raise ValueError("Please enter numbers of nodes >= 1")
+    key = TOP_LEVELS[level]
+    nodes, edges = '{}net_{}_nodes'.format(label, level), '{}net_{}_edges'.format(label, level)
+    if metric not in table_columns(conn, nodes) and metric != 'degree':
+        metric = 'nb_contributions'
+    by = "{}, ".format(partition) if partition else ""
+    on = " AND d.{0} = n.{0}".format(partition) if partition else ""
+    drop_top_tables(conn, label, level)
+    sql_code = """CREATE TEMP TABLE top_nodes AS
+        WITH d AS (
+            SELECT {0}node, sum(weight) as degree FROM (
+                SELECT {0}"from" as node, weight FROM project.{1} WHERE is_ext
+                UNION ALL SELECT {0}"to" as node, weight FROM project.{1} WHERE is_ext)
+            GROUP BY ALL)
+        SELECT n.*, coalesce(d.degree, 0) as degree,
+            row_number() OVER ({2}ORDER BY {3} DESC NULLS LAST, n.{4}) as rank
+        FROM project.{5} n LEFT JOIN d ON d.node = n.{4}{6}
+        QUALIFY rank <= {7}
+        ORDER BY {8}rank;""".format(by, edges, "PARTITION BY n.{} ".format(partition) if partition else "",
+                                    "coalesce(d.degree, 0)" if metric == 'degree' else "n." + metric,
+                                    key, nodes, on, top_n[-1], by)
+    conn.execute("DROP TABLE IF EXISTS top_nodes;")
+    conn.execute(sql_code)
+    try:
+        for n in top_n:
+            conn.execute("CREATE TABLE project.{0}net_{1}_top{2}_nodes AS SELECT * FROM top_nodes WHERE rank <= {2} ORDER BY {3}rank;".format(
+                label, level, n, by))
+            sql_code = """CREATE TABLE project.{0}net_{1}_top{2}_edges AS
+                SELECT e.* FROM project.{3} e
+                JOIN project.{0}net_{1}_top{2}_nodes a ON a.{4} = e."from"{5}
+                JOIN project.{0}net_{1}_top{2}_nodes b ON b.{4} = e."to"{6}
+                WHERE e.is_ext AND e.weight >= ?
+                ORDER BY {7}e.weight DESC;""".format(label, level, n, edges, key,
+                                                      " AND a.{0} = e.{0}".format(partition) if partition else "",
+                                                      " AND b.{0} = e.{0}".format(partition) if partition else "",
+                                                      "e." + by if by else "")
+            conn.execute(sql_code, [min_weight])
+    finally:
+        conn.execute("DROP TABLE IF EXISTS top_nodes;")
+    print("\t\t top networks {} ({}: {})".format(level, metric, ', '.join(str(n) for n in top_n)))
+
+def create_networks_top(conn, label, top_n=(100,), metric='nb_records', min_weight=0):
+    # top-N tables of the organisation, country, precinct and category networks in the DB
+    for level in TOP_LEVELS:
+        if table_columns(conn, '{}net_{}_nodes'.format(label, level)):
+            create_network_top(conn, label, level, top_n, metric, min_weight, TOP_PARTITIONS.get(level))
+
+
+# =============================================================================
+# End of script
+# =============================================================================
@@ -0,0 +1,88 @@
+# coding=utf-8
+
+# =============================================================================
+# """
+# .. module:: input_pipeline.core.ddb_network_years.py
+# .. moduleauthor:: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# .. version:: 1.0
+#
+# :Copyright: Jean-Francois Desvignes for Science Data Nexus
+# Science Data Nexus, 2026
+# :Contact: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# :Updated: 19/10/2026
+# """
+# =============================================================================
+"""
+Collaboration networks of any interval from the networks per year (project.[VARIANT]net_org_edges_year and
+net_org_nodes_year, built with the network in core/ddb_data.py). The weights are normalised per record and a record
+has one year: the network of an interval is the sum of its years, rolling windows and year-on-year deltas are range
+aggregations of the year tables (no new pass on the contributions).
+"""
+# =============================================================================
+# modules to import
+# =============================================================================
+
+# =============================================================================
+# Functions and classes
+# =============================================================================
+
+
+def check_interval(start, end):
+    # start, end: years (int), None for an open bound
+    start = int(start) if start is not None else -9999
+    end = int(end) if end is not None else 9999
+    if start > end:
+        raise ValueError("Please enter an interval with start <= end: {}-{}".format(start, end))
+    return start, end
+
+def network_interval(conn, start=None, end=None, label=''):
+    # edges (from, to, is_ext, weight) and nodes (org_id, nb_contributions, nb_records + organisation columns)
+    # of the records published between start and end (included), the nodes being the organisations of the edges
+    start, end = check_interval(start, end)
+    sql_code = """SELECT "from", "to", is_ext, sum(weight) as weight FROM project.{}net_org_edges_year
+        WHERE year BETWEEN ? AND ? GROUP BY "from", "to", is_ext ORDER BY weight DESC;""".format(label)
+    edges = conn.execute(sql_code, [start, end]).fetchdf()
+    sql_code = """SELECT n.*, o.* EXCLUDE (org_id) FROM (
+            SELECT org_id, sum(nb_contributions) as nb_contributions, sum(nb_records)::BIGINT as nb_records
+            FROM project.{0}net_org_nodes_year WHERE year BETWEEN ? AND ? GROUP BY org_id) n
+        JOIN project.{0}organisations o ON o.org_id = n.org_id
+        WHERE n.org_id IN (SELECT "from" FROM edges UNION SELECT "to" FROM edges) ORDER BY n.org_id;""".format(label)
+    nodes = conn.execute(sql_code, [start, end]).fetchdf()
+    return edges, nodes
+
+def network_rolling(conn, window, start=None, end=None, label=''):
+    # edges of the rolling windows of [window] years: 1 row per (window_end, from, to, is_ext), the weight of the
+    # records published between window_end - window + 1 and window_end, for the window ends between start and end
+    if int(window) < 1:
+        raise ValueError("Please enter a window of at least 1 year")
+    start, end = check_interval(start, end)
+    sql_code = """WITH w AS (SELECT DISTINCT year as window_end FROM project.{0}net_org_edges_year WHERE year BETWEEN ? AND ?)
+        SELECT w.window_end, e."from", e."to", e.is_ext, sum(e.weight) as weight
+        FROM w JOIN project.{0}net_org_edges_year e ON e.year BETWEEN w.window_end - ? + 1 AND w.window_end
+        GROUP BY w.window_end, e."from", e."to", e.is_ext ORDER BY w.window_end, weight DESC;""".format(label)
+    return conn.execute(sql_code, [start, end, int(window)]).fetchdf()
+
+def network_delta(conn, year, previous=None, label=''):
+    # change of the edges between 2 years (by default the year before): weight, previous_weight and delta
+    # (0 for an edge missing one of the years)
+    previous = int(year) - 1 if previous is None else int(previous)
+    sql_code = """SELECT coalesce(a."from", b."from") as "from", coalesce(a."to", b."to") as "to", coalesce(a.is_ext, b.is_ext) as is_ext,
+            coalesce(a.weight, 0) as weight, coalesce(b.weight, 0) as previous_weight, coalesce(a.weight, 0) - coalesce(b.weight, 0) as delta
+        FROM (SELECT * FROM project.{0}net_org_edges_year WHERE year = ?) a
+        FULL OUTER JOIN (SELECT * FROM project.{0}net_org_edges_year WHERE year = ?) b
+            ON a."from" = b."from" AND a."to" = b."to" AND a.is_ext = b.is_ext
+        ORDER BY abs(delta) DESC;""".format(label)
+    return conn.execute(sql_code, [int(year), previous]).fetchdf()
+
+def network_years(conn, label=''):
+    # number of edges, total weight and number of organisations with records per year
+    sql_code = """SELECT e.year, e.nb_edges, e.weight, n.nb_org FROM
+        (SELECT year, count(*) as nb_edges, sum(weight) as weight FROM project.{0}net_org_edges_year GROUP BY year) e
+        LEFT JOIN (SELECT year, count(*) as nb_org FROM project.{0}net_org_nodes_year GROUP BY year) n ON n.year IS NOT DISTINCT FROM e.year
+        ORDER BY e.year;""".format(label)
+    return conn.execute(sql_code).fetchdf()
+
+
+# =============================================================================
+# End of script
+# =============================================================================
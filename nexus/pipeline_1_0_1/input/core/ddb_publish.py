@@ -0,0 +1,153 @@
+# coding=utf-8
+
+# =============================================================================
+# """
+# .. module:: input_pipeline.core.ddb_publish.py
+# .. moduleauthor:: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# .. version:: 1.0
+#
+# :Copyright: Jean-Francois Desvignes for Science Data Nexus
+# Science Data Nexus, 2026
+# :Contact: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# :Updated: 19/10/2026
+# """
+# =============================================================================
+"""
+Read-only snapshot of the project DB for the dashboard. The pipeline builds into project_data.duckdb (the staging DB:
+tables dropped and created one by one, variants as views); the publish step copies it into a new file with sorted
+tables (views materialised), compacts it (CHECKPOINT) and swaps it with os.replace: readers keep the snapshot they
+opened and the next connection opens the new one, a rebuild never locks them out or serves half-built tables.
+Optionally, each table is also exported to a Parquet file (ZSTD) in a new version directory of the Parquet export,
+and the pointer to the current version (current.json, and the current symlink where supported) is swapped once all the
+files are written: a reader never mixes the tables of two snapshots.
+"""
+# =============================================================================
+# modules to import
+# =============================================================================
+import os
+import json
+import shutil
+import datetime
+import duckdb
+from ..utils.utils_metrics import metrics_step
+
+# =============================================================================
+# Functions and classes
+# =============================================================================
+
+""" Schemas of the staging DB copied into the snapshot """
+PUBLISH_SCHEMAS = ['project', 'serving']
+""" Number of versions of the Parquet export kept (the current one and the previous ones, still open by readers) """
+PARQUET_VERSIONS_KEPT = 2
+""" Sort keys of the snapshot tables (table name without the variant prefix => columns), for the zone maps of the filters
+of the dashboard; the other tables keep the order of the staging DB (eg the serving tables sorted by weight) """
+PUBLISH_SORT_KEYS = {
+    'records': ['year_published', 'lens_id'],
+    'contribution': ['lens_id', 'contribution_id'],
+    'affiliation': ['contribution_id', 'org_id'],
+    'organisations': ['org_id'],
+    'locations': ['org_id'],
+    'net_org_edges': ['"from"', '"to"'],
+    'net_org_nodes': ['org_id'],
+    'categories': ['lens_id'],
+    'funding': ['lens_id'],
+    'topic_membership': ['topic', 'lens_id'],
+}
+
+
+def sort_key(table, columns):
+    # ORDER BY clause of a table (with or without the variant prefix), '' when the table has no sort key
+    for name, keys in PUBLISH_SORT_KEYS.items():
+        if table == name or table.endswith('_' + name):
+            if all(k.strip('"') in columns for k in keys):
+                return " ORDER BY " + ", ".join(keys)
+    return ""
+
+def copy_tables(conn, schemas=None):
+    # copies the tables and views of the attached staging DB (src) into the DB of conn, returns the number of rows per table
+    rows = {}
+    relations = conn.execute("""SELECT table_schema, table_name, table_type FROM information_schema.tables
+        WHERE table_catalog = 'src' ORDER BY table_type, table_schema, table_name;""").fetchall()
+    for schema, table, table_type in relations:
+        if schema not in (schemas or PUBLISH_SCHEMAS):
+            continue
+        columns = [r[0] for r in conn.execute("""SELECT column_name FROM information_schema.columns
+            WHERE table_catalog = 'src' AND table_schema = ? AND table_name = ?;""", [schema, table]).fetchall()]
+        conn.execute("CREATE SCHEMA IF NOT EXISTS {};".format(schema))
+        conn.execute("CREATE TABLE {0}.{1} AS SELECT * FROM src.{0}.{1}{2};".format(schema, table, sort_key(table, columns)))
+        rows['{}.{}'.format(schema, table)] = conn.execute("SELECT count(*) FROM {}.{};".format(schema, table)).fetchone()[0]
+    return rows
+
+def parquet_current(outdir):
+    # returns the directory of the current version of the Parquet export of outdir, None when there is none
+    manifest = os.path.join(outdir, 'current.json')
+    if not os.path.exists(manifest):
+        return None
+    with open(manifest) as f:
+        return os.path.join(outdir, json.load(f)['version'])
+
+def export_parquet(conn, outdir, tables):
+    # exports the tables of the snapshot to [outdir]/v_[TIMESTAMP]/[schema].[table].parquet, then points
+    # [outdir]/current.json (and the [outdir]/current symlink) to this version, and removes the older versions
+    # returns the directory of the new version
+    os.makedirs(outdir, exist_ok=True)
+    version = 'v_' + datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    versiondir = os.path.join(outdir, version)
+    os.makedirs(versiondir)
+    for table in tables:
+        outfile = os.path.join(versiondir, '{}.parquet'.format(table)).replace("'", "''")
+        conn.execute("COPY {} TO '{}' (FORMAT PARQUET, COMPRESSION ZSTD);".format(table, outfile))
+    manifest = os.path.join(outdir, 'current.json')
+    with open(manifest + '.tmp', 'w') as f:
+        json.dump({'version': version, 'published': datetime.datetime.now().isoformat(), 'tables': tables}, f, indent=2)
+    os.replace(manifest + '.tmp', manifest)
+    link = os.path.join(outdir, 'current')
+    try:
+        if os.path.lexists(link + '.tmp'):
+            os.remove(link + '.tmp')
+        os.symlink(version, link + '.tmp', target_is_directory=True)
+        os.replace(link + '.tmp', link)
+    except OSError:
+        pass  # no symlinks (eg Windows without the privilege): current.json only
+    versions = sorted(d for d in os.listdir(outdir) if d.startswith('v_') and os.path.isdir(os.path.join(outdir, d)))
+    for d in versions[:-PARQUET_VERSIONS_KEPT]:
+        shutil.rmtree(os.path.join(outdir, d), ignore_errors=True)
+    for f in os.listdir(outdir):  # files of the previous layout (1 file per table in outdir)
+        if f.endswith('.parquet') or f.endswith('.parquet.tmp'):
+            os.remove(os.path.join(outdir, f))
+    print("\t\t {} tables exported to Parquet in {}".format(len(tables), versiondir))
+    return versiondir
+
+def publish_snapshot(infile, outfile, schemas=None, parquet_dir=None):
+    # infile = the staging DuckDB DB (project_data.duckdb, not opened by another process for writing)
+    # outfile = the snapshot read by the dashboard (eg project_snapshot.duckdb), replaced atomically
+    # parquet_dir = a directory for the Parquet export of the snapshot tables, None for no export
+    # returns the number of rows per table of the snapshot
+    if not os.path.exists(infile):
+        raise ValueError("Please create the project DB first (pipeline_ddb): {}".format(infile))
+    tmpfile = outfile + '.tmp'
+    for f in [tmpfile, tmpfile + '.wal']:
+        if os.path.exists(f):
+            os.remove(f)  # a publish stopped before the swap
+    with metrics_step('pub.snapshot', kind='table') as m:
+        conn = duckdb.connect(tmpfile)
+        try:
+            conn.execute("ATTACH '{}' AS src (READ_ONLY);".format(infile.replace("'", "''")))
+            rows = copy_tables(conn, schemas)
+            conn.execute("DETACH src;")
+            conn.execute("CREATE TABLE snapshot_info AS SELECT ?::TIMESTAMP as published, ? as staging_db, ? as nb_tables;",
+                         [datetime.datetime.now(), os.path.abspath(infile), len(rows)])
+            conn.execute("CHECKPOINT;")
+            if parquet_dir:
+                export_parquet(conn, parquet_dir, list(rows))
+        finally:
+            conn.close()
+        os.replace(tmpfile, outfile)
+        m['rows_out'] = sum(rows.values())
+    print("\t\t snapshot of {} tables published in {} ({:.1f} MB)".format(len(rows), outfile, os.path.getsize(outfile) / 1024 / 1024))
+    return rows
+
+
+# =============================================================================
+# End of script
+# =============================================================================
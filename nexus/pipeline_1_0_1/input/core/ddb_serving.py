@@ -0,0 +1,100 @@
+# coding=utf-8
+
+# =============================================================================
+# """
+# .. module:: input_pipeline.core.ddb_serving.py
+# .. moduleauthor:: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# .. version:: 1.0
+#
+# :Copyright: Jean-Francois Desvignes for Science Data Nexus
+# Science Data Nexus, 2026
+# :Contact: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# :Updated: 19/10/2026
+# """
+# =============================================================================
+"""
+Serving tables of the dashboard (output/*.R) in the 'serving' schema of the project DB, built after the network:
+    serving.[VARIANT]map_edges      external collaborations between 2 geolocated organisations, with the names and
+                                    records of both organisations, sorted by weight (weight >= x reads the first blocks only)
+    serving.[VARIANT]map_nodes      locations of the organisations of map_edges with their node metrics and
+                                    max_weight (the weight of their strongest edge: max_weight >= x gives the nodes of the edges >= x)
+    serving.[VARIANT]map_countries  number of organisation locations per country for each weight threshold
+    serving.[VARIANT]country_year   records, authors and years per country and year (sums, for averages over any interval)
+"""
+# =============================================================================
+# modules to import
+# =============================================================================
+
+# =============================================================================
+# Functions and classes
+# =============================================================================
+
+""" Weight thresholds of the dashboard (top_collaboration_limit, 0 for all the collaborations) """
+SERVING_WEIGHT_THRESHOLDS = [0, 0.5, 1, 2, 5, 10]
+""" Serving tables, in build order """
+SERVING_TABLES = ['map_edges', 'map_nodes', 'map_countries', 'country_year']
+
+
+def create_serving_tables(conn, label, thresholds=None):
+    # conn = a connection (or cursor) to the project DB with the tables records, contribution, affiliation,
+    # organisations, locations, net_org_edges and net_org_nodes of the label (eg a variant)
+    thresholds = sorted(set(thresholds or SERVING_WEIGHT_THRESHOLDS))
+    conn.execute("CREATE SCHEMA IF NOT EXISTS serving;")
+    sql_code = """CREATE OR REPLACE TABLE serving.{0}map_edges AS
+        SELECT e."from", e."to", e.weight,
+            n1.name as from_name, n1.nb_records as from_nb_records,
+            n2.name as to_name, n2.nb_records as to_nb_records
+        FROM project.{0}net_org_edges e
+        JOIN project.{0}net_org_nodes n1 ON n1.org_id = e."from"
+        JOIN project.{0}net_org_nodes n2 ON n2.org_id = e."to"
+        WHERE e.is_ext
+            AND e."from" IN (SELECT org_id FROM project.{0}locations)
+            AND e."to" IN (SELECT org_id FROM project.{0}locations)
+        ORDER BY e.weight DESC, e."from", e."to";""".format(label)
+    conn.execute(sql_code)
+    sql_code = """CREATE OR REPLACE TABLE serving.{0}map_nodes AS
+        WITH w AS (
+            SELECT org_id, max(weight) as max_weight FROM (
+                SELECT "from" as org_id, weight FROM project.{0}net_org_edges WHERE is_ext
+                UNION ALL SELECT "to" as org_id, weight FROM project.{0}net_org_edges WHERE is_ext)
+            GROUP BY org_id)
+        SELECT l.org_id, l.id, l.geonames_id, l.name as city, l.country_code, l.country_name, l.lat, l.lng,
+            n.name, n.nb_records, n.nb_contributions, w.max_weight
+        FROM project.{0}locations l
+        JOIN w ON w.org_id = l.org_id
+        JOIN project.{0}net_org_nodes n ON n.org_id = l.org_id
+        ORDER BY w.max_weight DESC, l.org_id;""".format(label)
+    conn.execute(sql_code)
+    sql_code = """CREATE OR REPLACE TABLE serving.{0}map_countries AS
+        SELECT t.min_weight, m.country_code, count(*) as nb_org
+        FROM (SELECT unnest(?::DOUBLE[]) as min_weight) t
+        JOIN serving.{0}map_nodes m ON m.max_weight >= t.min_weight
+        GROUP BY t.min_weight, m.country_code
+        ORDER BY t.min_weight, nb_org DESC;""".format(label)
+    conn.execute(sql_code, [thresholds])
+    sql_code = """CREATE OR REPLACE TABLE serving.{0}country_year AS
+        SELECT CAST(o.country_code AS VARCHAR) as country_code, TRY_CAST(CAST(r.year_published AS VARCHAR) AS INTEGER) as year_published,
+            count(DISTINCT r.lens_id) as nb_records, count(*) as nb_rows,
+            sum(r.nb_authors) as sum_nb_authors, count(r.nb_authors) as nb_authors_rows
+        FROM project.{0}records r
+        LEFT JOIN project.{0}contribution c ON c.lens_id = r.lens_id
+        LEFT JOIN project.{0}affiliation a ON a.contribution_id = c.contribution_id
+        LEFT JOIN project.{0}organisations o ON o.org_id = a.org_id
+        GROUP BY ALL
+        ORDER BY year_published, country_code;""".format(label)
+    conn.execute(sql_code)
+    print("\t\t serving tables (map_edges, map_nodes, map_countries, country_year)")
+
+def serving_rows(conn, label):
+    # number of rows of the serving tables
+    return {t: conn.execute("SELECT count(*) FROM serving.{}{};".format(label, t)).fetchone()[0] for t in SERVING_TABLES}
+
+def drop_serving_tables(conn, label):
+    # removes the serving tables of a label (eg a variant no longer defined)
+    for t in SERVING_TABLES:
+        conn.execute("drop TABLE if exists serving.{}{};".format(label, t))
+
+
+# =============================================================================
+# End of script
+# =============================================================================
@@ -0,0 +1,102 @@
+# coding=utf-8
+
+# =============================================================================
+# """
+# .. module:: input_pipeline.core.ddb_topics.py
+# .. moduleauthor:: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# .. version:: 1.0
+#
+# :Copyright: Jean-Francois Desvignes for Science Data Nexus
+# Science Data Nexus, 2026
+# :Contact: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# :Updated: 19/10/2026
+# """
+# =============================================================================
+"""
+Topic membership index: the records found by each main search (topic) of the search strategy, one row per
+(record, topic) with the score of the search in project.topic_membership. Overlaps between topics, Venn counts
+and records in any/all topics are computed in the DB (no wide DF with one column per topic).
+"""
+# =============================================================================
+# modules to import
+# =============================================================================
+import pandas as pd
+
+# =============================================================================
+# Functions and classes
+# =============================================================================
+
+
+def check_topics(topics):
+    # topic ids are used in SQL strings: letters, digits, _ and - only
+    for t in topics:
+        if not all(c.isalnum() or c in '_-' for c in str(t)):
+            raise ValueError("Please enter topic ids with letters, digits, _ and - only: {}".format(t))
+    return ", ".join("'{}'".format(t) for t in topics)
+
+def add_topic_records(df, topic, uid, seen, records, memberships):
+    # df = the records of a topic (Lens API), seen = the set of the ids already harvested
+    # appends the new records to records (list of DF) and the (uid, topic, score) rows to memberships (list of DF)
+    # so that the records found by several topics are kept once
+    m = df[[uid, 'score']].copy() if 'score' in df.columns else df[[uid]].assign(score=None)
+    m = m.groupby(uid, as_index=False)['score'].max()
+    m.insert(1, 'topic', topic)
+    memberships.append(m)
+    new = df[~df[uid].isin(seen)].drop_duplicates(subset=[uid])
+    seen.update(new[uid])
+    records.append(new)
+    return new.shape[0]
+
+def create_table_topic_membership(infile, rec_id, conn, label):
+    # infile = a pickle of the (uid, topic, score) rows (see pipeline_len)
+    sql_code = "drop TABLE if exists project.{}topic_membership;".format(label)
+    conn.execute(sql_code)
+    d = pd.read_pickle(infile)
+    sql_code = """CREATE TABLE project.{0}topic_membership AS
+        SELECT {1}, topic, max(score)::DOUBLE as score FROM d GROUP BY {1}, topic ORDER BY topic, {1};""".format(label, rec_id)
+    conn.execute(sql_code)
+    print("\t\t table_topic_membership")
+
+def topic_counts(conn, label=''):
+    # number of records per topic
+    sql_code = "SELECT topic, count(*) as nb_records FROM project.{}topic_membership GROUP BY topic ORDER BY topic;".format(label)
+    return conn.execute(sql_code).fetchdf()
+
+def topic_overlap(conn, label='', topics=None, rec_id='lens_id'):
+    # number of records shared by each pair of topics (topic_a <= topic_b, the diagonal is the size of the topic)
+    where = "WHERE a.topic IN ({0}) AND b.topic IN ({0})".format(check_topics(topics)) if topics else ""
+    sql_code = """SELECT a.topic as topic_a, b.topic as topic_b, count(*) as nb_records
+        FROM project.{0}topic_membership a JOIN project.{0}topic_membership b ON a.{1} = b.{1} AND a.topic <= b.topic
+        {2} GROUP BY a.topic, b.topic ORDER BY a.topic, b.topic;""".format(label, rec_id, where)
+    return conn.execute(sql_code).fetchdf()
+
+def topic_venn(conn, topics, label='', rec_id='lens_id'):
+    # number of records in each combination of topics (Venn diagram regions): 1 boolean column per topic and nb_records
+    if len(topics) > 62:
+        raise ValueError("Please enter at most 62 topics")
+    cases = " + ".join("CASE WHEN topic = '{}' THEN {} ELSE 0 END".format(t, 1 << i) for i, t in enumerate(topics))
+    sql_code = """SELECT mask, count(*) as nb_records FROM (
+            SELECT {0}, bit_or(({1})::BIGINT) as mask FROM project.{2}topic_membership WHERE topic IN ({3}) GROUP BY {0})
+        GROUP BY mask ORDER BY mask;""".format(rec_id, cases, label, check_topics(topics))
+    d = conn.execute(sql_code).fetchdf()
+    for i, t in enumerate(topics):
+        d[t] = (d['mask'] & (1 << i)) > 0
+    return d[list(topics) + ['nb_records']]
+
+def topics_records_sql(topics, mode='any', label='', rec_id='lens_id'):
+    # SQL query of the ids of the records in any (or all) of the topics, eg for a variant or a filter of the project tables
+    if mode not in ('any', 'all'):
+        raise ValueError("Please enter a mode: 'any' or 'all'")
+    sql_code = "SELECT {0} FROM project.{1}topic_membership WHERE topic IN ({2}) GROUP BY {0}".format(rec_id, label, check_topics(topics))
+    if mode == 'all':
+        sql_code += " HAVING count(DISTINCT topic) = {}".format(len(set(topics)))
+    return sql_code
+
+def records_in_topics(conn, topics, mode='any', label='', rec_id='lens_id'):
+    # ids of the records in any (or all) of the topics
+    return conn.execute(topics_records_sql(topics, mode, label, rec_id) + ";").fetchdf()
+
+
+# =============================================================================
+# End of script
+# =============================================================================
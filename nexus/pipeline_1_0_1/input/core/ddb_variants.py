@@ -0,0 +1,215 @@
+# coding=utf-8
+
+# =============================================================================
+# """
+# .. module:: input_pipeline.core.ddb_variants.py
+# .. moduleauthor:: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# .. version:: 1.0
+#
+# :Copyright: Jean-Francois Desvignes for Science Data Nexus
+# Science Data Nexus, 2026
+# :Contact: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# :Updated: 19/10/2026
+# """
+# =============================================================================
+"""
+Project variants built from the project tables in a single pass: the records are harvested and flattened once
+(project.records, project.contribution...), each variant is a list of record ids (project.variant_membership)
+and its tables are views filtering the project tables (project.[VARIANT]_records...). The networks of the
+variants are materialised, only for the variants whose definition or records changed.
+A variant definition (DataPipeLine.project_variants) is a dictionary with any of:
+    years: [2019, 2023]                      => year_published between the 2 years
+    publication_types: ['journal article']   => publication_type in the list
+    where: "is_open_access"                  => a SQL condition on project.records
+    ids: path/to/ids.txt                     => a file of record ids (txt/csv one id per line, or parquet/pkl with a [uid] column)
+    topics: ['topic_1', 'topic_2']           => records found by any of the main searches (topics_mode: 'all' for all of them)
+"""
+# =============================================================================
+# modules to import
+# =============================================================================
+import os
+import re
+import json
+import hashlib
+import datetime
+import pandas as pd
+import duckdb
+from ..utils.utils_metrics import metrics_step
+from .ddb_data import create_table_network_organisations, table_rows
+from .ddb_topics import topics_records_sql
+from .ddb_serving import create_serving_tables, drop_serving_tables
+from .ddb_network_rollup import create_network_rollup, ROLLUP_TABLES
+from .ddb_network_analytics import create_network_analytics
+from .ddb_network_sample import SAMPLE_SEED
+from .ddb_network_top import create_networks_top, drop_top_tables
+
+# =============================================================================
+# Functions and classes
+# =============================================================================
+
+""" Views of a variant: project table => condition on the rows of the table (in dependency order) """
+VARIANT_VIEWS = {
+    'records': "{uid} IN (SELECT {uid} FROM project.variant_membership WHERE variant = '{variant}')",
+    'records_id': "{uid} IN (SELECT {uid} FROM project.variant_membership WHERE variant = '{variant}')",
+    'categories': "{uid} IN (SELECT {uid} FROM project.variant_membership WHERE variant = '{variant}')",
+    'categories_openalex_concepts': "{uid} IN (SELECT {uid} FROM project.variant_membership WHERE variant = '{variant}')",
+    'categories_openalex_topics': "{uid} IN (SELECT {uid} FROM project.variant_membership WHERE variant = '{variant}')",
+    'topic_membership': "{uid} IN (SELECT {uid} FROM project.variant_membership WHERE variant = '{variant}')",
+    'funding': "{uid} IN (SELECT {uid} FROM project.variant_membership WHERE variant = '{variant}')",
+    'contribution': "{uid} IN (SELECT {uid} FROM project.variant_membership WHERE variant = '{variant}')",
+    'affiliation': "contribution_id IN (SELECT contribution_id FROM project.{variant}_contribution)",
+    'organisations': "org_id IN (SELECT org_id FROM project.{variant}_affiliation)",
+    'organisations_id': "org_id IN (SELECT org_id FROM project.{variant}_affiliation)",
+    'locations': "org_id IN (SELECT org_id FROM project.{variant}_affiliation)",
+    'source': "source_id IN (SELECT source_id FROM project.{variant}_records)",
+    'source_issn': "source_id IN (SELECT source_id FROM project.{variant}_records)",
+}
+""" Materialised tables of a variant """
+VARIANT_TABLES = ['net_org_edges', 'net_org_nodes', 'net_org_edges_year', 'net_org_nodes_year'] + ROLLUP_TABLES
+
+
+def check_variant_name(variant):
+    # the variant is used in table names: letters, digits and _ only
+    if not isinstance(variant, str) or not re.match(r'^[A-Za-z][A-Za-z0-9_]*$', variant):
+        raise ValueError("Please enter a variant name with letters, digits and _ only: {}".format(variant))
+
+def relation_type(conn, name):
+    # 'BASE TABLE', 'VIEW' or None for project.[name]
+    r = conn.execute("SELECT table_type FROM information_schema.tables WHERE table_schema = 'project' AND table_name = ?;", [name]).fetchone()
+    return r[0] if r else None
+
+def drop_relation(conn, name):
+    # drops project.[name] whether it is a table or a view (eg a table of a variant built before the views)
+    t = relation_type(conn, name)
+    if t == 'VIEW':
+        conn.execute("DROP VIEW project.{};".format(name))
+    elif t is not None:
+        conn.execute("DROP TABLE project.{};".format(name))
+
+def read_variant_ids(infile, uid):
+    # infile = a file of record ids (txt/csv: one id per line with or without a [uid] header, parquet/pkl: a DF with a [uid] column)
+    if infile.endswith('.parquet'):
+        d = pd.read_parquet(infile, columns=[uid])
+    elif infile.endswith('.pkl'):
+        d = pd.read_pickle(infile)[[uid]]
+    else:
+        d = pd.read_csv(infile, header=None, names=[uid], dtype=str)
+        d = d[d[uid] != uid]
+    return d.drop_duplicates()
+
+def variant_condition(definition, uid):
+    # SQL condition on project.records for a variant definition (without the ids file)
+    conditions = []
+    if definition.get('years'):
+        start, end = definition['years'][0], definition['years'][-1]
+        conditions.append("TRY_CAST(CAST(year_published AS VARCHAR) AS INTEGER) BETWEEN {:d} AND {:d}".format(int(start), int(end)))
+    if definition.get('publication_types'):
+        types = ", ".join("'{}'".format(str(t).replace("'", "''")) for t in definition['publication_types'])
+        conditions.append("CAST(publication_type AS VARCHAR) IN ({})".format(types))
+    if definition.get('where'):
+        conditions.append("({})".format(definition['where']))
+    if definition.get('topics'):
+        conditions.append("{} IN ({})".format(uid, topics_records_sql(definition['topics'], definition.get('topics_mode', 'any'), rec_id=uid)))
+    return " AND ".join(conditions) if conditions else "TRUE"
+
+def variant_hash(definition, *network_options):
+    # hash of a variant definition and network options (and of the content of its ids file)
+    h = hashlib.sha256(json.dumps([definition] + list(network_options), sort_keys=True, default=str).encode('utf-8'))
+    if definition.get('ids') and os.path.exists(definition['ids']):
+        stat = os.stat(definition['ids'])
+        h.update('{}:{}'.format(stat.st_size, stat.st_mtime_ns).encode('utf-8'))
+    return h.hexdigest()
+
+def records_signature(conn, uid):
+    # signature of the project records (a new harvest or ddb run changes it)
+    n, x = conn.execute("SELECT count(*), bit_xor(hash({})) FROM project.records;".format(uid)).fetchone()
+    return '{}:{}'.format(n, x)
+
+def create_variant_membership(conn, variant, definition, uid):
+    # (re)creates the records of a variant in project.variant_membership, returns the number of records
+    conn.execute("DELETE FROM project.variant_membership WHERE variant = ?;", [variant])
+    condition = variant_condition(definition, uid)
+    if definition.get('ids'):
+        ids = read_variant_ids(definition['ids'], uid)
+        conn.execute("INSERT INTO project.variant_membership SELECT ?, {0} FROM project.records WHERE {1} AND {0} IN (SELECT {0} FROM ids);".format(uid, condition), [variant])
+    else:
+        conn.execute("INSERT INTO project.variant_membership SELECT ?, {} FROM project.records WHERE {};".format(uid, condition), [variant])
+    return conn.execute("SELECT count(*) FROM project.variant_membership WHERE variant = ?;", [variant]).fetchone()[0]
+
+def create_variant_views(conn, variant, uid):
+    # views of the project tables filtered on the records of the variant (project.[variant]_[table])
+    for table, condition in VARIANT_VIEWS.items():
+        if relation_type(conn, table) != 'BASE TABLE':
+            continue
+        drop_relation(conn, '{}_{}'.format(variant, table))
+        conn.execute("CREATE VIEW project.{0}_{1} AS SELECT * FROM project.{1} WHERE {2};".format(
+            variant, table, condition.format(uid=uid, variant=variant)))
+
+def drop_variant(conn, variant):
+    # removes the views, tables and records of a variant no longer defined
+    for table in list(VARIANT_VIEWS) + VARIANT_TABLES:
+        drop_relation(conn, '{}_{}'.format(variant, table))
+    drop_top_tables(conn, variant + "_")
+    drop_serving_tables(conn, variant + "_")
+    conn.execute("DELETE FROM project.variant_membership WHERE variant = ?;", [variant])
+    conn.execute("DELETE FROM project.variant_definitions WHERE variant = ?;", [variant])
+
+def create_variants(outfile, variants, uid='lens_id', network_max_team_size=20, network_sample_size=None, force=False,
+                    network_top_n=(100,), network_top_metric='nb_records', network_min_weight=0, network_large_teams=True,
+                    network_sample_seed=SAMPLE_SEED, network_sample_strata=None):
+    # outfile = the project DuckDB DB with the project tables (see create_ddb, built without variant)
+    # variants = {variant name: definition}, see the definitions above
+    # only the variants whose definition or project records changed since their last build are built again (all if force)
+    # returns a dictionary {variant: number of records or 'up to date'}
+    for variant in variants:
+        check_variant_name(variant)
+    conn = duckdb.connect(outfile)
+    results = {}
+    try:
+        if relation_type(conn, 'records') is None:
+            raise ValueError("Please create the project tables first (pipeline_ddb without project_variant)")
+        conn.execute("CREATE TABLE IF NOT EXISTS project.variant_membership (variant VARCHAR, {} VARCHAR);".format(uid))
+        conn.execute("CREATE TABLE IF NOT EXISTS project.variant_definitions (variant VARCHAR, definition_hash VARCHAR, records_signature VARCHAR, nb_records BIGINT, updated TIMESTAMP);")
+        for variant in [r[0] for r in conn.execute("SELECT variant FROM project.variant_definitions;").fetchall()]:
+            if variant not in variants:
+                drop_variant(conn, variant)
+                print("\t\t variant {} removed".format(variant))
+        signature = records_signature(conn, uid)
+        for variant, definition in variants.items():
+            definition = definition or {}
+            definition_hash = variant_hash(definition, network_max_team_size, network_sample_size, network_top_n, network_top_metric, network_min_weight,
+                                          network_large_teams, network_sample_seed, network_sample_strata)
+            last = conn.execute("SELECT definition_hash, records_signature FROM project.variant_definitions WHERE variant = ?;", [variant]).fetchone()
+            built = all(relation_type(conn, '{}_{}'.format(variant, t)) for t in VARIANT_TABLES)
+            if not force and built and last == (definition_hash, signature):
+                print("\t\t variant {} is up to date".format(variant))
+                results[variant] = 'up to date'
+                continue
+            with metrics_step('var.{}'.format(variant), kind='table') as m:
+                nb_records = create_variant_membership(conn, variant, definition, uid)
+                m['rows_in'] = nb_records
+                create_variant_views(conn, variant, uid)
+                label = variant + "_"
+                for table in VARIANT_TABLES:
+                    drop_relation(conn, label + table)
+                create_table_network_organisations(uid, conn, label, network_max_team_size, network_sample_size, network_large_teams,
+                                                   network_sample_seed, network_sample_strata)
+                create_network_analytics(conn, label)
+                create_network_rollup(conn, label)
+                if network_top_n:
+                    create_networks_top(conn, label, network_top_n, network_top_metric, network_min_weight)
+                create_serving_tables(conn, label)
+                m['rows_out'] = table_rows(conn, label, 'net_org_edges')
+            conn.execute("DELETE FROM project.variant_definitions WHERE variant = ?;", [variant])
+            conn.execute("INSERT INTO project.variant_definitions VALUES (?, ?, ?, ?, ?);",
+                         [variant, definition_hash, signature, nb_records, datetime.datetime.now()])
+            print("\t\t variant {}: {} records".format(variant, nb_records))
+            results[variant] = nb_records
+    finally:
+        conn.close()
+    return results
+
+
+# =============================================================================
+# End of script
+# =============================================================================
@@ -23,18 +23,16 @@ Refer to the README.txt for details about HOW TO run the input pipeline.
 import os
 import sys
 from pathlib import Path
-import pandas as pd
 import datetime
+import threading
 import yaml ## pyyaml module
 # Science Data Nexus Pipeline modules - list of modules
-from .api.lens_api import *
-from .api.openalex_api import *
-from .api.ror_api import *
-from .api.search_strategy import load_search_strategy
-from .core.ddb_data import *
-from .core.ddb_baselines import *
-from .utils.utils_api import *
-from .utils.utils_core import *
+# the API and core modules (pandas, duckdb, requests, pyalex) are imported by the steps that use them
+from .utils.utils_lazy import lazy_import
+from .utils.utils_core import load_pipeline_config_file
+from .utils.utils_steps import PipelineStep, StepScheduler
+from .utils.utils_metrics import start_run, end_run, get_run
+pd = lazy_import('pandas')
 """
 Add modules when needed when custom pipelines are run such as:
 import matplotlib.pyplot as plt
@@ -100,13 +98,29 @@ class DataPipeLine:
         # =============================================================================
         ## LENS API
         self.lens_query_boundaries = " DT=(Article OR Review OR Proceedings Paper) "  ## by default " DT=(Article OR Review OR Proceedings Paper) "
+        self.lens_partition_size = 50000  ## max records per harvest partition (years are split by month/day above it), None to harvest by year
+        self.lens_workers = 4  ## number of partitions harvested in parallel
+        self.lens_include_profile = 'ddb_full'  ## fields requested from the Lens API: 'minimal_ids', 'ddb_full', 'network_only' or None for full records
+        ## Run reports (pipeline_run)
+        self.profile_steps = False  ## saves a cProfile file per step in [data]/[project]/_run_reports
+        self.trace_memory = False  ## records the peak of python allocations per step (slower, use with jobs=1)
+        self.last_run = None  ## metrics of the last pipeline_run (RunMetrics)
         ## variables for network graph creation
         self.network_sample_size = None # size of the sampling to create a network map
+        self.network_sample_seed = 42  ## seed of the sample (same seed and records => same sample)
+        self.network_sample_strata = None  ## None, 'year' or 'discipline': sample stratified by year or discipline (see core/ddb_network_sample.py)
+        self.ddb_jobs = 1  ## number of DuckDB table builders running in parallel in pipeline_ddb (see core/ddb_data.py TABLE_BUILDER_DEPENDENCIES)
+        self.publish_parquet = False  ## pipeline_pub also exports the snapshot tables to Parquet files in [data]/[project]/project_snapshot_parquet
+        self.publish_csr = False  ## pipeline_pub also exports the networks as CSR arrays (.npy) in [data]/[project]/project_snapshot_csr (see core/ddb_network_export.py)
+        self.publish_csr_float32 = False  ## float32 weights in the CSR export (half the size)
+        self.project_variants = {}  ## variants built from the project tables by pipeline_var, eg {'vic_2019': {'years': [2019, 2023]}} (see core/ddb_variants.py)
         self.network_metrics = ['cnci', 'percentile', 'is_top10', 'is_top01']  ## default paper lavel metrics to include
         self.network_metadata = ["category", "country", 'country_label', "state",
                                  "organisation"]  ## collaboration metadata to include
         self.network_cluster = 'country'  ## network level to create: 'country', 'precinct', 'organisation'
         self.network_categories = None  ## set value to None for 1 grpah per category otherwise set value to ['combined'] for a single graph across all categories.
+        self.network_jobs = 1  ## number of worker processes generating the networks per category (see core/ddb_network_categories.py)
+        self.network_large_teams = True  ## include the records with more than network_max_team_size authors in the networks (closed form weights, see core/ddb_data.py team_pair_weights), False to exclude them
         self.network_version = ""  ## text string to define a specific version of the graph, by default empty
         self.network_type = 'organisation'
         """
@@ -116,6 +130,8 @@ class DataPipeLine:
         """
         self.network_interval = [2013, 2018]  ## interval to use, None if whole dataset
         self.network_nodes = (100,)  ## top n countries/organisations/clusters to include
+        self.network_top_metric = 'nb_records'  ## metric of the top n nodes: 'nb_records', 'nb_contributions' or 'degree' (see core/ddb_network_top.py)
+        self.network_min_weight = 0  ## minimum weight of the edges of the top n networks
         self.network_mode = 1  ## graph mode (1 or 2)
         ## S3 export
         self._s3_bucket = "projects"
@@ -139,6 +155,7 @@ class DataPipeLine:
         self.last_year = self._project_end_year  ## in the case of specific date, to be changed
         self.searches = []
         self.names = []
+        self._baseline_lock = threading.Lock()  # baseline DB imports cannot run in parallel
     # =============================================================================
     # Properties
     # =============================================================================
@@ -355,7 +372,23 @@ class DataPipeLine:
         # with open(i_file, 'r') as sql_file:
         #     sql_code = sql_file.read()
         # conn.execute(sql_code)
-        """ Classifications """
+        self.pipeline_bas_openalex()
+        self.pipeline_bas_ror()
+        """ Final cleanup """
+
+    def pipeline_bas_setup(self):
+        """
+        Baselines DB (schema baselines)
+        """
+        from .core.ddb_baselines import create_baseline_table
+        create_baseline_table(self._data_dir, self._baseline_version)
+
+    def pipeline_bas_openalex(self):
+        """
+        Classifications from OpenAlex (the download can run in parallel with pipeline_bas_ror, the DB import cannot)
+        """
+        from .api.openalex_api import GetOpenAlexData
+        from .core.ddb_baselines import get_classification_openalex, openalex_concepts_hierarchy
         file_topics = os.path.join(self._data_dir, self._baseline_version, 'openalex_topics.pkl')
         file_concepts = os.path.join(self._data_dir, self._baseline_version, 'openalex_concepts.pkl')
         oa = GetOpenAlexData(api_configuration= self.api_config_oa)
@@ -372,20 +405,166 @@ class DataPipeLine:
             l = ["display_name","level","description","works_count","cited_by_count","ancestors","related_concepts","updated_date","created_date","ids.openalex","ids.wikidata","ids.wikipedia","ids.mag", "international.display_name.fr","international.description.fr"]  ## selected columns to reduce file size (800M raw)
             y = y[l]
             y.to_pickle(file_concepts)
-        get_classification_openalex(self._data_dir, self._baseline_version, file_concepts, file_topics)
-        openalex_concepts_hierarchy(self._data_dir, self._baseline_version)
+        with self._baseline_lock:
+            get_classification_openalex(self._data_dir, self._baseline_version, file_concepts, file_topics)
+            openalex_concepts_hierarchy(self._data_dir, self._baseline_version)
         print('\t\t Categories baselines completed')
-        """ ROR data dump"""
+
+    def pipeline_bas_ror(self):
+        """
+        ROR data dump (the download can run in parallel with pipeline_bas_openalex, the DB import cannot)
+        """
+        from .api.ror_api import RORapi
+        from .core.ddb_baselines import get_ror_organisations
         ror = RORapi(self.api_config_zenodo)
         json_obj = ror.get_ror_dump()
-        get_ror_organisations(self._data_dir, self._baseline_version, json_obj)
+        with self._baseline_lock:
+            get_ror_organisations(self._data_dir, self._baseline_version, json_obj)
         print('\t\t ROR baselines completed')
-        """ Final cleanup """
-   
+
+    def pipeline_steps(self):
+        """
+        Step graph of the pipeline: inputs, outputs (files or DuckDB tables) and dependencies of each step
+        """
+        if self._project_variant:
+            project_variant_string = self._project_variant + "_"
+        else:
+            project_variant_string = ""
+        baseline_db = os.path.join(self._data_dir, self._baseline_version, 'baseline_data.duckdb')
+        project_db = os.path.join(self._data_dir, self._project_name, 'project_data.duckdb')
+        snapshot_db = os.path.join(self._data_dir, self._project_name, 'project_snapshot.duckdb')
+        search_strategy = os.path.join(self._root_dir, "config", "search_strategy.yaml")
+        pipeline_config = os.path.join(Path(__file__).parent, "config", "pipeline_config.yaml")
+        years = {'start_year': self._project_start_year, 'end_year': self._project_end_year}
+
+        def with_baseline_lock(function):
+            def run():
+                with self._baseline_lock:
+                    function()
+            return run
+
+        steps = [
+            PipelineStep('bas_setup', self.pipeline_bas_setup,
+                         outputs=[baseline_db], resources=['baseline_db']),
+            PipelineStep('bas_openalex', self.pipeline_bas_openalex,
+                         outputs=[baseline_db + '::baselines.concepts_hierarchy', baseline_db + '::baselines.topics_nodes'],
+                         depends_on=['bas_setup']),
+            PipelineStep('bas_ror', self.pipeline_bas_ror,
+                         outputs=[baseline_db + '::baselines.ror', baseline_db + '::baselines.ror_location'],
+                         depends_on=['bas_setup'], params={'ror_version': self._ror_version}),
+            PipelineStep('nor', with_baseline_lock(self.pipeline_nor),
+                         inputs=[pipeline_config],
+                         outputs=[baseline_db + '::baselines.normalisation_n_lens_concepts', baseline_db + '::baselines.normalisation_p_lens_concepts',
+                                  baseline_db + '::baselines.normalisation_t_lens_concepts'],
+                         depends_on=['bas_openalex'], params=years, resources=['baseline_db']),
+            PipelineStep('len', self.pipeline_len,
+                         inputs=[search_strategy],
+                         outputs=[os.path.join(self._tempdir, '{}lens_scholarly_raw.pkl'.format(project_variant_string))],
+                         depends_on=['bas_setup'], params=dict(years, variant=self._project_variant, include=self.lens_include_profile)),
+            PipelineStep('ddb', self.pipeline_ddb,
+                         inputs=[search_strategy, os.path.join(self._tempdir, '{}lens_scholarly_raw.pkl'.format(project_variant_string)),
+                                 os.path.join(self._tempdir, '{}lens_scholarly_topic_membership.pkl'.format(project_variant_string))],
+                         outputs=[project_db + '::project.{}net_org_edges'.format(project_variant_string)],
+                         depends_on=['len', 'bas_openalex', 'bas_ror'],
+                         params={'variant': self._project_variant, 'network_sample': [self.network_sample_size, self.network_sample_seed, self.network_sample_strata],
+                                 'network_top': [self.network_nodes, self.network_top_metric, self.network_min_weight],
+                                 'network_categories': self.network_categories, 'network_large_teams': self.network_large_teams},
+                         resources=['project_db', 'baseline_db']),
+            PipelineStep('var', self.pipeline_var,
+                         inputs=[v['ids'] for v in self.project_variants.values() if v and v.get('ids')],
+                         outputs=[project_db + '::project.variant_membership'] if self.project_variants else [],
+                         depends_on=['ddb'],
+                         params={'variants': self.project_variants, 'network_sample': [self.network_sample_size, self.network_sample_seed, self.network_sample_strata],
+                                 'network_large_teams': self.network_large_teams,
+                                 'network_top': [self.network_nodes, self.network_top_metric, self.network_min_weight]},
+                         resources=['project_db']),
+            PipelineStep('pub', self.pipeline_pub,
+                         outputs=[snapshot_db],
+                         depends_on=['ddb', 'var'],
+                         params={'parquet': self.publish_parquet, 'csr': [self.publish_csr, self.publish_csr_float32]},
+                         resources=['project_db']),
+        ]
+        return steps
+
+    def pipeline_run(self, steps=None, jobs=1, force=False, plan_only=False, skip=()):
+        """
+        Run steps of the pipeline (eg ['ddb']) with the steps they depend on, in dependency order.
+        Steps whose inputs, parameters and upstream steps did not change since their last run are skipped,
+        independent steps run in parallel (jobs). The state of the last runs is saved in the temp_files folder.
+        skip: steps considered as up to date (eg the baseline steps already run by the batch runner).
+        When a run is already started (batch runner), the steps are recorded in it, prefixed by the project name.
+        """
+        print("\t >>> RUN, steps: {}".format(', '.join(steps) if steps else 'all'))
+        if not os.path.exists(self._tempdir):
+            os.makedirs(self._tempdir)
+        nested = get_run() is not None
+        scheduler = StepScheduler(self.pipeline_steps(), os.path.join(self._tempdir, '_pipeline_state.json'), jobs=jobs,
+                                  label=self._project_name if nested else None)
+        if plan_only:
+            plan = scheduler.plan(steps, force=force, skip=skip)
+            for name, action in plan:
+                print("\t\t {} : {}".format(name, action))
+            return plan
+        if nested:
+            report = scheduler.run(steps, force=force, skip=skip)
+            self.last_run = get_run()
+            return report
+        start_run(self._project_name, os.path.join(self._outdir, '_run_reports'), profile=self.profile_steps, trace_memory=self.trace_memory)
+        try:
+            report = scheduler.run(steps, force=force, skip=skip)
+        finally:
+            run = end_run()
+            self.last_run = run
+            print("\t >>> RUN report saved in {}".format(run.outdir))
+            for line in run.summary():
+                print("\t\t " + line)
+        return report
+
+    def pipeline_len_plan(self, page_size=1000):
+        """
+        Preflight of the Lens harvest with count-only requests (no records downloaded): for each search of the
+        search strategy, the number of records, of partitions (see lens_partition_size) and of requests to harvest them
+        """
+        from .api.lens_api import GetLensData
+        from .api.search_strategy import load_search_strategy
+        from .utils.utils_api import get_call_tracker
+        infile = os.path.join(self._root_dir, "config", "search_strategy.yaml")
+        search_strategy = load_search_strategy(infile)
+        ss = search_strategy.loc[(search_strategy.source == 'lens_scholarly') & (search_strategy.category.isin(['main', 'secondary']))]
+        lens = GetLensData(api_configuration= self.api_config_lenss,
+                            query_string= {},
+                            page_size=page_size,
+                            api_include= self.lens_include_profile
+                        )
+        tracker = get_call_tracker(self.api_config_lenss.get('apikey'))
+        rows = []
+        for i in ss.index:
+            lens.query_string = ss.loc[i, 'value']
+            calls = tracker.nb_calls
+            if ss.loc[i, 'category'] == 'main':  # records harvested by partition (search + scroll pages)
+                partitions = lens.plan_lens_partitions(self._project_start_year, self._project_end_year,
+                                                       max_partition_size=self.lens_partition_size or 10 ** 9,
+                                                       nb_workers=self.lens_workers, call_tracker=tracker)
+                nb_records = int(partitions['nb_records'].sum())
+                nb_partitions = partitions.shape[0]
+                nb_requests = int(sum(-(-n // page_size) for n in partitions['nb_records']))
+            else:  # secondary searches: a single aggregate request
+                nb_records = lens.count_lens_records({"range": {"year_published": {"gte": self._project_start_year, "lte": self._project_end_year}}}, call_tracker=tracker)
+                nb_partitions = 0
+                nb_requests = 1
+            rows.append({'topic': ss.loc[i, 'id'], 'category': ss.loc[i, 'category'], 'nb_records': nb_records,
+                         'nb_partitions': nb_partitions, 'nb_requests': nb_requests,
+                         'preflight_requests': tracker.nb_calls - calls})
+        return pd.DataFrame(rows, columns=['topic', 'category', 'nb_records', 'nb_partitions', 'nb_requests', 'preflight_requests'])
+
     def pipeline_nor(self, data_source='lens_scholarly'):
         """
         Details in ./pipeline_VERSION/README.txt
         """
+        import duckdb
+        from .api.lens_api import GetLensData
+        from .core.ddb_baselines import citation_distribution_from_aggregations, citation_percentile_thresholds
+        from .utils.utils_api import get_call_tracker
         try:
             print("\t >>> Creates citation normalisation table")
             db_infile = os.path.join(self._data_dir, self._baseline_version, 'baseline_data.duckdb')
@@ -397,6 +576,8 @@ class DataPipeLine:
                 conn.execute(sql_code)
                 sql_code = "drop TABLE if exists baselines.normalisation_p_lens_concepts;"
                 conn.execute(sql_code)
+                sql_code = "drop TABLE if exists baselines.normalisation_t_lens_concepts;"
+                conn.execute(sql_code)
                 sql_code = "SELECT * from baselines.concepts_hierarchy where level > 0 and parent_1 != '0';" # list of concepts with their hierarchy (discipline and domain)
                 concepts = conn.execute(sql_code).fetchdf()
                 df_concepts = concepts.groupby(by=['parent_1', 'display_name_1']).agg(category_id=("raw_display_name", lambda x: [{"term": {"field_of_study": i}} for i in set(x)]), nb_id=("category_id", "nunique")).reset_index()
@@ -448,17 +629,22 @@ class DataPipeLine:
                                             "year_published": {
                                                 "date_histogram": {
                                                     "field": "date_published",
-                                                    "interval": "YEAR"
+                                                    "interval": "YEAR",
+                                                    "aggregations": {
+                                                        "referenced_by_count": {
+                                                            "terms": {"field": "referenced_by_count", "size": 10000, "order": {"field_value": "asc"}}
+                                                        }
+                                                    }
                                                 }
                                             }
-                                        } 
+                                        } # full distribution of citations by year in a single request
                 # list_category_id= ['C100970517', 'C110354214']
                 # list_pubtype_id = ['ja', 'nt']
                 df = pd.DataFrame()
                 df_p = pd.DataFrame()
                 df_combinations = pd.merge(df_concepts, pubtypes, how='cross')
                 # df_combinations = df_combinations[(df_combinations.parent_1.isin(list_category_id)) & (df_combinations.pubtype_id.isin(list_pubtype_id))].reset_index(drop=True)
-                tracker = APICallTracker()
+                tracker = get_call_tracker(self.api_config_lenss.get('apikey'))
                 """Start iteration by number of citations to averages"""
                 for i in df_combinations.index :
                     print('\t start {} - {} / {}'.format(i+1, df_combinations.iloc[i]['display_name_1'], df_combinations.iloc[i]['name']))
@@ -477,57 +663,57 @@ class DataPipeLine:
                     df = pd.concat([df, df_aggregation]).reset_index(drop=True)
                 sql_code = "CREATE TABLE baselines.normalisation_n_lens_concepts AS SELECT * FROM df;"
                 conn.execute(sql_code)
-                """Start iteration by number of citations to retrieve distribution"""
-                # for i in df_combinations.index :
-                #     print('\t start {} - {} / {}'.format(i+1, df_combinations.iloc[i]['display_name_1'], df_combinations.iloc[i]['name']))
-                #     query_string_agg_1 = df_combinations.iloc[i]['category_id']
-                #     query_string_agg_2 = df_combinations.iloc[i]['value']
-                #     loop_patent_1 = df_combinations.iloc[i]['parent_1']
-                #     loop_pubtype_id = df_combinations.iloc[i]['pubtype_id']
-                #     query = {"bool": {"must":[
-                #                 {"match": {"is_retracted": False}},
-                #                 {"bool": {"should":query_string_agg_1}},
-                #                 {"bool": {"should":query_string_agg_2}},
-                #                 {"match": {"referenced_by_count": None}}
-                #                 ]}}
-                #     df_combination = df.loc[(df.parent_1 == loop_patent_1) & (df.pubtype_id == loop_pubtype_id),]
-                #     df_pc = pd.DataFrame()
-                #     # max_cites = int(df_combination['max'])
-                #     max_cites = 3
-                #     # if df_aggregation.shape[0] > 0:
-                #     for c in range(min(df_combination['min']), max_cites):
-                #         print('\t\t start distribution by cites for {} / {} / {}'.format(df_combinations.iloc[i]['display_name_1'], df_combinations.iloc[i]['name'], c))
-                #         query['bool']['must'][3]['match']["referenced_by_count"] = c
-                #         lens.query_string = query
-                #         lens.aggregation_string = aggregation_distrib
-                #         df_0, df_distrib, nb_total_0, max_score_0, tracker = lens.get_lens_data(self._project_start_year, self._project_end_year, call_tracker=tracker) 
-                #         if df_distrib.shape[0] > 0:
-                #             df_distrib['referenced_by_count'] = c
-                #             df_pc = pd.concat([df_pc, df_distrib])
-                #     df_pc['parent_1'] = loop_patent_1
-                #     df_pc['pubtype_id'] = loop_pubtype_id
-                #     df_p = pd.concat([df_p, df_pc])
-                # sql_code = "CREATE TABLE baselines.normalisation_p_lens_concepts AS SELECT * FROM df_p;"
-                # conn.execute(sql_code)
+                """Start iteration by combination to retrieve the distribution of citations (1 request per combination)"""
+                for i in df_combinations.index :
+                    print('\t start distribution {} - {} / {}'.format(i+1, df_combinations.iloc[i]['display_name_1'], df_combinations.iloc[i]['name']))
+                    query_string_agg_1 = df_combinations.iloc[i]['category_id']
+                    query_string_agg_2 = df_combinations.iloc[i]['value']
+                    query = {"bool": {"must":[
+                                {"match": {"is_retracted": False}},
+                                {"bool": {"should":query_string_agg_1}},
+                                {"bool": {"should":query_string_agg_2}}
+                                ]}}
+                    lens.query_string = query
+                    lens.aggregation_string = aggregation_distrib
+                    data, nb_total_0, tracker = lens.get_lens_aggregate(self._project_start_year, self._project_end_year, call_tracker=tracker)
+                    df_distrib = citation_distribution_from_aggregations(data)
+                    if df_distrib.shape[0] > 0:
+                        df_distrib['parent_1'] = df_combinations.iloc[i]['parent_1']
+                        df_distrib['pubtype_id'] = df_combinations.iloc[i]['pubtype_id']
+                        df_p = pd.concat([df_p, df_distrib]).reset_index(drop=True)
+                if df_p.shape[0] == 0:
+                    raise ValueError("Please check the Lens API: no citation distribution returned for {} combinations".format(df_combinations.shape[0]))
+                df_p = df_p[['parent_1', 'pubtype_id', 'year_published', 'referenced_by_count', 'nb_records', 'cum_records', 'percentile']]
+                sql_code = "CREATE TABLE baselines.normalisation_p_lens_concepts AS SELECT * FROM df_p ORDER BY parent_1, pubtype_id, year_published, referenced_by_count;"
+                conn.execute(sql_code)
+                """Compact table of the citation thresholds of the percentiles"""
+                df_t = citation_percentile_thresholds(df_p)
+                sql_code = "CREATE TABLE baselines.normalisation_t_lens_concepts AS SELECT * FROM df_t ORDER BY parent_1, pubtype_id, year_published, percentile;"
+                conn.execute(sql_code)
                 """ Final code """
                 conn.close()
+                print('\t\t Citation normalisation baselines completed')
         except Exception as e:
             print("error in pipeline_nor")
             print(e)
-        finally:
-            print('\t\t Citation normalisation baselines completed')
+            raise
      
     def pipeline_len(self):
         """
         Details in ./pipeline_VERSION/README.txt
         """
+        import duckdb
+        from .api.lens_api import GetLensData, merge_lens_aggregations, split_lens_aggregations
+        from .api.search_strategy import load_search_strategy
+        from .core.ddb_topics import add_topic_records
+        from .utils.utils_api import get_call_tracker
         print("\t >>> API, extract uids from thelens.org API and export to SQL")
         if self._project_variant:
             project_variant_string = self._project_variant + "_"
         else:
             project_variant_string = ""
         if not os.path.exists(self._tempdir):
-            os.mkdir(self._tempdir)
+            os.makedirs(self._tempdir)
         if not os.path.exists(os.path.join(self._tempdir, '{}records_dataset.parquet'.format(project_variant_string))):
             # infile = os.path.join(self._wdir, "config", "search_strategy.yaml")
             infile = os.path.join(self._root_dir, "config", "search_strategy.yaml")
@@ -538,46 +724,36 @@ class DataPipeLine:
             # ss = search_strategy.loc[search_strategy.source.isin(['lens_scholarly', 'lens_patents']) & search_strategy.category.isin(['main', 'secondary'])]
             """ Run the Lens API for the main searches"""
             ss = search_strategy.loc[(search_strategy.source == 'lens_scholarly') & (search_strategy.category == 'main')]
-            # nb_searches =ss.shape[0]
-            # if nb_searches > 0:
-            #     uids = pd.DataFrame()
-            #     sectors = pd.DataFrame()
-            #     lens = GetLensData(api_configuration= self.api_config_lenss,
-            #                         query_string= None,
-            #                         query_parameters=None, 
-            #                         page_size=1000,
-            #                         aggregation_string=None,
-            #                         api_type='scholarly',
-            #                         api_sort=[{"relevance":"desc"}, {"year_published": "desc"}],
-            #                         api_include= None,
-            #                         api_exclude=None,
-            #                         api_stemming=True,
-            #                         api_regex=False,
-            #                         api_min_score=0 
-            #                     )
-            #     for i in ss.index:
-            #         topic = ss.loc[ss.index == i,].iloc[0]['id']
-            #         lens.query_string = ss.loc[ss.index == i,].iloc[0]['value']
-            #         df, df_aggregation, nb_total, max_score = lens.get_lens_data(self._project_start_year, self._project_end_year) 
-            #         outfile = os.path.join(self._tempdir, '{}{}_{}_raw.pkl'.format(
-            #             project_variant_string,
-            #             lens.api_type,
-            #             topic
-            #             )
-            #         )
-            #         df.to_pickle(outfile)
-            #         uids = uids.merge(df[[self._uid, topic, "score"]], on=self._uid, how='outer')
-            #         sectors = pd.concat([sectors, df])
-            #     # uids['n'] = nb_searches
-            #     # uids['ranking'] = uids[search_strategy[i][j]['topics']].max(axis=1, numeric_only=True)
-            #     # if self.min_relevance > 0:
-            #     #     uids = uids[uids['score'] >= self.min_relevance]  ## only returns results above relevance threshold
-            #     uids.drop_duplicates(inplace=True)
-            #     sectors.sort_values(by=[self._uid, 'score'], ascending=False, inplace=True)
-            #     sectors.drop_duplicates(subset=[self._uid], keep='first', inplace=True)
-            #     uids = uids.merge(sectors, on=self._uid, how='left')
-            #     uids.to_pickle(os.path.join(self._tempdir, '{}{}records_topics.pkl'.format(project_variant_string, 'lens_scholarly')))
-            #     sectors.to_pickle(os.path.join(self._tempdir, '{}{}_raw.pkl'.format(project_variant_string, 'lens_scholarly')))
+            if ss.shape[0] > 0:
+                lens = GetLensData(api_configuration= self.api_config_lenss,
+                                    query_string= {},
+                                    query_parameters=None, 
+                                    page_size=1000,
+                                    aggregation_string=None,
+                                    api_type='scholarly',
+                                    api_sort=[{"relevance":"desc"}, {"year_published": "desc"}],
+                                    api_include= self.lens_include_profile,
+                                    api_exclude=None,
+                                    api_stemming=True,
+                                    api_regex=False,
+                                    api_min_score=0 
+                                )
+                """ The records found by several topics are kept once, the topics of each record are in a (uid, topic, score) list """
+                seen = set()
+                records = []
+                memberships = []
+                tracker = get_call_tracker(self.api_config_lenss.get('apikey'))
+                for i in ss.index:
+                    topic = ss.loc[i, 'id']
+                    lens.query_string = ss.loc[i, 'value']
+                    df, df_aggregation, nb_total, max_score, tracker = lens.get_lens_data(self._project_start_year, self._project_end_year, call_tracker=tracker, max_partition_size=self.lens_partition_size, nb_workers=self.lens_workers) 
+                    if nb_total > 0:
+                        nb_new = add_topic_records(df, topic, self._uid, seen, records, memberships)
+                        print("\t\t {}: {} records ({} new)".format(topic, nb_total, nb_new))
+                    del df
+                if records:
+                    pd.concat(records, ignore_index=True).to_pickle(os.path.join(self._tempdir, '{}{}_raw.pkl'.format(project_variant_string, 'lens_scholarly')))
+                    pd.concat(memberships, ignore_index=True).to_pickle(os.path.join(self._tempdir, '{}{}_topic_membership.pkl'.format(project_variant_string, 'lens_scholarly')))
                     
             """ Run the Lens API for the secondary searches with aggregates"""
             ss = search_strategy.loc[(search_strategy.source == 'lens_scholarly') & (search_strategy.category == 'secondary')]
@@ -596,27 +772,90 @@ class DataPipeLine:
                                     api_regex=False,
                                     api_min_score=0 
                                 )
+                """ All the aggregations of a topic are sent in a single request """
+                aggregations = {ss_agg.iloc[agg]['id']: ss_agg.iloc[agg]['value'] for agg in ss_agg.index}
+                aggregation_string, agg_map = merge_lens_aggregations(aggregations)
+                tables = {}
+                tracker = get_call_tracker(self.api_config_lenss.get('apikey'))
                 for i in ss.index:
-                    if ss_agg.shape[0] > 0:
-                        for agg in ss_agg.index:
-                            lens.query_string = ss.loc[ss.index == i,].iloc[0]['value']
-                            lens.aggregation_string = ss_agg.loc[ss_agg.index == agg,].iloc[0]['value']
-                            topic = ss.loc[ss.index == i,].iloc[0]['id']
-                            table = ss_agg.loc[ss_agg.index == agg,].iloc[0]['id']
-                            df, df_aggregation, nb_total, max_score = lens.get_lens_data(self._project_start_year, self._project_end_year) 
-                            outfile = os.path.join(self._tempdir, '{}{}_{}_{}_aggregate.pkl'.format(
-                                project_variant_string,
-                                lens.api_type,
-                                topic,
-                                table
-                                )
-                            )
-                            df_aggregation.to_pickle(outfile)
+                    if len(aggregations) > 0:
+                        topic = ss.loc[ss.index == i,].iloc[0]['id']
+                        lens.query_string = ss.loc[ss.index == i,].iloc[0]['value']
+                        lens.aggregation_string = aggregation_string
+                        data, nb_total, tracker = lens.get_lens_aggregate(self._project_start_year, self._project_end_year, call_tracker=tracker)
+                        for table, df_aggregation in split_lens_aggregations(data, agg_map).items():
+                            df_aggregation.insert(0, 'topic', topic)
+                            tables[table] = pd.concat([tables[table], df_aggregation], ignore_index=True) if table in tables else df_aggregation
+                """ Aggregations are saved in one DuckDB file (1 table per aggregation, 1 row per topic and bucket) """
+                outfile = os.path.join(self._tempdir, '{}{}_aggregate.duckdb'.format(project_variant_string, lens.api_type))
+                conn = duckdb.connect(outfile)
+                conn.execute("CREATE SCHEMA IF NOT EXISTS aggregate;")
+                for table, df_aggregation in tables.items():
+                    conn.execute("CREATE OR REPLACE TABLE aggregate.{} AS SELECT * FROM df_aggregation;".format(table))
+                conn.close()
+                print("\t\t {} aggregate tables saved in {}".format(len(tables), outfile))
+
+    def pipeline_var(self, network_max_team_size=20, force=False):
+        """
+        Variants of the project (project_variants) built from the project tables without harvesting them again:
+        1 list of records per variant and views of the project tables (project.[VARIANT]_records...), networks materialised
+        """
+        from .core.ddb_variants import create_variants
+        print("\t >>> VAR, project variants from the project tables")
+        if not self.project_variants:
+            print("\t\t no project variants")
+            return {}
+        outfile = os.path.join(self._data_dir, self._project_name, 'project_data.duckdb')
+        return create_variants(outfile, self.project_variants, uid=self._uid, network_max_team_size=network_max_team_size,
+                               network_sample_size=self.network_sample_size, force=force, network_top_n=self.network_nodes,
+                               network_top_metric=self.network_top_metric, network_min_weight=self.network_min_weight,
+                               network_large_teams=self.network_large_teams, network_sample_seed=self.network_sample_seed,
+                               network_sample_strata=self.network_sample_strata)
+
+    def pipeline_net_interval(self, interval=None, variant=None):
+        """
+        Collaboration network (edges, nodes) of the records of an interval of years, by default network_interval
+        (None for all the years), summed from the networks per year of the project DB (see core/ddb_network_years.py)
+        """
+        import duckdb
+        from .core.ddb_network_years import network_interval
+        interval = self.network_interval if interval is None else interval
+        start, end = (interval[0], interval[-1]) if interval else (None, None)
+        variant = variant or self._project_variant
+        label = variant + "_" if variant else ""
+        conn = duckdb.connect(os.path.join(self._data_dir, self._project_name, 'project_data.duckdb'), read_only=True)
+        try:
+            return network_interval(conn, start, end, label)
+        finally:
+            conn.close()
+
+    def pipeline_pub(self):
+        """
+        Read-only snapshot of the project DB for the dashboard (sorted tables, compacted, swapped atomically)
+        """
+        from .core.ddb_publish import publish_snapshot
+        print("\t >>> PUB, publish the snapshot of the project DB")
+        project_dir = os.path.join(self._data_dir, self._project_name)
+        parquet_dir = os.path.join(project_dir, 'project_snapshot_parquet') if self.publish_parquet else None
+        snapshot_db = os.path.join(project_dir, 'project_snapshot.duckdb')
+        rows = publish_snapshot(os.path.join(project_dir, 'project_data.duckdb'), snapshot_db, parquet_dir=parquet_dir)
+        if self.publish_csr:
+            import duckdb
+            from .core.ddb_network_export import export_networks_csr
+            conn = duckdb.connect(snapshot_db, read_only=True)
+            try:
+                export_networks_csr(conn, os.path.join(project_dir, 'project_snapshot_csr'),
+                                    weights_dtype='float32' if self.publish_csr_float32 else 'float64')
+            finally:
+                conn.close()
+        return rows
 
-    def pipeline_ddb(self, main_source='lens_scholarly', network_max_team_size=20):
+    def pipeline_ddb(self, main_source='lens_scholarly', network_max_team_size=20, tables=None):
         """
         Details in ./pipeline_VERSION/README.txt
         """
+        from .api.search_strategy import load_search_strategy
+        from .core.ddb_data import create_ddb
         print("\t >>> DDB, generate SQL table(s): save project data into a DB")
         if self._project_variant:
             project_variant_string = self._project_variant + "_"
@@ -634,7 +873,12 @@ class DataPipeLine:
             version_name = "{}{}".format(project_variant_string, main_source)
             infile = os.path.join(self._tempdir, '{}_raw.pkl'.format(version_name))
             outfile = os.path.join(self._data_dir, self._project_name, 'project_data.duckdb')
-            create_ddb(infile, outfile, project_variant_string, source_baseline, source_data=main_source, network_max_team_size=20, network_sample_size= self.network_sample_size) # use the core/ddb_data module
+            topics_infile = os.path.join(self._tempdir, '{}_topic_membership.pkl'.format(version_name))
+            create_ddb(infile, outfile, project_variant_string, source_baseline, source_data=main_source, network_max_team_size=network_max_team_size, network_sample_size= self.network_sample_size, tables=tables, topics_infile=topics_infile, jobs=self.ddb_jobs,
+                       network_top_n=self.network_nodes, network_top_metric=self.network_top_metric, network_min_weight=self.network_min_weight,
+                       network_by_category=self.network_categories is None, network_jobs=self.network_jobs,
+                       network_large_teams=self.network_large_teams, network_sample_seed=self.network_sample_seed,
+                       network_sample_strata=self.network_sample_strata) # use the core/ddb_data module
             print("\t\t - Data for {} {} saved into the duckd".format(self._uid, main_source))
             # with open(infile, 'r') as f:
             #     search_strategy = yaml.safe_load(f)
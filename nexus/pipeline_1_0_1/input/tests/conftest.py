@@ -0,0 +1,6 @@
+# coding=utf-8
+# the tests import the pipeline as the package nexus.pipeline_1_0_1.input (relative imports of core, api and utils)
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..')))
@@ -0,0 +1,78 @@
+# coding=utf-8
+import duckdb
+import pandas as pd
+import pytest
+from nexus.pipeline_1_0_1.input.core.ddb_data import (TABLE_BUILDER_COLUMNS, TABLE_BUILDER_DEPENDENCIES, LENS_INCLUDE_PROFILES,
+                                                      lens_include_profile, check_builder_columns, prepare_builder_records,
+                                                      create_table_records_id, create_table_source, create_table_records,
+                                                      create_table_categories, create_table_contribution_information,
+                                                      create_table_funding, table_rows)
+from nexus.pipeline_1_0_1.input.bench.synthetic_data import SyntheticLensData
+
+""" Tables created by each table builder """
+BUILDER_TABLES = {
+    'records_id': ['records_id'],
+    'source': ['source', 'source_issn'],
+    'records': ['records'],
+    'categories': ['categories', 'categories_openalex_concepts', 'categories_openalex_topics'],
+    'contribution_information': ['contribution', 'affiliation', 'organisations', 'locations'],
+    'funding': ['funding'],
+}
+
+
+@pytest.fixture(scope='module')
+def synthetic():
+    return SyntheticLensData(seed=7, nb_organisations=50, nb_sources=20, nb_concepts=(3, 10, 30), nb_funders=10)
+
+
+@pytest.fixture(scope='module')
+def baseline_db(synthetic, tmp_path_factory):
+    return synthetic.create_baseline_db(str(tmp_path_factory.mktemp('baseline') / 'baseline_data.duckdb'))
+
+
+def api_records(synthetic, nb_records, fields):
+    # the records as sent by the API with include=fields (only the fields of the records that have them),
+    # json normalised without the list of fields: no column for a field that no record has
+    records = [{f: r[f] for f in fields if f in r} for chunk in synthetic.iter_records(nb_records) for r in chunk]
+    return pd.json_normalize(records, errors='ignore')
+
+
+def run_builders(df, builders, conn, baseline_db):
+    # runs the table builders of create_ddb in dependency order (label '')
+    results = {}
+    for builder in [b for b in TABLE_BUILDER_DEPENDENCIES if b in builders]:
+        if builder == 'records_id':
+            create_table_records_id(df, 'lens_id', conn, '')
+        elif builder == 'source':
+            results['source'] = create_table_source(df, TABLE_BUILDER_COLUMNS['source'], conn, '')
+        elif builder == 'records':
+            create_table_records(df, results['source'], 'lens_id', conn, '')
+        elif builder == 'categories':
+            create_table_categories(df, 'lens_id', conn, '', baseline_db)
+        elif builder == 'contribution_information':
+            create_table_contribution_information(df, 'lens_id', conn, '', baseline_db)
+        elif builder == 'funding':
+            create_table_funding(df, 'lens_id', conn, '')
+
+
+@pytest.mark.parametrize('profile', list(LENS_INCLUDE_PROFILES))
+def test_builders_find_their_columns(synthetic, baseline_db, profile):
+    builders = LENS_INCLUDE_PROFILES[profile]
+    for builder in builders:  # the builders a builder needs are in the profile
+        assert set(TABLE_BUILDER_DEPENDENCIES[builder]) <= set(builders), (profile, builder)
+    df = prepare_builder_records(api_records(synthetic, 300, lens_include_profile(profile)), builders)
+    conn = duckdb.connect()
+    conn.execute("CREATE SCHEMA project;")
+    run_builders(df, builders, conn, baseline_db)
+    for builder in builders:
+        for table in BUILDER_TABLES[builder]:
+            assert table_rows(conn, '', table) > 0, (profile, builder, table)
+    conn.close()
+
+
+def test_missing_field_raises(synthetic):
+    fields = [f for f in lens_include_profile('ddb_full') if f != 'funding']
+    df = api_records(synthetic, 50, fields)
+    assert list(check_builder_columns(df, LENS_INCLUDE_PROFILES['ddb_full'])) == ['funding']
+    with pytest.raises(ValueError):
+        prepare_builder_records(df, LENS_INCLUDE_PROFILES['ddb_full'])
@@ -0,0 +1,57 @@
+# coding=utf-8
+import numpy as np
+import pandas as pd
+import pytest
+from nexus.pipeline_1_0_1.input.core.ddb_data import generate_collaboration_network
+
+
+def publications(missing_affiliations=True):
+    # (record, contribution, organisation): joint appointments, shared organisations, duplicated affiliations and,
+    # with missing_affiliations, contributions without organisation or with a NaN organisation next to a known one
+    rows = [
+        ('r1', 'c1', 'A'), ('r1', 'c2', 'B'), ('r1', 'c3', 'A'), ('r1', 'c3', 'C'),
+        ('r2', 'c4', 'A'), ('r2', 'c4', 'B'), ('r2', 'c5', 'B'), ('r2', 'c6', 'D'), ('r2', 'c6', 'D'),
+        ('r3', 'c7', 'C'), ('r3', 'c8', 'D'), ('r3', 'c9', 'E'), ('r3', 'c10', 'C'),
+        ('r4', 'c11', 'A'),
+    ]
+    if missing_affiliations:
+        rows = rows + [
+            ('r1', 'c12', np.nan), ('r2', 'c4', np.nan), ('r3', 'c13', np.nan), ('r3', 'c14', np.nan),
+            ('r4', 'c15', np.nan), ('r5', 'c16', np.nan), ('r5', 'c17', np.nan),
+        ]
+    df = pd.DataFrame(rows, columns=['rec', 'contribution_id', 'org_id'])
+    df['year'] = df['rec'].map({'r1': 2020, 'r2': 2020, 'r3': 2021, 'r4': 2021, 'r5': 2022})
+    return df
+
+
+def sorted_edges(o, keys=()):
+    return o.sort_values(list(keys) + ['from', 'to', 'is_ext']).reset_index(drop=True)
+
+
+@pytest.mark.parametrize('by', [None, 'year'])
+@pytest.mark.parametrize('missing_affiliations', [False, True])
+def test_closed_form_matches_pairwise(by, missing_affiliations):
+    keys = [by] if by else []
+    pairwise, pairwise_nodes = generate_collaboration_network('rec', publications(missing_affiliations), by=by)
+    closed_form, closed_form_nodes = generate_collaboration_network('rec', publications(missing_affiliations), by=by, max_team_size=0)
+    pairwise, closed_form = sorted_edges(pairwise, keys), sorted_edges(closed_form, keys)
+    assert pairwise[keys + ['from', 'to', 'is_ext']].equals(closed_form[keys + ['from', 'to', 'is_ext']])
+    np.testing.assert_allclose(pairwise['weight'], closed_form['weight'])
+    pd.testing.assert_frame_equal(pairwise_nodes, closed_form_nodes)
+
+
+def test_missing_affiliations_are_not_nodes():
+    edges, nodes = generate_collaboration_network('rec', publications(), max_team_size=2)
+    assert edges[['from', 'to']].notna().all().all()
+    assert nodes['org_id'].notna().all()
+    assert sorted(nodes['org_id']) == ['A', 'B', 'C', 'D', 'E']
+    # the weights of each record add up to 1, the records without organisation (r5) or pair (r4) have no edge
+    assert edges['weight'].sum() == pytest.approx(3)
+
+
+def test_missing_affiliations_do_not_change_weights():
+    with_missing, _ = generate_collaboration_network('rec', publications(True))
+    without, _ = generate_collaboration_network('rec', publications(False))
+    with_missing, without = sorted_edges(with_missing), sorted_edges(without)
+    assert with_missing[['from', 'to', 'is_ext']].equals(without[['from', 'to', 'is_ext']])
+    np.testing.assert_allclose(with_missing['weight'], without['weight'])
@@ -0,0 +1,62 @@
+# coding=utf-8
+import numpy as np
+import pandas as pd
+from nexus.pipeline_1_0_1.input.core.ddb_network_analytics import (
+    csr_graph, weighted_degree, approximate_betweenness, louvain_communities, force_layout, network_analytics)
+
+
+def two_cliques(size=5, bridge=0.1):
+    # 2 cliques of `size` nodes (weight 1) joined by a single weak edge
+    edges = []
+    for offset in (0, size):
+        edges += [(offset + i, offset + j, 1.0) for i in range(size) for j in range(i + 1, size)]
+    edges.append((0, size, bridge))
+    a, b, w = (np.array(x) for x in zip(*edges))
+    return (a, b, w), 2 * size
+
+
+def test_weighted_degree_is_the_sum_of_the_edge_weights():
+    rng = np.random.default_rng(0)
+    a, b = rng.integers(0, 30, 200), rng.integers(0, 30, 200)
+    w = rng.uniform(0.5, 3, 200)
+    indptr, indices, weights = csr_graph((a, b, w), 40)
+    expected = np.bincount(a, weights=w, minlength=40) + np.bincount(b[a != b], weights=w[a != b], minlength=40)
+    assert np.allclose(weighted_degree(indptr, weights), expected)
+    assert (weighted_degree(indptr, weights)[30:] == 0).all()
+
+
+def test_betweenness_exact_on_small_graphs():
+    path = csr_graph((np.arange(4), np.arange(1, 5), np.ones(4)), 5)
+    assert np.allclose(approximate_betweenness(*path), [0, 3, 4, 3, 0])
+    diamond = csr_graph((np.array([0, 0, 1, 2]), np.array([1, 2, 3, 3]), np.ones(4)), 4)
+    assert np.allclose(approximate_betweenness(*diamond), [0.5, 0.5, 0.5, 0.5])
+    # disconnected graph, batches of 1 source
+    split = csr_graph((np.array([0, 1, 3]), np.array([1, 2, 4]), np.ones(3)), 6)
+    assert np.allclose(approximate_betweenness(*split, batch_size=1), [0, 1, 0, 0, 0, 0])
+
+
+def test_two_cliques_give_two_communities():
+    edges, n = two_cliques()
+    community = louvain_communities(*csr_graph(edges, n))
+    assert len(set(community[:5])) == 1 and len(set(community[5:])) == 1
+    assert community[0] != community[5]
+
+
+def test_layout_finite_and_deterministic_for_a_seed():
+    edges, n = two_cliques()
+    graph = csr_graph(edges, n)
+    pos = force_layout(*graph, seed=7)
+    assert pos.shape == (n, 2) and np.isfinite(pos).all() and np.abs(pos).max() <= 1
+    assert np.array_equal(pos, force_layout(*graph, seed=7))
+    # repulsion against a sample of the nodes
+    pos = force_layout(*graph, seed=7, repulsion_sample=4)
+    assert np.isfinite(pos).all() and np.array_equal(pos, force_layout(*graph, seed=7, repulsion_sample=4))
+
+
+def test_network_analytics_isolated_nodes():
+    edges, n = two_cliques()
+    df = network_analytics(np.arange(n + 1) * 10, pd.DataFrame({'from': edges[0] * 10, 'to': edges[1] * 10,
+                                                                'weight': edges[2]}))
+    assert df['community'].isna().tolist() == [False] * n + [True]
+    assert df['x'].isna().tolist() == [False] * n + [True]
+    assert df['weighted_degree'].iloc[-1] == 0
@@ -0,0 +1,55 @@
+# coding=utf-8
+import os
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+from nexus.pipeline_1_0_1.input.core.ddb_network_export import export_networks_csr, load_network_csr, edge_list
+
+EDGES = pd.DataFrame({
+    'from': ['A', 'A', 'B', 'A', 'C', 'D', 'B', 'E'],
+    'to': ['B', 'C', 'C', 'A', 'C', 'E', 'E', 'F'],
+    'is_ext': [True, True, True, False, False, True, True, True],
+    'weight': [1.5, 0.25, 2.0, 0.5, 1.0, 0.125, 3.0, 0.75],
+})
+NODES = pd.DataFrame({'org_id': ['A', 'B', 'C', 'D', 'E']})  # F: an edge to a node that is not in the nodes
+
+
+@pytest.fixture
+def conn():
+    conn = duckdb.connect()
+    conn.execute("CREATE SCHEMA project;")
+    for label in ['', 'sub1_']:
+        conn.execute("CREATE TABLE project.{}net_org_edges AS SELECT * FROM EDGES;".format(label))
+        conn.execute("CREATE TABLE project.{}net_org_nodes AS SELECT * FROM NODES;".format(label))
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize('weights_dtype', ['float64', 'float32'])
+@pytest.mark.parametrize('with_internal', [False, True])
+def test_round_trip(conn, tmp_path, weights_dtype, with_internal):
+    results = export_networks_csr(conn, str(tmp_path), weights_dtype=weights_dtype, with_internal=with_internal)
+    assert sorted(results) == ['net_org', 'sub1_net_org']
+    expected = EDGES[EDGES['from'].isin(NODES['org_id']) & EDGES['to'].isin(NODES['org_id'])]
+    if not with_internal:
+        expected = expected[expected['is_ext']]
+    expected = expected.sort_values(['from', 'to']).reset_index(drop=True)
+    for name in results:
+        graph = load_network_csr(os.path.join(str(tmp_path), name), mmap=True)
+        assert isinstance(graph['indices'], np.memmap) and isinstance(graph['weights'], np.memmap)
+        assert graph['weights'].dtype == np.dtype(weights_dtype)
+        assert graph['info']['nb_edges'] == len(expected)
+        rows, cols, weights = edge_list(graph)
+        ids = np.asarray(graph['node_ids'])
+        got = pd.DataFrame({'from': ids[rows], 'to': ids[cols], 'weight': weights})
+        got = got.sort_values(['from', 'to']).reset_index(drop=True)
+        assert got[['from', 'to']].equals(expected[['from', 'to']])
+        np.testing.assert_allclose(got['weight'], expected['weight'], rtol=1e-6 if weights_dtype == 'float32' else 1e-12)
+
+
+def test_export_removes_dropped_networks(conn, tmp_path):
+    export_networks_csr(conn, str(tmp_path))
+    conn.execute("DROP TABLE project.sub1_net_org_edges;")
+    assert list(export_networks_csr(conn, str(tmp_path))) == ['net_org']
+    assert sorted(os.listdir(str(tmp_path))) == ['net_org']
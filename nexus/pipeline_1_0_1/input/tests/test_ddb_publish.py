@@ -0,0 +1,29 @@
+# coding=utf-8
+import os
+import duckdb
+from nexus.pipeline_1_0_1.input.core.ddb_publish import publish_snapshot, parquet_current, PARQUET_VERSIONS_KEPT
+
+
+def staging_db(path, nb):
+    conn = duckdb.connect(path)
+    conn.execute("CREATE SCHEMA IF NOT EXISTS project;")
+    conn.execute("CREATE OR REPLACE TABLE project.records AS SELECT range AS lens_id, 2000 + range % 5 AS year_published FROM range(?);", [nb])
+    conn.close()
+
+
+def test_parquet_export_swaps_the_current_version(tmp_path):
+    infile, outfile, parquet_dir = (str(tmp_path / x) for x in ['staging.duckdb', 'snapshot.duckdb', 'parquet'])
+    os.makedirs(parquet_dir)
+    open(os.path.join(parquet_dir, 'project.records.parquet'), 'w').close()  # previous layout
+    assert parquet_current(parquet_dir) is None
+    for nb in [10, 20, 30]:
+        staging_db(infile, nb)
+        publish_snapshot(infile, outfile, parquet_dir=parquet_dir)
+        current = parquet_current(parquet_dir)
+        records = os.path.join(current, 'project.records.parquet')
+        assert duckdb.sql("SELECT count(*) FROM read_parquet('{}');".format(records)).fetchone()[0] == nb
+    versions = [d for d in os.listdir(parquet_dir) if d.startswith('v_')]
+    assert len(versions) == PARQUET_VERSIONS_KEPT and os.path.basename(current) in versions
+    assert not [f for f in os.listdir(parquet_dir) if f.endswith('.parquet') or f.endswith('.tmp')]
+    if os.path.islink(os.path.join(parquet_dir, 'current')):
+        assert os.path.realpath(os.path.join(parquet_dir, 'current')) == os.path.realpath(current)
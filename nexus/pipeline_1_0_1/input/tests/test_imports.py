@@ -0,0 +1,38 @@
+# coding=utf-8
+import os
+import sys
+import json
+import subprocess
+from nexus.pipeline_1_0_1.input.bench.bench_imports import IMPORT_BUDGETS, HEAVY_MODULES, check_import_budgets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+CODE = """
+import sys, json, time
+start = time.perf_counter()
+import nexus.pipeline_1_0_1.input.datapipeline
+seconds = time.perf_counter() - start
+from nexus.pipeline_1_0_1.input.utils.utils_lazy import is_loaded
+print(json.dumps({'seconds': seconds, 'modules': [m for m in %r if m in sys.modules],
+                  'loaded': [m for m in %r if is_loaded(m)]}))
+""" % (HEAVY_MODULES, HEAVY_MODULES)
+
+
+def import_datapipeline():
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, os.environ.get('PYTHONPATH', '')]))
+    r = subprocess.run([sys.executable, '-c', CODE], capture_output=True, text=True, env=env, cwd=ROOT)
+    assert r.returncode == 0, r.stderr
+    return json.loads(r.stdout.strip().splitlines()[-1])
+
+
+def test_datapipeline_import_budget_and_heavy_modules():
+    result = import_datapipeline()
+    assert result['seconds'] <= IMPORT_BUDGETS['datapipeline']
+    # not imported at all (pandas may only be registered by lazy_import, not executed)
+    for m in ['duckdb', 'pyalex', 'sqlalchemy']:
+        assert m not in result['modules']
+    assert result['loaded'] == []
+
+
+def test_module_import_budgets():
+    for name, seconds, budget, loaded, ok in check_import_budgets():
+        assert ok, '{} {}s (budget {}s) loads {}'.format(name, seconds, budget, loaded)
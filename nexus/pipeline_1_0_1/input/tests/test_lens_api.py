@@ -0,0 +1,115 @@
+# coding=utf-8
+from types import SimpleNamespace
+import pytest
+from nexus.pipeline_1_0_1.input.api.lens_api import GetLensData
+from nexus.pipeline_1_0_1.input.utils.utils_json import json_dumps, json_loads
+
+API_CONFIGURATION = {'endpoint': 'http://localhost/lens/scholarly/', 'apikey': 'test', 'requests_per_minute': 1000}
+
+
+class FakeTracker:
+    # call tracker answering the requests with respond(query) => (status code, body)
+    def __init__(self, respond):
+        self.respond = respond
+        self.nb_calls = 0
+
+    def loop_call(self, f_query, f_headers=None, f_method='GET', f_url=None, max_tries=10, n=5):
+        self.nb_calls += 1
+        status, body = self.respond(json_loads(f_query))
+        return SimpleNamespace(status_code=status, content=json_dumps(body))
+
+
+def lens(**kwargs):
+    return GetLensData(api_configuration=API_CONFIGURATION, query_string={"match_all": {}}, **kwargs)
+
+
+def year_of(query):
+    # the year of a partition filter {"match": {"year_published": year}} in a query
+    for clause in query['query']['bool']['must']:
+        if 'match' in clause and 'year_published' in clause['match']:
+            return clause['match']['year_published']
+    return None
+
+
+def test_count_zero_records():
+    tracker = FakeTracker(lambda q: (200, {'total': 0}))
+    assert lens().count_lens_records({"match": {"year_published": 2020}}, call_tracker=tracker) == 0
+
+
+@pytest.mark.parametrize('status', [429, 500, 503])
+def test_count_error_raises(status):
+    tracker = FakeTracker(lambda q: (status, {'message': 'error'}))
+    with pytest.raises(ValueError):
+        lens().count_lens_records({"match": {"year_published": 2020}}, call_tracker=tracker)
+
+
+def test_plan_with_a_failed_count_raises():
+    # a failed count would drop the year from the plan
+    tracker = FakeTracker(lambda q: (429, {}) if year_of(q) == 2020 else (200, {'total': 10}))
+    with pytest.raises(ValueError):
+        lens().plan_lens_partitions(2018, 2022, max_partition_size=100, call_tracker=tracker)
+
+
+def test_plan_counts():
+    tracker = FakeTracker(lambda q: (200, {'total': 0 if year_of(q) == 2020 else 10}))
+    partitions = lens().plan_lens_partitions(2018, 2022, max_partition_size=100, call_tracker=tracker)
+    assert sorted(partitions['partition']) == ['2018', '2019', '2021', '2022']
+    assert partitions['nb_records'].sum() == 40
+
+
+def test_aggregate_error_raises():
+    tracker = FakeTracker(lambda q: (500, {'message': 'error'}))
+    with pytest.raises(ValueError):
+        lens(aggregation_string={"y": {"terms": {"field": "year_published"}}}).get_lens_aggregate(2018, 2022, call_tracker=tracker)
+
+
+def search_page(query):
+    # 1 record per year of the partition, no scroll
+    year = year_of(query)
+    return 200, {'total': 1, 'results': 1, 'max_score': 1.0, 'scroll_id': None,
+                 'data': [{'lens_id': 'id-{}'.format(year), 'year_published': year}]}
+
+
+def test_harvest():
+    tracker = FakeTracker(search_page)
+    df, df_aggregation, nb_total, max_score, tracker = lens(api_include=['lens_id', 'year_published']).get_lens_data(
+        2018, 2022, call_tracker=tracker, nb_workers=2)
+    assert nb_total == 5
+    assert sorted(df['year_published']) == [2018, 2019, 2020, 2021, 2022]
+
+
+@pytest.mark.parametrize('failure', ['search', 'incomplete'])
+def test_failed_partition_raises(failure):
+    # a failed partition fails the harvest (no silent gap in the records)
+    def respond(query):
+        if year_of(query) != 2020:
+            return search_page(query)
+        if failure == 'search':
+            return 503, {'message': 'error'}
+        return 200, {'total': 5, 'results': 1, 'max_score': 1.0, 'scroll_id': None, 'data': [{'lens_id': 'id-2020'}]}
+    with pytest.raises(ValueError):
+        lens(api_include=['lens_id', 'year_published']).get_lens_data(2018, 2022, call_tracker=FakeTracker(respond), nb_workers=2)
+
+
+def test_failed_scroll_page_raises():
+    def respond(query):
+        if 'scroll_id' in query:
+            return 500, {'message': 'error'}
+        return 200, {'total': 3, 'results': 1, 'max_score': 1.0, 'scroll_id': 'scroll-1', 'data': [{'lens_id': 'id-1'}]}
+    with pytest.raises(ValueError):
+        lens(page_size=1, api_include=['lens_id']).scroll_lens_query({"match": {"year_published": 2020}}, '2020',
+                                                                      call_tracker=FakeTracker(respond))
+
+
+def test_failed_partition_of_the_plan_raises(monkeypatch):
+    tracker = FakeTracker(lambda q: (200, {'total': 10}) if 'size' in q and q['size'] == 0 else search_page(q))
+    data = lens(api_include=['lens_id', 'year_published'])
+    scroll = data.scroll_lens_query
+
+    def scroll_lens_query(partition_filter, label, call_tracker=None):
+        if label == '2020':
+            raise ValueError("Lens scroll failed for partition 2020")
+        return scroll(partition_filter, label, call_tracker=call_tracker)
+    monkeypatch.setattr(data, 'scroll_lens_query', scroll_lens_query)
+    with pytest.raises(ValueError):
+        data.get_lens_data(2018, 2022, call_tracker=tracker, max_partition_size=100, nb_workers=2)
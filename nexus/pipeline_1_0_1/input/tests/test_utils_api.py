@@ -0,0 +1,71 @@
+# coding=utf-8
+import pytest
+from nexus.pipeline_1_0_1.input.utils import utils_api
+from nexus.pipeline_1_0_1.input.utils.utils_api import APICallTracker
+
+
+class FakeClock:
+    # time.time and time.sleep of utils_api (sleep moves the clock forward)
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def strftime(self, *args):
+        return ''
+
+    def localtime(self, *args):
+        return None
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(utils_api, 'time', clock)
+    monkeypatch.setattr(utils_api, 'request_retry', lambda *args, **kwargs: 'response')
+    return clock
+
+
+def calls(tracker, clock, nb, n, every=0.0):
+    # nb calls, 1 every `every` seconds, returns the time waited by the tracker
+    waited = 0.0
+    for i in range(nb):
+        before = clock.now
+        assert tracker.loop_call('query', n=n) == 'response'
+        waited += clock.now - before
+        clock.now += every
+    return waited
+
+
+def test_throttles_above_the_limit(clock):
+    tracker = APICallTracker()
+    assert calls(tracker, clock, 5, n=5, every=1) == 0
+    assert calls(tracker, clock, 1, n=5) == pytest.approx(55)  # the first call leaves the window at 1060
+    assert tracker.nb_calls == 6
+
+
+def test_throttles_again_after_a_pause(clock):
+    # the old calls leave the window: the tracker still throttles after a pause longer than the window
+    tracker = APICallTracker()
+    calls(tracker, clock, 5, n=5)
+    clock.now += 600
+    assert calls(tracker, clock, 5, n=5) == 0
+    assert calls(tracker, clock, 1, n=5) == pytest.approx(60)
+    clock.now += 61
+    assert calls(tracker, clock, 5, n=5) == 0
+    assert calls(tracker, clock, 1, n=5) == pytest.approx(60)
+
+
+def test_rate_over_several_minutes(clock):
+    tracker = APICallTracker()
+    start = clock.now
+    calls(tracker, clock, 50, n=10)
+    assert clock.now - start == pytest.approx(240)  # 10 calls per minute: the 50th call in the 5th minute
+    assert all(clock.now - t < 60 for t in tracker.call_timestamps)
+    assert len(tracker.call_timestamps) == 10
@@ -16,22 +16,48 @@
 # =============================================================================
 # modules to import
 # =============================================================================
-import requests
 import time
+import threading
 from collections import deque
+from .utils_metrics import metrics_count
+from .utils_lazy import lazy_import
+requests = lazy_import('requests')
 
 
 # =============================================================================
 # Functions and classes
 # =============================================================================
+_session = None
+_session_lock = threading.Lock()
+_trackers = {}
+
+def get_session(pool_size=32):
+    # the HTTP session shared by all the API calls of the process (keep-alive connections, one pool per host)
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=pool_size)
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+    return _session
+
+def get_call_tracker(key):
+    # the APICallTracker shared by all the calls made with the same API key (the rate limit applies to the key,
+    # whatever the project or the worker making the call)
+    with _session_lock:
+        if key not in _trackers:
+            _trackers[key] = APICallTracker()
+        return _trackers[key]
 
 def request_query_post(method, url, query, f_headers):
     try:
-        resp = requests.request(
+        resp = get_session().request(
             method,
             url,
             data=query,
             headers=f_headers)  # This is the initial API request
+        metrics_count(api_calls=1, bytes_downloaded=len(resp.content))
     except requests.exceptions.RequestException as err:
         raise SystemExit(err)
     finally:
@@ -41,11 +67,12 @@ def request_query_post(method, url, query, f_headers):
 def request_query(query, f_headers=None):
     try:
         if f_headers:
-            resp = requests.get(
+            resp = get_session().get(
             query,
             headers=f_headers)  # This is the initial API request
         else:
-            resp = requests.get(query)
+            resp = get_session().get(query)
+        metrics_count(api_calls=1, bytes_downloaded=len(resp.content))
     except requests.exceptions.RequestException as err:
         raise SystemExit(err)
     finally:
@@ -81,6 +108,20 @@ def retry(query, f_headers=None, max_tries=10, n=5):
 
     return resp
 
+RETRY_HTTP_CODES = (429, 500, 502, 503, 504)
+
+def retry_after_seconds(resp, attempt, sleep_sec=0.3, max_wait=60):
+    # the wait before retrying a rate limited request: the Retry-After (or Lens x-rate-limit-retry-after-seconds) header
+    # when sent by the API, an exponential backoff otherwise
+    for h in ('Retry-After', 'x-rate-limit-retry-after-seconds'):
+        value = resp.headers.get(h)
+        if value is not None:
+            try:
+                return min(float(value), max_wait)
+            except ValueError:
+                pass
+    return min(max(sleep_sec, 0.1) * 2 ** attempt, max_wait)
+
 def request_retry(f_query, f_headers=None, f_method='GET', f_url=None, max_tries=10, sleep_sec=0.3):
     """
     Retry a query function with a rate limit of up to `n` calls per minute.
@@ -102,19 +143,27 @@ def request_retry(f_query, f_headers=None, f_method='GET', f_url=None, max_tries
         else:
             api_resp = request_query(f_query, f_headers)
         return api_resp
+    resp = None
     for i in range(max_tries):
         try:
             time.sleep(sleep_sec)
             resp = api_request()
         except requests.exceptions.RequestException:
             continue
-        finally:
-            return resp
+        if resp is not None and resp.status_code in RETRY_HTTP_CODES and i < max_tries - 1:
+            wait = retry_after_seconds(resp, i, sleep_sec)  # rate limited or server error: wait and try again
+            metrics_count(throttle_seconds=wait)
+            time.sleep(wait)
+            continue
+        break
+    return resp
 
 class APICallTracker:
     def __init__(self):
         self.last_call = None  # Stores the timestamp of the last API call
         self.call_timestamps = deque()  # Stores the timestamps of recent API calls
+        self.nb_calls = 0  # Total number of API calls tracked
+        self.lock = threading.Lock()  # The tracker can be shared by parallel workers (eg harvest partitions)
 
     def track_api_call(self):
         """
@@ -123,6 +172,12 @@ class APICallTracker:
         current_time = time.time()
         self.last_call = current_time
         self.call_timestamps.append(current_time)
+        self.nb_calls += 1
+
+    def drop_old_calls(self, current_time):
+        # removes the timestamps of the calls made more than 1 minute ago (the window of the rate limit)
+        while self.call_timestamps and current_time - self.call_timestamps[0] >= 60:
+            self.call_timestamps.popleft()
 
     def get_last_call(self):
         """
@@ -131,10 +186,7 @@ class APICallTracker:
         :return: dict, details of the last API call or None if no calls were made
         """
         if self.last_call:
-            current_time = time.time()
-            # Remove timestamps older than 1 minute
-            while self.call_timestamps and current_time - self.call_timestamps[0] > 60:
-                self.call_timestamps.popleft()
+            self.drop_old_calls(time.time())
 
             return {
                 "last_call_time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.last_call)),
@@ -150,20 +202,19 @@ class APICallTracker:
         :param n: Maximum allowed calls per minute.
         :return: The response of the API call.
         """
-        current_time = time.time()
-        if len(self.call_timestamps) >= n:
-            sleep_time = 60 - (current_time - self.call_timestamps[0])
-            if sleep_time > 0:
-                time.sleep(sleep_time)
-            # while self.call_timestamps and current_time - self.call_timestamps[0] > 60:
-            #     self.call_timestamps.popleft()
-                self.call_timestamps = deque()
+        with self.lock:
+            self.drop_old_calls(time.time())
+            if len(self.call_timestamps) >= n:  # n calls in the last minute: wait for the oldest to leave the window
+                sleep_time = 60 - (time.time() - self.call_timestamps[-n])
+                if sleep_time > 0:
+                    time.sleep(sleep_time)
+                    metrics_count(throttle_seconds=sleep_time)
+                self.drop_old_calls(time.time())
+            # Log the timestamp of the call (before the request so that parallel workers see it)
+            self.track_api_call()
 
         # Make the request
         resp = request_retry(f_query, f_headers=f_headers, f_method=f_method, f_url=f_url, max_tries=max_tries)
-
-        # Log the timestamp of the successful call
-        self.track_api_call()
         return resp
 
 
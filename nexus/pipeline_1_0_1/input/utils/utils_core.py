@@ -18,7 +18,8 @@
 # =============================================================================
 import yaml
 import os
-import pandas as pd
+from .utils_lazy import lazy_import
+pd = lazy_import('pandas')
 # =============================================================================
 # Functions and classes
 # =============================================================================
@@ -0,0 +1,100 @@
+# coding=utf-8
+
+# =============================================================================
+# """
+# .. module:: pipeline.input.utils.utils_json.py
+# .. moduleauthor:: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# .. version:: 1.0
+#
+# :Copyright: Jean-Francois Desvignes for Science Data Nexus
+# Science Data Nexus, 2026
+# :Contact: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# :Updated: 19/10/2026
+# """
+# =============================================================================
+"""
+JSON encoding/decoding of the API payloads.
+The fastest library available is used: orjson, then msgspec, then the standard json module.
+"""
+# =============================================================================
+# modules to import
+# =============================================================================
+import json
+from .utils_lazy import lazy_import
+pd = lazy_import('pandas')
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# =============================================================================
+# Functions and classes
+# =============================================================================
+
+def json_backend():
+    # returns the name of the library used to encode/decode JSON
+    if orjson is not None:
+        return 'orjson'
+    if msgspec is not None:
+        return 'msgspec'
+    return 'json'
+
+def json_dumps(obj):
+    # encode a python object (eg a query body) as JSON, returns bytes (orjson, msgspec) or str (json)
+    # null values are kept (eg "exclude": null)
+    if orjson is not None:
+        return orjson.dumps(obj)
+    if msgspec is not None:
+        return msgspec.json.encode(obj)
+    return json.dumps(obj)
+
+def json_loads(data):
+    # decode a JSON document (bytes or str)
+    if orjson is not None:
+        return orjson.loads(data)
+    if msgspec is not None:
+        return msgspec.json.decode(data)
+    return json.loads(data)
+
+def json_loads_lines(data):
+    # decode a JSON lines document (bytes or str, eg an OpenAlex snapshot shard), returns a list
+    if msgspec is not None:
+        return msgspec.json.Decoder().decode_lines(data)
+    return [json_loads(x) for x in data.splitlines() if x.strip()]
+
+def response_json(response):
+    # decode the body of a requests response (replaces response.json())
+    return json_loads(response.content)
+
+def records_to_frame(records, fields=None):
+    # records = a list of API records (dictionaries)
+    # fields = the top level fields requested from the API (eg the Lens 'include'), None if unknown
+    # returns a DF with the same columns as pd.json_normalize (nested objects as dotted columns, lists kept as is),
+    # built column by column from the known fields instead of normalising each record
+    if not fields:
+        return pd.json_normalize(records, errors='ignore')
+    columns = {}
+
+    def add_column(name, values):
+        if any(isinstance(v, dict) for v in values):
+            keys = []
+            for v in values:
+                if isinstance(v, dict):
+                    keys = keys + [k for k in v if k not in keys]
+            for k in keys:
+                add_column('{}.{}'.format(name, k), [v.get(k) if isinstance(v, dict) else None for v in values])
+        else:
+            columns[name] = values
+
+    for f in fields:
+        add_column(f, [r.get(f) for r in records])
+    return pd.DataFrame(columns)
+
+
+# =============================================================================
+# End of script
+# =============================================================================
@@ -0,0 +1,70 @@
+# coding=utf-8
+
+# =============================================================================
+# """
+# .. module:: pipeline.input.utils.utils_lazy.py
+# .. moduleauthor:: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# .. version:: 1.0
+#
+# :Copyright: Jean-Francois Desvignes for Science Data Nexus
+# Science Data Nexus, 2026
+# :Contact: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# :Updated: 19/10/2026
+# """
+# =============================================================================
+"""
+On-demand imports: heavy libraries (pandas, duckdb, requests) are loaded the first time one of their
+attributes is used, so that importing the pipeline (or running a small command) does not load them.
+The first use of a lazy module is not thread-safe (before Python 3.12): load_lazy_modules() is called before
+starting worker threads (steps, table builders, API workers).
+"""
+# =============================================================================
+# modules to import
+# =============================================================================
+import sys
+import importlib
+import importlib.util
+import threading
+
+# =============================================================================
+# Functions and classes
+# =============================================================================
+_lock = threading.RLock()  # reentrant: loading a module may import other lazy modules
+
+def lazy_import(name, package=None):
+    # name: a module name (eg 'pandas'), relative names need the package (eg lazy_import('.core.ddb_data', __package__))
+    # returns the module, loaded when one of its attributes is used for the first time
+    # (returns the module itself if already imported, raises ModuleNotFoundError if not installed)
+    full_name = importlib.util.resolve_name(name, package) if name.startswith('.') else name
+    with _lock:
+        if full_name in sys.modules:
+            return sys.modules[full_name]
+        spec = importlib.util.find_spec(full_name)
+        if spec is None:
+            raise ModuleNotFoundError("No module named '{}'".format(full_name), name=full_name)
+        loader = importlib.util.LazyLoader(spec.loader)
+        spec.loader = loader
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[full_name] = module
+        loader.exec_module(module)
+    return module
+
+def load_lazy_modules():
+    # loads the modules registered by lazy_import and not used yet, returns their names
+    names = []
+    with _lock:
+        for name, module in list(sys.modules.items()):
+            if type(module).__name__ == '_LazyModule':
+                getattr(module, '__name__')  # the first attribute access executes the module
+                names.append(name)
+    return names
+
+def is_loaded(name):
+    # True if a module is imported and executed (ie not only registered by lazy_import)
+    module = sys.modules.get(name)
+    return module is not None and type(module).__name__ != '_LazyModule'
+
+
+# =============================================================================
+# End of script
+# =============================================================================
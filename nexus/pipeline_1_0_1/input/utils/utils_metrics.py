@@ -0,0 +1,218 @@
+# coding=utf-8
+
+# =============================================================================
+# """
+# .. module:: pipeline.input.utils.utils_metrics.py
+# .. moduleauthor:: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# .. version:: 1.0
+#
+# :Copyright: Jean-Francois Desvignes for Science Data Nexus
+# Science Data Nexus, 2026
+# :Contact: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# :Updated: 19/10/2026
+# """
+# =============================================================================
+"""
+Instrumentation of a pipeline run: wall time, CPU time, peak RSS, rows in/out, bytes downloaded,
+API calls and throttle time for pipeline steps, table builders and API clients.
+A run is started with start_run() and saved as a JSON (and Parquet when pyarrow is installed) report.
+When no run is started, metrics_step() and metrics_count() do nothing.
+The current step is kept per thread: a worker thread (API partitions, table builders, steps run in parallel) records
+its counters in the step that started it with metrics_attach(metrics_current()).
+cpu_seconds and peak_rss_mb are process-wide (all the threads, including the DuckDB threads, and the peak of the process
+so far): the steps running at the same time share them. thread_cpu_seconds is the CPU time of the thread of the step.
+"""
+# =============================================================================
+# modules to import
+# =============================================================================
+import os
+import sys
+import time
+import json
+import threading
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# =============================================================================
+# Functions and classes
+# =============================================================================
+
+def peak_rss_mb():
+    # peak resident set size of the process in MB (None if not available)
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':  # bytes on macOS, KB on Linux
+        return round(peak / 1024 / 1024, 1)
+    return round(peak / 1024, 1)
+
+
+class RunMetrics:
+    def __init__(self, run_name, outdir, profile=False, trace_memory=False):
+        # run_name: the name of the run (eg the project name)
+        # outdir: the folder of the run reports (and of the cProfile files)
+        # profile: saves a cProfile file (.prof) per step
+        # trace_memory: records the peak of python allocations per step (tracemalloc, slows down the run, use with jobs=1)
+        self.run_name = run_name
+        self.outdir = outdir
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.started = time.strftime("%Y%m%d_%H%M%S")
+        self.records = []
+        self.totals = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def current(self):
+        stack = getattr(self.local, 'stack', None)
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def attach(self, record):
+        # the counters and the steps of the thread are recorded in record (a step started by another thread)
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        self.local.stack.append(record)
+        try:
+            yield record
+        finally:
+            self.local.stack.pop()
+
+    @contextmanager
+    def step(self, name, kind='step', **counters):
+        record = {'name': name, 'kind': kind, 'wall_seconds': 0, 'cpu_seconds': 0, 'thread_cpu_seconds': 0, 'peak_rss_mb': None,
+                  'rows_in': None, 'rows_out': None, 'bytes_downloaded': 0, 'api_calls': 0, 'throttle_seconds': 0,
+                  'status': 'done'}
+        record.update(counters)
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        self.local.stack.append(record)
+        profiler = None
+        if self.profile and kind == 'step':
+            profiler = cProfile.Profile()
+            profiler.enable()
+        if self.trace_memory and kind == 'step':
+            tracemalloc.start()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        thread_cpu = time.thread_time()
+        try:
+            yield record
+        except Exception:
+            record['status'] = 'failed'
+            raise
+        finally:
+            record['wall_seconds'] = round(time.perf_counter() - wall, 3)
+            record['cpu_seconds'] = round(time.process_time() - cpu, 3)
+            record['thread_cpu_seconds'] = round(time.thread_time() - thread_cpu, 3)
+            record['peak_rss_mb'] = peak_rss_mb()
+            if profiler is not None:
+                profiler.disable()
+                os.makedirs(self.outdir, exist_ok=True)
+                profile_file = os.path.join(self.outdir, 'run_{}_{}.prof'.format(self.started, name))
+                profiler.dump_stats(profile_file)
+                record['profile_file'] = profile_file
+            if self.trace_memory and kind == 'step':
+                record['traced_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+                tracemalloc.stop()
+            self.local.stack.pop()
+            parent = self.current()
+            with self.lock:
+                if parent is not None:  # API counters of a table builder also count for its step
+                    for c in ('bytes_downloaded', 'api_calls', 'throttle_seconds'):
+                        parent[c] += record[c]
+                self.records.append(record)
+
+    def count(self, **counters):
+        # adds counters (eg api_calls=1, bytes_downloaded=n) to the current step of the thread and to the run totals
+        record = self.current()
+        with self.lock:
+            for c, v in counters.items():
+                self.totals[c] = self.totals.get(c, 0) + v
+                if record is not None:
+                    record[c] = (record.get(c) or 0) + v
+
+    def report(self):
+        return {'run': self.run_name, 'started': self.started, 'totals': self.totals, 'steps': self.records}
+
+    def save(self):
+        # saves the run report as JSON (and Parquet when pandas can write it), returns the JSON file name
+        os.makedirs(self.outdir, exist_ok=True)
+        outfile = os.path.join(self.outdir, 'run_{}.json'.format(self.started))
+        with open(outfile, 'w') as f:
+            json.dump(self.report(), f, indent=2, default=str)
+        try:
+            import pandas as pd
+            pd.DataFrame(self.records).to_parquet(outfile.replace('.json', '.parquet'), index=False)
+        except Exception:
+            pass  # pyarrow/fastparquet not installed
+        return outfile
+
+    def summary(self):
+        # one line per step (kind 'step'), eg for printing at the end of a run
+        lines = []
+        for r in self.records:
+            if r['kind'] == 'step':
+                lines.append('{:<20} {:>9.1f}s wall {:>9.1f}s cpu (process) {:>9.1f}s cpu (thread) {:>8} MB peak rss (process) {:>6} calls {:>10.1f} MB downloaded {:>7.1f}s throttled'.format(
+                    r['name'], r['wall_seconds'], r['cpu_seconds'], r['thread_cpu_seconds'], r['peak_rss_mb'], r['api_calls'],
+                    r['bytes_downloaded'] / 1024 / 1024, r['throttle_seconds']))
+        return lines
+
+
+_run = None
+
+def start_run(run_name, outdir, profile=False, trace_memory=False):
+    # starts the collection of metrics for a run, returns the RunMetrics object
+    global _run
+    _run = RunMetrics(run_name, outdir, profile=profile, trace_memory=trace_memory)
+    return _run
+
+def end_run():
+    # stops the collection of metrics, saves and returns the report of the run (None if no run was started)
+    global _run
+    run = _run
+    _run = None
+    if run is None:
+        return None
+    run.save()
+    return run
+
+def get_run():
+    return _run
+
+@contextmanager
+def metrics_step(name, kind='step', **counters):
+    # measures a block of code (a pipeline step, a table builder) when a run is started
+    if _run is None:
+        yield {}
+    else:
+        with _run.step(name, kind=kind, **counters) as record:
+            yield record
+
+def metrics_current():
+    # the current step of the thread (None when no run is started or out of a step), to attach worker threads to it
+    return _run.current() if _run is not None else None
+
+@contextmanager
+def metrics_attach(record):
+    # records the counters and steps of a worker thread in record (see metrics_current) when a run is started
+    if _run is None or record is None:
+        yield record
+    else:
+        with _run.attach(record):
+            yield record
+
+def metrics_count(**counters):
+    # adds counters to the current step (eg api_calls=1, bytes_downloaded=n) when a run is started
+    if _run is not None:
+        _run.count(**counters)
+
+
+# =============================================================================
+# End of script
+# =============================================================================
@@ -0,0 +1,245 @@
+# coding=utf-8
+
+# =============================================================================
+# """
+# .. module:: pipeline.input.utils.utils_steps.py
+# .. moduleauthor:: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# .. version:: 1.0
+#
+# :Copyright: Jean-Francois Desvignes for Science Data Nexus
+# Science Data Nexus, 2026
+# :Contact: Jean-Francois Desvignes <contact@sciencedatanexus.com>
+# :Updated: 19/10/2026
+# """
+# =============================================================================
+"""
+Step scheduler for the DataPipeLine: each step declares its inputs (files), its outputs
+(files or DuckDB tables as "path/to/file.duckdb::schema.table") and the steps it depends on.
+A step is skipped when the hash of its inputs, parameters and upstream steps is the same as
+in its last successful run and all its outputs exist. A step that raises an exception or does not
+create its outputs is failed and the steps depending on it are cancelled. Independent steps run in parallel.
+"""
+# =============================================================================
+# modules to import
+# =============================================================================
+import os
+import time
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from .utils_metrics import metrics_step, metrics_current, metrics_attach
+from .utils_lazy import load_lazy_modules
+
+# =============================================================================
+# Functions and classes
+# =============================================================================
+
+def file_signature(path, max_content_size=64 * 1024 * 1024):
+    # returns a hash of a file (content for files up to max_content_size, size and modification time above)
+    # or of all the files of a directory, 'missing' if the path does not exist
+    if not os.path.exists(path):
+        return 'missing'
+    h = hashlib.sha256()
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for f in sorted(files):
+                h.update(f.encode('utf-8'))
+                h.update(file_signature(os.path.join(root, f), max_content_size).encode('utf-8'))
+        return h.hexdigest()
+    stat = os.stat(path)
+    if stat.st_size > max_content_size:
+        h.update('{}:{}'.format(stat.st_size, stat.st_mtime_ns).encode('utf-8'))
+    else:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+    return h.hexdigest()
+
+def output_exists(output):
+    # output: a file path or a DuckDB table as "path/to/file.duckdb::schema.table"
+    if '::' not in output:
+        return os.path.exists(output)
+    db_file, table = output.split('::')
+    if not os.path.exists(db_file):
+        return False
+    import duckdb
+    schema, name = table.split('.')
+    conn = duckdb.connect(db_file, read_only=True)
+    try:
+        n = conn.execute("SELECT count(*) FROM information_schema.tables WHERE table_schema = ? AND table_name = ?;", [schema, name]).fetchone()[0]
+    finally:
+        conn.close()
+    return n > 0
+
+
+class PipelineStep:
+    def __init__(self, name, function, inputs=(), outputs=(), depends_on=(), params=None, resources=()):
+        # name: the name of the step (eg 'bas_ror')
+        # function: the callable to run (no arguments)
+        # inputs: files read by the step (config files, temp files), hashed to check if the step is up to date
+        # outputs: files or DuckDB tables ("file.duckdb::schema.table") created by the step
+        # depends_on: names of the steps to run first
+        # params: parameters of the step included in the hash (eg years, variant)
+        # resources: names of resources that cannot be used by 2 steps at the same time (eg a DuckDB file)
+        self.name = name
+        self.function = function
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.depends_on = list(depends_on)
+        self.params = params or {}
+        self.resources = list(resources)
+
+
+class StepScheduler:
+    def __init__(self, steps, state_file, jobs=1, label=None):
+        # steps: list of PipelineStep
+        # state_file: a JSON file with the hash of the last successful run of each step
+        # jobs: the maximum number of steps running at the same time
+        # label: prefix of the step names in the messages and run metrics (eg the project name in a batch)
+        self.steps = {s.name: s for s in steps}
+        self.state_file = state_file
+        self.jobs = max(int(jobs), 1)
+        self.label = label
+        self.state = {}
+        if os.path.exists(state_file):
+            with open(state_file, 'r') as f:
+                self.state = json.load(f)
+        self.lock = threading.Lock()
+        for s in steps:
+            for d in s.depends_on:
+                if d not in self.steps:
+                    raise ValueError("Step {} depends on an unknown step: {}".format(s.name, d))
+
+    def select(self, targets=None):
+        # returns the names of the target steps and of all the steps they depend on, in dependency order
+        targets = list(self.steps) if targets is None else list(targets)
+        ordered = []
+        visiting = set()
+
+        def visit(name):
+            if name in ordered:
+                return
+            if name in visiting:
+                raise ValueError("Circular dependency on step {}".format(name))
+            if name not in self.steps:
+                raise ValueError("Unknown step: {}".format(name))
+            visiting.add(name)
+            for d in self.steps[name].depends_on:
+                visit(d)
+            visiting.discard(name)
+            ordered.append(name)
+
+        for t in targets:
+            visit(t)
+        return ordered
+
+    def step_hash(self, name):
+        # hash of the inputs, parameters and upstream hashes of a step
+        step = self.steps[name]
+        h = hashlib.sha256()
+        h.update(name.encode('utf-8'))
+        h.update(json.dumps(step.params, sort_keys=True, default=str).encode('utf-8'))
+        for i in sorted(step.inputs):
+            h.update(i.encode('utf-8'))
+            h.update(file_signature(i).encode('utf-8'))
+        for d in sorted(step.depends_on):
+            h.update(d.encode('utf-8'))
+            h.update(self.state.get(d, {}).get('hash', 'never run').encode('utf-8'))
+        return h.hexdigest()
+
+    def is_up_to_date(self, name):
+        step = self.steps[name]
+        last = self.state.get(name)
+        if not last or last.get('hash') != self.step_hash(name):
+            return False
+        return all(output_exists(o) for o in step.outputs)
+
+    def save_state(self):
+        with open(self.state_file, 'w') as f:
+            json.dump(self.state, f, indent=2)
+
+    def display_name(self, name):
+        return '{}.{}'.format(self.label, name) if self.label else name
+
+    def plan(self, targets=None, force=False, skip=()):
+        # returns the list of (step name, 'run' or 'skip') without running anything
+        # skip: steps considered as up to date whatever their state (eg run once for several projects)
+        plan = []
+        stale = set()
+        for name in self.select(targets):
+            upstream_stale = any(d in stale for d in self.steps[name].depends_on)
+            if name in skip:
+                plan.append((name, 'skip'))
+            elif force or upstream_stale or not self.is_up_to_date(name):
+                stale.add(name)
+                plan.append((name, 'run'))
+            else:
+                plan.append((name, 'skip'))
+        return plan
+
+    def run(self, targets=None, force=False, skip=()):
+        # runs the target steps (all steps by default) and the steps they depend on
+        # returns a dictionary {step name: {'status': 'done'|'skipped'|'failed'|'cancelled', 'seconds': ...}}
+        plan = dict(self.plan(targets, force, skip))
+        report = {}
+        pending = [n for n in self.select(targets)]
+        running = {}
+        busy = set()
+        parent = metrics_current()  # eg the project of a batch, the steps run in worker threads
+
+        def run_step(name):
+            start = time.time()
+            with metrics_attach(parent), metrics_step(self.display_name(name), kind='step'):
+                self.steps[name].function()
+            missing = [o for o in self.steps[name].outputs if not output_exists(o)]
+            if missing:  # a step that did not create its outputs is failed (its hash is not saved)
+                raise ValueError("Step {} did not create its outputs: {}".format(self.display_name(name), ', '.join(missing)))
+            return time.time() - start
+
+        load_lazy_modules()  # before the worker threads
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            while pending or running:
+                for name in list(pending):
+                    step = self.steps[name]
+                    if any(report.get(d, {}).get('status') in ('failed', 'cancelled') for d in step.depends_on):
+                        report[name] = {'status': 'cancelled', 'seconds': 0}
+                        pending.remove(name)
+                        continue
+                    if not all(d in report for d in step.depends_on):
+                        continue
+                    if name in skip or plan[name] == 'skip' and not any(report[d]['status'] == 'done' for d in step.depends_on):
+                        print('\t\t step {} is up to date'.format(self.display_name(name)))
+                        report[name] = {'status': 'skipped', 'seconds': 0}
+                        pending.remove(name)
+                        continue
+                    if len(running) >= self.jobs or busy.intersection(step.resources):
+                        continue
+                    print('\t\t step {} started'.format(self.display_name(name)))
+                    step_hash = self.step_hash(name)
+                    running[executor.submit(run_step, name)] = (name, step_hash)
+                    busy.update(step.resources)
+                    pending.remove(name)
+                if not running:
+                    continue
+                done, not_done = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, step_hash = running.pop(future)
+                    busy.difference_update(self.steps[name].resources)
+                    try:
+                        seconds = future.result()
+                        report[name] = {'status': 'done', 'seconds': round(seconds, 3)}
+                        with self.lock:
+                            self.state[name] = {'hash': step_hash, 'completed': time.strftime("%Y-%m-%d %H:%M:%S"), 'seconds': round(seconds, 3)}
+                            self.save_state()
+                        print('\t\t step {} completed in {:.1f}s'.format(self.display_name(name), seconds))
+                    except Exception as e:
+                        report[name] = {'status': 'failed', 'seconds': 0, 'error': str(e)}
+                        print('\t\t step {} failed: {}'.format(self.display_name(name), e))
+        return report
+
+
+# =============================================================================
+# End of script
+# =============================================================================